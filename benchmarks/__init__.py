@@ -0,0 +1,7 @@
+"""Benchmarks of the numeric and geospatial hot paths of riselib.
+
+The suites follow the conventions of airspeed velocity (asv): classes with `params`, `setup` and `time_*`/`peakmem_*`
+methods. They can be run with `asv run` (see asv.conf.json) or without any extra dependency with
+`python -m benchmarks.run`, which also compares the results to a saved baseline. All input data is synthetic (see
+`benchmarks.generators`), so the benchmarks run offline.
+"""
@@ -0,0 +1,52 @@
+"""Benchmarks of loading ERA5 data with riselib.data.era5 from synthetic files."""
+
+from benchmarks.generators import era5_files
+from riselib.data.era5 import get_era_data
+from riselib.data.storage import BlockCache, Storage
+
+TIERS = ['small', 'medium', 'large']
+GRID_SIZES = {'small': (21, 21), 'medium': (41, 41), 'large': (81, 81)}
+YEARS = [2010, 2011]
+
+
+class GetEraData:
+
+    """Loading and deriving wind speeds of two years."""
+
+    params = [TIERS]
+    param_names = ['tier']
+    timeout = 600
+
+    def setup(self, tier: str) -> None:
+        """Write (or reuse) the files."""
+        self.root = era5_files(YEARS, *GRID_SIZES[tier])
+        n_lat, n_lon = GRID_SIZES[tier]
+        self.selection = {
+            'longitude': slice(0, 0.25 * (n_lon - 1) / 2),
+            'latitude': slice(50, 50 - 0.25 * (n_lat - 1) / 2),
+            'time': slice('2010-06', '2011-06'),
+        }
+
+    def time_get_era_data_ws100(self, tier: str) -> None:
+        """Load the 100 m wind speed."""
+        with get_era_data(variables='ws100', storage=self.root, **self.selection) as ds:
+            ds.load()
+
+    def time_get_era_data_ws100_float32(self, tier: str) -> None:
+        """Load the 100 m wind speed decoded to float32."""
+        with get_era_data(variables='ws100', storage=self.root, dtype='float32', **self.selection) as ds:
+            ds.load()
+
+    def time_get_era_data_block_cache(self, tier: str) -> None:
+        """Load the 100 m wind speed through a block cache."""
+        storage = Storage(self.root, block_cache=BlockCache())
+        try:
+            with get_era_data(variables='ws100', storage=storage, **self.selection) as ds:
+                ds.load()
+        finally:
+            storage.close()
+
+    def peakmem_get_era_data_ws100(self, tier: str) -> None:
+        """Peak memory of loading the 100 m wind speed."""
+        with get_era_data(variables='ws100', storage=self.root, **self.selection) as ds:
+            ds.load()
@@ -0,0 +1,71 @@
+"""Benchmarks of the grid and raster operations in riselib.gis.
+
+These benchmarks need the optional geospatial dependencies (geopandas, rasterio, cartopy) and are skipped without them.
+"""
+
+from benchmarks.generators import admin_polygons, raster_tiles
+
+TIERS = ['small', 'medium', 'large']
+GRID_RESOLUTIONS = {'small': 1.0, 'medium': 0.5, 'large': 0.25}
+N_REGIONS = {'small': 4, 'medium': 10, 'large': 25}
+RASTER_MOSAICS = {'small': (2, 256), 'medium': (4, 512), 'large': (6, 1024)}
+
+
+def _import_gis():  # noqa: ANN202
+    """Import riselib.gis or skip the benchmark (asv skips benchmarks raising NotImplementedError in setup)."""
+    try:
+        from riselib import gis
+    except ImportError as e:
+        msg = f'riselib.gis is not available: {e}'
+        raise NotImplementedError(msg) from e
+    return gis
+
+
+class CreateGeoGrid:
+
+    """Grids of administrative regions."""
+
+    params = [TIERS]
+    param_names = ['tier']
+
+    def setup(self, tier: str) -> None:
+        """Generate the regions."""
+        self.gis = _import_gis()
+        self.adm_df = admin_polygons(N_REGIONS[tier], N_REGIONS[tier])
+        self.resolution = GRID_RESOLUTIONS[tier]
+
+    def time_create_geo_grid(self, tier: str) -> None:
+        """Grid cells intersected with the regions."""
+        self.gis.create_geo_grid(self.adm_df, self.resolution, self.resolution)
+
+    def time_create_ref_geo_grid(self, tier: str) -> None:
+        """Reference grid cells."""
+        self.gis.create_ref_geo_grid(self.adm_df, self.resolution, self.resolution)
+
+    def peakmem_create_geo_grid(self, tier: str) -> None:
+        """Peak memory of the grid cells intersected with the regions."""
+        self.gis.create_geo_grid(self.adm_df, self.resolution, self.resolution)
+
+
+class MergeRaster:
+
+    """Merging and resampling a mosaic of raster tiles."""
+
+    params = [TIERS]
+    param_names = ['tier']
+
+    def setup(self, tier: str) -> None:
+        """Write (or reuse) the tiles."""
+        self.gis = _import_gis()
+        n_tiles, tile_size = RASTER_MOSAICS[tier]
+        self.directory = raster_tiles(n_tiles, tile_size)
+        extent = n_tiles * tile_size * 0.01
+        self.bounds = (0, 50 - extent, extent, 50)
+
+    def time_merge_raster(self, tier: str) -> None:
+        """Merge all tiles at twice the pixel size."""
+        self.gis.merge_raster(str(self.directory), '', 'tif', 'tile', self.bounds, 0.02)
+
+    def peakmem_merge_raster(self, tier: str) -> None:
+        """Peak memory of merging all tiles."""
+        self.gis.merge_raster(str(self.directory), '', 'tif', 'tile', self.bounds, 0.02)
@@ -0,0 +1,74 @@
+"""Benchmarks of the time series cleaning and interpolation in riselib.math."""
+
+import numpy as np
+
+from benchmarks.generators import hourly_series, wind_components
+from riselib.math import clean_timeseries, clean_timeseries_batch, normalize, spline_interp_hrly_xr
+
+TIERS = ['small', 'medium', 'large']
+N_SERIES = {'small': 10, 'medium': 200, 'large': 2000}
+GRID_SHAPES = {'small': (744, 21, 21), 'medium': (8760, 21, 21), 'large': (8760, 61, 61)}
+
+
+class CleanTimeseries:
+
+    """Cleaning hourly series of a year with all methods."""
+
+    params = [TIERS]
+    param_names = ['tier']
+
+    def setup(self, tier: str) -> None:
+        """Generate the series."""
+        self.df = hourly_series(N_SERIES[tier])
+
+    def time_clean_timeseries(self, tier: str) -> None:
+        """Clean every column with clean_timeseries."""
+        clean_timeseries(self.df, None)
+
+    def time_clean_timeseries_batch(self, tier: str) -> None:
+        """Clean all columns at once with clean_timeseries_batch."""
+        clean_timeseries_batch(self.df)
+
+    def peakmem_clean_timeseries(self, tier: str) -> None:
+        """Peak memory of clean_timeseries."""
+        clean_timeseries(self.df, None)
+
+
+class Normalize:
+
+    """Min-max normalization of a feature matrix."""
+
+    params = [TIERS]
+    param_names = ['tier']
+
+    def setup(self, tier: str) -> None:
+        """Generate the matrix."""
+        self.values = np.array(hourly_series(N_SERIES[tier]), dtype=np.float32)
+
+    def time_normalize(self, tier: str) -> None:
+        """Normalize every column into a new array."""
+        normalize(self.values, axis=0)
+
+    def peakmem_normalize_inplace(self, tier: str) -> None:
+        """Peak memory of normalizing in place."""
+        normalize(self.values, axis=0, out=self.values)
+
+
+class SplineInterpHourly:
+
+    """Upsampling hourly grids to 15 minutes."""
+
+    params = [TIERS, ['cubic', 'pchip']]
+    param_names = ['tier', 'method']
+
+    def setup(self, tier: str, method: str) -> None:
+        """Generate the grid."""
+        self.wind_speed = np.hypot(*wind_components(GRID_SHAPES[tier]))
+
+    def time_spline_interp_hrly_xr(self, tier: str, method: str) -> None:
+        """Upsample the grid."""
+        spline_interp_hrly_xr(self.wind_speed, res_min=15, method=method)
+
+    def peakmem_spline_interp_hrly_xr(self, tier: str, method: str) -> None:
+        """Peak memory of upsampling the grid."""
+        spline_interp_hrly_xr(self.wind_speed, res_min=15, method=method)
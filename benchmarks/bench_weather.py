@@ -0,0 +1,61 @@
+"""Benchmarks of the wind resource calculations in riselib.weather."""
+
+import numpy as np
+
+from benchmarks.generators import wind_components
+from riselib.weather import obtain_wind_vector, wind_capacity_factors, wind_rose
+
+TIERS = ['small', 'medium', 'large']
+GRID_SHAPES = {'small': (744, 41, 41), 'medium': (8760, 41, 41), 'large': (8760, 81, 81)}
+
+# Generic power curves of a low and a high wind speed turbine (wind speed in m/s, normalized power)
+POWER_CURVES = {
+    'low_wind': ([0, 3, 5, 7, 9, 11, 25, 25.01], [0, 0, 0.15, 0.45, 0.8, 1, 1, 0]),
+    'high_wind': ([0, 4, 6, 8, 10, 13, 25, 25.01], [0, 0, 0.1, 0.3, 0.6, 1, 1, 0]),
+}
+
+
+class WindVector:
+
+    """Wind speed and direction from u and v components."""
+
+    params = [TIERS]
+    param_names = ['tier']
+
+    def setup(self, tier: str) -> None:
+        """Generate the components."""
+        u, v = wind_components(GRID_SHAPES[tier])
+        self.u, self.v = u.values, v.values
+
+    def time_obtain_wind_vector(self, tier: str) -> None:
+        """Calculate speed and direction into new arrays."""
+        obtain_wind_vector(self.u, self.v)
+
+    def peakmem_obtain_wind_vector(self, tier: str) -> None:
+        """Peak memory of calculating speed and direction."""
+        obtain_wind_vector(self.u, self.v)
+
+
+class WindPower:
+
+    """Capacity factors and wind roses from wind speeds."""
+
+    params = [TIERS]
+    param_names = ['tier']
+
+    def setup(self, tier: str) -> None:
+        """Generate wind speeds and directions."""
+        u, v = wind_components(GRID_SHAPES[tier])
+        self.wind_speed, self.wind_azimuth = obtain_wind_vector(u.values, v.values)
+
+    def time_wind_capacity_factors(self, tier: str) -> None:
+        """Capacity factors of two power curves."""
+        wind_capacity_factors(self.wind_speed, POWER_CURVES)
+
+    def peakmem_wind_capacity_factors(self, tier: str) -> None:
+        """Peak memory of the capacity factors."""
+        wind_capacity_factors(self.wind_speed, POWER_CURVES)
+
+    def time_wind_rose(self, tier: str) -> None:
+        """Wind rose of every cell."""
+        wind_rose(self.wind_speed, self.wind_azimuth, speed_bins=np.arange(0, 31, 1))
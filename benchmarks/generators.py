@@ -0,0 +1,205 @@
+"""Synthetic data generators for the benchmarks.
+
+Generated files are cached in a directory below the system temp directory (or RISELIB_BENCHMARK_DATA if set), so
+they are only written once per parameter set.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+BENCHMARK_DATA_ENV_VAR = 'RISELIB_BENCHMARK_DATA'
+
+
+def get_data_dir(name: str) -> Path:
+    """Get (and create) a cache directory for generated benchmark files."""
+    root = Path(os.environ.get(BENCHMARK_DATA_ENV_VAR, Path(tempfile.gettempdir()) / 'riselib-benchmarks'))
+    directory = root / name
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def hourly_series(
+    n_series: int, n_hours: int = 8760, outlier_fraction: float = 0.005, nan_fraction: float = 0.01, seed: int = 0
+) -> pd.DataFrame:
+    """Generate hourly series with daily and seasonal cycles, noise, spikes and gaps.
+
+    Args:
+    ----
+        n_series (int): Number of series (columns).
+        n_hours (int, optional): Number of hours (rows). Defaults to 8760.
+        outlier_fraction (float, optional): Fraction of values multiplied by a large factor. Defaults to 0.005.
+        nan_fraction (float, optional): Fraction of missing values. Defaults to 0.01.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+    -------
+        pd.DataFrame: Float64 DataFrame with an hourly DatetimeIndex.
+
+    """
+    rng = np.random.default_rng(seed)
+    hours = np.arange(n_hours)[:, np.newaxis]
+    phase = rng.uniform(0, 2 * np.pi, n_series)
+    values = (
+        10
+        + 3 * np.sin(2 * np.pi * hours / 24 + phase)
+        + 2 * np.sin(2 * np.pi * hours / 8760 + phase)
+        + rng.normal(0, 1, (n_hours, n_series))
+    )
+    values[rng.random(values.shape) < outlier_fraction] *= rng.choice([-5, 10])
+    values[rng.random(values.shape) < nan_fraction] = np.nan
+
+    index = pd.date_range('2020-01-01', periods=n_hours, freq='h')
+    return pd.DataFrame(values, index=index, columns=[f'series_{i}' for i in range(n_series)])
+
+
+def wind_components(
+    shape: tuple[int, int, int], dtype: str | np.dtype = np.float32, seed: int = 0
+) -> tuple[xr.DataArray, xr.DataArray]:
+    """Generate ERA5-like u and v wind components on a regular (time, latitude, longitude) grid.
+
+    Args:
+    ----
+        shape (tuple[int, int, int]): Number of hours, latitudes and longitudes.
+        dtype (str|np.dtype, optional): Floating point type. Defaults to float32.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+    -------
+        tuple[xr.DataArray, xr.DataArray]: The u and v components in m/s.
+
+    """
+    rng = np.random.default_rng(seed)
+    n_hours, n_lat, n_lon = shape
+    coords = {
+        'time': pd.date_range('2020-01-01', periods=n_hours, freq='h'),
+        'latitude': 50 - 0.25 * np.arange(n_lat),
+        'longitude': 0.25 * np.arange(n_lon),
+    }
+    dims = ('time', 'latitude', 'longitude')
+    u = xr.DataArray(rng.normal(3, 5, shape).astype(dtype), dims=dims, coords=coords, name='u100')
+    v = xr.DataArray(rng.normal(1, 5, shape).astype(dtype), dims=dims, coords=coords, name='v100')
+    return u, v
+
+
+def era5_files(years: list[int], n_lat: int, n_lon: int, seed: int = 0) -> Path:
+    """Write ERA5-shaped NetCDF files of the 10 m and 100 m wind components in the layout of the ERA5 directory.
+
+    The values are packed to int16 with scale factor and offset like the original files. Existing files are reused.
+
+    Args:
+    ----
+        years (list[int]): Years to write one file per variable for.
+        n_lat (int): Number of latitudes (0.25 degree resolution, starting at 50N).
+        n_lon (int): Number of longitudes (0.25 degree resolution, starting at 0E).
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+    -------
+        Path: Root directory to use as storage of `get_era_data`.
+
+    """
+    root = get_data_dir(f'era5_{n_lat}x{n_lon}_seed{seed}')
+    latitude = 50 - 0.25 * np.arange(n_lat)
+    longitude = 0.25 * np.arange(n_lon)
+
+    for year in years:
+        (root / str(year)).mkdir(exist_ok=True)
+        time = pd.date_range(f'{year}-01-01', f'{year}-12-31 23:00', freq='h')
+        rng = np.random.default_rng([seed, year])
+        for var in ['u10', 'v10', 'u100', 'v100']:
+            path = root / str(year) / f'_Wind_{var[1:]}_{var[0]}_data_Copernicus_hourly_{year}.nc'
+            if path.exists():
+                continue
+            values = rng.normal(3, 5, (len(time), n_lat, n_lon)).astype(np.float32)
+            ds = xr.Dataset(
+                {var: (('time', 'latitude', 'longitude'), values)},
+                coords={'time': time, 'latitude': latitude, 'longitude': longitude},
+            )
+            ds[var].encoding.update(dtype='int16', scale_factor=0.001, add_offset=0.0, _FillValue=-32767)
+            # Write to a temporary name first, so interrupted runs do not leave broken files behind
+            ds.to_netcdf(path.with_suffix('.tmp'))
+            os.replace(path.with_suffix('.tmp'), path)
+
+    return root
+
+
+def admin_polygons(n_x: int, n_y: int, bounds: tuple = (0, 40, 10, 50), seed: int = 0):  # noqa: ANN201
+    """Generate a GeoDataFrame of random, gap-free administrative regions.
+
+    The regions are the cells of a regular grid with randomly jittered corners, so neighbouring regions share their
+    (irregular) borders like real administrative boundaries.
+
+    Args:
+    ----
+        n_x (int): Number of regions along the longitude.
+        n_y (int): Number of regions along the latitude.
+        bounds (tuple, optional): Total bounds (lon1, lat1, lon2, lat2). Defaults to (0, 40, 10, 50).
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+    -------
+        gpd.GeoDataFrame: Regions with the columns 'adm_name' and 'geometry' in EPSG:4326.
+
+    """
+    import geopandas as gpd
+    from shapely.geometry import Polygon
+
+    rng = np.random.default_rng(seed)
+    lon1, lat1, lon2, lat2 = bounds
+    lons, lats = np.meshgrid(np.linspace(lon1, lon2, n_x + 1), np.linspace(lat1, lat2, n_y + 1))
+    # Jitter the inner corners only, so the regions cover exactly the bounds
+    jitter = 0.3 * np.array([(lon2 - lon1) / n_x, (lat2 - lat1) / n_y])
+    lons[1:-1, 1:-1] += rng.uniform(-jitter[0], jitter[0], (n_y - 1, n_x - 1))
+    lats[1:-1, 1:-1] += rng.uniform(-jitter[1], jitter[1], (n_y - 1, n_x - 1))
+
+    polygons = [
+        Polygon([(lons[j, i], lats[j, i]), (lons[j, i + 1], lats[j, i + 1]),
+                 (lons[j + 1, i + 1], lats[j + 1, i + 1]), (lons[j + 1, i], lats[j + 1, i])])
+        for j in range(n_y)
+        for i in range(n_x)
+    ]
+    names = [f'region_{i}' for i in range(len(polygons))]
+
+    return gpd.GeoDataFrame({'adm_name': names}, geometry=polygons, crs='EPSG:4326')
+
+
+def raster_tiles(n_tiles: int, tile_size: int, resolution: float = 0.01, seed: int = 0) -> Path:
+    """Write a n_tiles x n_tiles mosaic of adjacent single-band GeoTIFF tiles. Existing tiles are reused.
+
+    Args:
+    ----
+        n_tiles (int): Number of tiles along each axis.
+        tile_size (int): Number of pixels along each axis of a tile.
+        resolution (float, optional): Pixel size in degrees. Defaults to 0.01.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+    -------
+        Path: Directory containing the tiles named 'tile_<row>_<col>.tif'.
+
+    """
+    import rasterio
+    from rasterio.transform import from_origin
+
+    directory = get_data_dir(f'raster_{n_tiles}x{n_tiles}_{tile_size}px_seed{seed}')
+    rng = np.random.default_rng(seed)
+    for row in range(n_tiles):
+        for col in range(n_tiles):
+            path = directory / f'tile_{row}_{col}.tif'
+            if path.exists():
+                continue
+            transform = from_origin(col * tile_size * resolution, 50 - row * tile_size * resolution, resolution,
+                                    resolution)
+            profile = {
+                'driver': 'GTiff', 'dtype': 'float32', 'count': 1, 'width': tile_size, 'height': tile_size,
+                'crs': 'EPSG:4326', 'transform': transform, 'nodata': -9999.0,
+            }
+            with rasterio.open(path, 'w', **profile) as dst:
+                dst.write(rng.random((1, tile_size, tile_size), dtype=np.float32))
+
+    return directory
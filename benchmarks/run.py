@@ -0,0 +1,160 @@
+"""Run the benchmarks without asv and compare them to a baseline.
+
+Every `time_*` method is timed with `timeit` (best of --repeat runs) and every `peakmem_*` method is measured with
+`tracemalloc`, which tracks the memory allocated by Python and NumPy. The results can be saved as JSON and used as
+baseline of later runs, which flags every benchmark that got slower or needs more memory than the threshold allows.
+
+Example usage:
+    # Save a baseline on the main branch
+    python -m benchmarks.run --tier small medium --output baseline.json
+    # Compare a feature branch against it, exits with 1 on regressions
+    python -m benchmarks.run --tier small medium --baseline baseline.json --threshold 0.2
+"""
+
+import argparse
+import importlib
+import inspect
+import itertools
+import json
+import pkgutil
+import re
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).parent
+METHOD_PREFIXES = ('time_', 'peakmem_')
+
+
+def discover(pattern: str | None = None, tiers: list[str] | None = None) -> list[tuple]:
+    """Find all benchmarks in the modules bench_*.py.
+
+    Args:
+    ----
+        pattern (str|None, optional): Regular expression the benchmark name has to match. Defaults to None.
+        tiers (list[str]|None, optional): Only run these values of the 'tier' parameter. Defaults to None.
+
+    Returns:
+    -------
+        list[tuple]: Tuples (name, class, method name, parameters).
+
+    """
+    benchmarks = []
+    for module_info in pkgutil.iter_modules([str(BENCHMARK_DIR)]):
+        if not module_info.name.startswith('bench_'):
+            continue
+        module = importlib.import_module(f'benchmarks.{module_info.name}')
+        for class_name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != module.__name__:
+                continue
+            param_names = getattr(cls, 'param_names', [])
+            param_sets = list(itertools.product(*getattr(cls, 'params', [])))
+            if tiers and 'tier' in param_names:
+                param_sets = [p for p in param_sets if p[param_names.index('tier')] in tiers]
+            for method_name in sorted(vars(cls)):
+                if not method_name.startswith(METHOD_PREFIXES):
+                    continue
+                for params in param_sets:
+                    name = f'{module_info.name}.{class_name}.{method_name}({", ".join(map(str, params))})'
+                    if pattern is None or re.search(pattern, name):
+                        benchmarks.append((name, cls, method_name, params))
+
+    return benchmarks
+
+
+def run_benchmark(cls: type, method_name: str, params: tuple, repeat: int) -> dict:
+    """Run a single benchmark.
+
+    Returns:
+    -------
+        dict: Dictionary with 'value' and 'unit' ('s' or 'bytes'), or with 'skipped' or 'error' and a message.
+
+    """
+    instance = cls()
+    try:
+        if hasattr(instance, 'setup'):
+            instance.setup(*params)
+    except NotImplementedError as e:
+        return {'skipped': str(e)}
+
+    method = getattr(instance, method_name)
+    try:
+        if method_name.startswith('time_'):
+            value = min(timeit.repeat(lambda: method(*params), number=1, repeat=repeat))
+            result = {'value': value, 'unit': 's'}
+        else:
+            tracemalloc.start()
+            try:
+                method(*params)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            result = {'value': peak, 'unit': 'bytes'}
+    except Exception as e:  # noqa: BLE001 (a failing benchmark should not stop the run)
+        result = {'error': f'{type(e).__name__}: {e}'}
+    finally:
+        if hasattr(instance, 'teardown'):
+            instance.teardown(*params)
+
+    return result
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Get the names of all benchmarks with a value more than (1 + threshold) times the baseline."""
+    return [
+        name
+        for name, result in results.items()
+        if 'value' in result
+        and 'value' in baseline.get(name, {})
+        and result['value'] > (1 + threshold) * baseline[name]['value']
+    ]
+
+
+def _format_value(result: dict) -> str:
+    """Format a result for the report."""
+    if 'skipped' in result:
+        return 'skipped'
+    if 'error' in result:
+        return 'failed'
+    if result['unit'] == 's':
+        return f'{result["value"] * 1e3:.1f} ms'
+    return f'{result["value"] / 2**20:.1f} MiB'
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the benchmarks from the command line and return the exit code."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bench', help='Regular expression to select benchmarks by name.')
+    parser.add_argument('--tier', nargs='+', help='Input size tiers to run, e.g. small medium.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timing runs, the best one counts.')
+    parser.add_argument('--output', type=Path, help='Write the results as JSON to this file.')
+    parser.add_argument('--baseline', type=Path, help='JSON results of an earlier run to compare to.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed relative increase over the baseline.')
+    args = parser.parse_args(argv)
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else {}
+    results = {}
+    for name, cls, method_name, params in discover(args.bench, args.tier):
+        results[name] = result = run_benchmark(cls, method_name, params, args.repeat)
+        line = f'{name:<80} {_format_value(result):>12}'
+        if name in baseline and 'value' in result and 'value' in baseline[name]:
+            line += f'  {result["value"] / baseline[name]["value"]:6.2f}x'
+        if 'error' in result:
+            line += f'  {result["error"]}'
+        print(line)  # noqa: T201
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:')  # noqa: T201
+        for name in regressions:
+            print(f'  {name}')  # noqa: T201
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,6 +3,10 @@
 The data is loaded from a network drive and returned as an xarray. All variables within that directory are available
  for loading and filtering by time, longitude, and latitude. The main functions within the module is `get_era_data`.
 
+The location of the data can be changed with the `storage` argument of `get_era_data` or globally with the environment
+variable RISELIB_ERA5_DIR, e.g. to point to a local copy of the data or to an fsspec-style URL. Reads over the
+network can be served through a local block cache (see `riselib.data.storage`).
+
 Example usage:
     # Get data for a all wind variables, filtered by time, longitude, and latitude
     era_data = get_era_data(
@@ -20,18 +24,22 @@ This library seems to be outdated and may be able to be deleted.
 
 
 
-import glob
+import os
 from collections.abc import Sequence
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import xarray as xr
 
+from riselib.data.storage import BlockCache, Storage
 from riselib.utils.logger import Logger
+from riselib.weather import extrapolate_wind_speed, obtain_wind_vector
 
 log = Logger(__name__)
 
 GLOBAL_ERA5_DIR = Path(r'//vfiler2/statsdata/WeatherData/Data_from_Copernicus')
+ERA5_DIR_ENV_VAR = 'RISELIB_ERA5_DIR'
 
 # def get_era5_data():
 
@@ -47,6 +55,18 @@ VAR_TO_FILE_ALIAS_DICT = dict(
     v100='Wind_100_v',
 )
 
+# Variables which are not stored in the files but derived lazily from the stored u and v components
+DERIVED_VAR_DEPENDENCIES_DICT = dict(
+    ws10=['u10', 'v10'],
+    wd10=['u10', 'v10'],
+    ws100=['u100', 'v100'],
+    wd100=['u100', 'v100'],
+    ws_hub=['u10', 'v10', 'u100', 'v100'],
+)
+
+# Attributes of the CF packing of int16 values, which are applied when decoding with dtype
+CF_PACKING_ATTRS = ('_FillValue', 'missing_value', 'scale_factor', 'add_offset', 'dtype')
+
 
 def _get_years_from_time_sel(time_sel: str | slice | None) -> list:
     """Get a list of years from a time selection. Multiple formats are supported.
@@ -84,12 +104,39 @@ def _get_years_from_time_sel(time_sel: str | slice | None) -> list:
         raise TypeError(msg)
 
 
+def get_era5_storage(root: str | Path | None = None, block_cache: BlockCache | bool | None = None) -> Storage:
+    """Get the storage of the ERA5 files.
+
+    Args:
+    ----
+        root (str|Path|None): Root directory of the ERA5 files, either a local or UNC path or an fsspec-style URL.
+            If None, the environment variable RISELIB_ERA5_DIR is used if set and GLOBAL_ERA5_DIR otherwise.
+        block_cache (BlockCache|bool|None): Block cache to read the files through. If True, a new cache with default
+            settings is created. If None or False, files are read directly.
+
+    Returns:
+    -------
+        Storage: The storage of the ERA5 files.
+
+    """
+    if root is None:
+        root = os.environ.get(ERA5_DIR_ENV_VAR, GLOBAL_ERA5_DIR)
+    if block_cache is True:
+        block_cache = BlockCache()
+
+    return Storage(root, block_cache=block_cache or None)
+
+
 def get_era_data(
     variables: list | str,
     longitude: slice | list,
     latitude: slice | list,
     time: str | slice | None,
     whole_number_offset: bool = False,
+    hub_height: float | None = None,
+    shear_law: str = 'power',
+    storage: Storage | str | Path | None = None,
+    dtype: str | np.dtype | None = None,
 ) -> xr.Dataset:
     """Get ERA5 data for given variables, longitude, latitude and time.
 
@@ -99,6 +146,12 @@ def get_era_data(
     To load all variables from _Wind_100_v_data_Copernicus_hourly_* files, use 'wind_100' to get both u and v, and use
     'wind_100_v' to get only v. There are also some aliases defined in VAR_TO_FILE_ALIAS_DICT.
 
+    Wind speed and direction can also be requested directly with the derived variables defined in
+    DERIVED_VAR_DEPENDENCIES_DICT ('ws10', 'wd10', 'ws100', 'wd100' and 'ws_hub'). These are computed lazily chunk by
+    chunk inside the dask graph, so only the derived fields are materialised when the data is loaded. The u and v
+    components needed for them are not part of the returned dataset unless they are requested as well. Directions
+    are returned as azimuth in radians (see `riselib.weather.obtain_wind_vector`).
+
     Args:
     ----
         variables (list|str): List of variables to load. Can also be a single variable as string.
@@ -108,35 +161,73 @@ def get_era_data(
             (e.g. slice('2010-01', '2010-02')). If None, all available data is loaded.
         whole_number_offset (bool): If True, longitude and latitude are offset by 0.125 to match the grid cell
             borders (e.g. 40.125->40.0, 40.0->39.875).
+        hub_height (float|None): Height in m to extrapolate the wind speed to for 'ws_hub'. Required if 'ws_hub' is
+            requested.
+        shear_law (str): Shear law used to extrapolate 'ws_hub' from the 10 m and 100 m levels. Either 'power' or
+            'log' (see `riselib.weather.extrapolate_wind_speed`). Defaults to 'power'.
+        storage (Storage|str|Path|None): Storage to load the files from. Can also be a path or fsspec-style URL of the
+            root directory. Pass a `Storage` with a `BlockCache` to read through a local block cache. If None, the
+            default location is used (see `get_era5_storage`).
+        dtype (str|np.dtype|None): Floating point type of the data variables, e.g. 'float32' to halve the memory
+            compared to the default float64. Packed variables (integers with scale_factor/add_offset) are decoded
+            straight into this type. If None, the default decoding of xarray is used.
 
     """
     if isinstance(variables, str):
         variables = [variables]
 
+    # Split into variables loaded from files and variables derived from them
+    derived_variables = [var for var in variables if var in DERIVED_VAR_DEPENDENCIES_DICT]
+    variables = [var for var in variables if var not in DERIVED_VAR_DEPENDENCIES_DICT]
+    if 'ws_hub' in derived_variables and hub_height is None:
+        msg = "A hub_height is required to derive 'ws_hub'."
+        raise ValueError(msg)
+    dependencies = [dep for var in derived_variables for dep in DERIVED_VAR_DEPENDENCIES_DICT[var]]
+    load_variables = variables + [dep for dep in dict.fromkeys(dependencies) if dep not in variables]
+
     # Get list of years from time selection to not load unnecessary data
     years = _get_years_from_time_sel(time)
 
     # Generate relevant file names
     file_names = []
-    for var in variables:
+    for var in load_variables:
         if var in VAR_TO_FILE_ALIAS_DICT:
             file_names.append(VAR_TO_FILE_ALIAS_DICT[var])
         else:
             file_names.append(var)
     file_names = list(set(file_names))  # Drop duplicates
 
+    own_storage = not isinstance(storage, Storage)
+    if own_storage:
+        storage = get_era5_storage(storage)
+
     # Generate list of file paths
     file_paths = []
     for year in years:
         for file_name in file_names:
-            file_paths.extend(glob.glob(str(GLOBAL_ERA5_DIR / str(year) / f'_{file_name}*.nc')))
+            file_paths.extend(storage.glob(f'{year}/_{file_name}*.nc'))
+    # Patterns of aliases and derived variable components can overlap (e.g. 'Wind_10_' and 'Wind_10_u')
+    file_paths = list(dict.fromkeys(file_paths))
 
     if not file_paths:
-        msg = f'No files found for variables {variables} (file_names: {file_names}) and time {time} (years: {years}).'
+        msg = (
+            f'No files found for variables {load_variables} (file_names: {file_names}) and time {time} '
+            f'(years: {years}).'
+        )
         raise FileNotFoundError(msg)
 
     # Load data
-    era_data = xr.open_mfdataset(file_paths, chunks={'time': 96})
+    files = [storage.open(path) for path in file_paths]
+    if dtype is None:
+        era_data = xr.open_mfdataset(files, chunks={'time': 96})
+    else:
+        # Decode every file on its own, since the packing parameters differ between the files
+        era_data = xr.open_mfdataset(
+            files,
+            chunks={'time': 96},
+            mask_and_scale=False,
+            preprocess=lambda ds: _decode_packed_variables(ds, np.dtype(dtype)),
+        )
 
     # Check if latitude data is in descending order and sort if not
     if isinstance(latitude, slice) and latitude.start < latitude.stop:
@@ -156,7 +247,150 @@ def get_era_data(
             latitude=era_data.latitude - 0.125,  # Moves north (range is 90 to -90)
         )
 
-    return era_data
+    if derived_variables:
+        era_data = _add_derived_variables(era_data, derived_variables, hub_height, shear_law)
+        # Drop the components only loaded for the derived variables, i.e. not in the files of the requested variables
+        requested_file_names = [VAR_TO_FILE_ALIAS_DICT.get(var, var) for var in variables]
+        dependency_variables = [
+            dep
+            for dep in dict.fromkeys(dependencies)
+            if dep not in variables
+            and not any(VAR_TO_FILE_ALIAS_DICT[dep].startswith(file_name) for file_name in requested_file_names)
+        ]
+        era_data = era_data.drop_vars(dependency_variables)
+
+    return _close_files_with_dataset(era_data, files, storage if own_storage else None)
+
+
+def _close_files_with_dataset(ds: xr.Dataset, files: list, storage: Storage | None = None) -> xr.Dataset:
+    """Close the file objects opened for a dataset (and the storage if given) when the dataset is closed.
+
+    Closing them explicitly avoids errors of the NetCDF backends when the objects are garbage collected at exit.
+    """
+    close_dataset = ds._close
+
+    def _close() -> None:
+        if close_dataset is not None:
+            close_dataset()
+        for file in files:
+            if not isinstance(file, str):
+                file.close()
+        if storage is not None:
+            storage.close()
+
+    ds.set_close(_close)
+    return ds
+
+
+def _decode_packed_variables(ds: xr.Dataset, dtype: np.dtype) -> xr.Dataset:
+    """Decode the data variables of a dataset opened with mask_and_scale=False into the given floating point type.
+
+    The CF decoding of xarray chooses the type based on the packing parameters, which is float64 for most ERA5 files.
+    Here the raw values are cast to the requested type first, so no float64 intermediate is created. Masking and
+    scaling run as one function per chunk, and the packing attributes are removed from the decoded variables, so
+    writing them with `to_netcdf` does not scale and mask the values a second time.
+
+    Args:
+    ----
+        ds (xr.Dataset): Dataset opened with mask_and_scale=False.
+        dtype (np.dtype): Floating point type to decode to.
+
+    Returns:
+    -------
+        xr.Dataset: The dataset with decoded data variables.
+
+    """
+    if not np.issubdtype(dtype, np.floating):
+        msg = f'dtype must be a floating point type, got {dtype}.'
+        raise TypeError(msg)
+
+    decoded = {}
+    for name, var in ds.data_vars.items():
+        attrs = {key: value for key, value in var.attrs.items() if key not in CF_PACKING_ATTRS}
+        fill_values = [var.attrs[key] for key in ('_FillValue', 'missing_value') if key in var.attrs]
+        data = xr.apply_ufunc(
+            _decode_packed_values,
+            var,
+            kwargs=dict(
+                dtype=dtype,
+                fill_values=fill_values,
+                scale_factor=var.attrs.get('scale_factor'),
+                add_offset=var.attrs.get('add_offset'),
+            ),
+            dask='parallelized',
+            output_dtypes=[dtype],
+            keep_attrs=False,
+        )
+        data.attrs = attrs
+        data.encoding = {key: value for key, value in var.encoding.items() if key not in CF_PACKING_ATTRS}
+        decoded[name] = data
+
+    return ds.assign(decoded)
+
+
+def _decode_packed_values(
+    raw: np.ndarray, dtype: np.dtype, fill_values: list, scale_factor: float | None, add_offset: float | None
+) -> np.ndarray:
+    """Mask, scale and offset packed values in place of one array of the requested type."""
+    data = raw.astype(dtype)
+    if scale_factor is not None:
+        data *= dtype.type(scale_factor)
+    if add_offset is not None:
+        data += dtype.type(add_offset)
+    for fill_value in fill_values:
+        data[raw == fill_value] = np.nan
+    return data
+
+
+def _add_derived_variables(
+    era_data: xr.Dataset, derived_variables: list, hub_height: float | None, shear_law: str
+) -> xr.Dataset:
+    """Add derived wind variables to the ERA5 dataset.
+
+    All variables are computed lazily on the dask chunks (`obtain_wind_vector` handles xarray inputs and the shear
+    extrapolation uses `xr.apply_ufunc(..., dask='parallelized')`), so nothing is computed until the data is loaded
+    and then only chunk by chunk.
+
+    Args:
+    ----
+        era_data (xr.Dataset): ERA5 data containing the u and v components needed for the derived variables.
+        derived_variables (list): Derived variables to add (keys of DERIVED_VAR_DEPENDENCIES_DICT).
+        hub_height (float|None): Height in m to extrapolate 'ws_hub' to.
+        shear_law (str): Shear law used for 'ws_hub'.
+
+    Returns:
+    -------
+        xr.Dataset: The dataset with the derived variables added.
+
+    """
+    wind_vectors = {}
+    for level in ('10', '100'):
+        if any(var.endswith(level) for var in derived_variables) or 'ws_hub' in derived_variables:
+            wind_vectors[level] = obtain_wind_vector(era_data[f'u{level}'], era_data[f'v{level}'])
+
+    derived = {}
+    for var in derived_variables:
+        if var == 'ws_hub':
+            derived[var] = xr.apply_ufunc(
+                extrapolate_wind_speed,
+                wind_vectors['10'][0],
+                wind_vectors['100'][0],
+                kwargs=dict(height=hub_height, law=shear_law),
+                dask='parallelized',
+                output_dtypes=[wind_vectors['100'][0].dtype],
+            ).assign_attrs(long_name=f'Wind speed at {hub_height} m ({shear_law} law)', units='m s**-1')
+        else:
+            level = var[2:]
+            if var.startswith('ws'):
+                derived[var] = wind_vectors[level][0].assign_attrs(
+                    long_name=f'Wind speed at {level} m', units='m s**-1'
+                )
+            else:
+                derived[var] = wind_vectors[level][1].assign_attrs(
+                    long_name=f'Wind azimuth at {level} m (0 is north, clockwise)', units='rad'
+                )
+
+    return era_data.assign(derived)
 
 
 # This is just for testing and can be ignored/ removed
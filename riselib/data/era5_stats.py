@@ -0,0 +1,223 @@
+"""Multi-year statistics and typical-year selection for Copernicus ERA5 data.
+
+Selecting representative weather years compares the monthly cumulative distribution (CDF) of every candidate year with
+the long-term one (Finkelstein-Schafer statistic). Instead of keeping all hourly values of 40+ years in memory, every
+year is loaded once and reduced to compact histogram sketches per (cell, month). All scores are then computed from
+these sketches in memory. The sketches can be stored with `to_netcdf` and reused for other selections.
+
+Example usage:
+    sketches = build_monthly_sketches(
+        variable='ws100',
+        years=range(1980, 2023),
+        longitude=slice(40, 50),
+        latitude=slice(40, 50),
+        bin_edges=np.arange(0, 40.5, 0.5),
+    )
+    scores = fs_scores(sketches, dims=['latitude', 'longitude'])
+    typical_years = select_typical_years(scores)
+"""
+
+from collections.abc import Iterable
+
+import numpy as np
+import xarray as xr
+
+from riselib.data.era5 import get_era_data
+from riselib.utils.logger import Logger
+
+log = Logger(__name__)
+
+
+def _histogram_cells(values: np.ndarray, bin_edges: np.ndarray) -> np.ndarray:
+    """Count the values of every cell (column) into the given bins at once.
+
+    Values outside of the bin edges are counted into the first or last bin, NaNs are ignored.
+
+    Args:
+    ----
+        values (np.ndarray): 2D array with time as first and cells as second dimension.
+        bin_edges (np.ndarray): Monotonically increasing bin edges.
+
+    Returns:
+    -------
+        np.ndarray: 2D array of counts with the shape (n_cells, n_bins).
+
+    """
+    n_bins = len(bin_edges) - 1
+    n_cells = values.shape[1]
+
+    # Flattened integer codes: cell index * n_bins + bin index
+    codes = np.searchsorted(bin_edges, values, side='right') - 1
+    np.clip(codes, 0, n_bins - 1, out=codes)
+    codes += np.arange(n_cells) * n_bins
+    counts = np.bincount(codes[~np.isnan(values)], minlength=n_cells * n_bins)
+
+    return counts.reshape(n_cells, n_bins)
+
+
+def build_monthly_sketches(
+    variable: str,
+    years: Iterable[int],
+    longitude: slice | list,
+    latitude: slice | list,
+    bin_edges: np.ndarray,
+    **kwargs: dict,
+) -> xr.Dataset:
+    """Build histogram sketches per (year, month, cell) of an ERA5 variable.
+
+    Every year is loaded with `get_era_data` and reduced month by month, so only one month of data is held in memory
+    at any time. Next to the histogram counts, the sum and sum of squares are kept to get exact means and standard
+    deviations.
+
+    Args:
+    ----
+        variable (str): Variable to build the sketches for. Must be a single variable which is returned under this
+            name by `get_era_data`, e.g. 'ws100' or 'u100'.
+        years (Iterable[int]): Years to build the sketches for.
+        longitude (slice|list): Longitude range to load (see `get_era_data`).
+        latitude (slice|list): Latitude range to load (see `get_era_data`).
+        bin_edges (np.ndarray): Bin edges of the histograms. Values outside are counted into the first or last bin.
+        **kwargs (dict): Further arguments passed to `get_era_data` (e.g. whole_number_offset, hub_height).
+
+    Returns:
+    -------
+        xr.Dataset: Dataset with the variables 'counts' (year, month, latitude, longitude, bin), 'n', 'sum' and
+            'sum_sq' (year, month, latitude, longitude) and 'bin_edges'.
+
+    """
+    bin_edges = np.asarray(bin_edges, dtype=float)
+    if bin_edges.ndim != 1 or len(bin_edges) < 2 or np.any(np.diff(bin_edges) <= 0):
+        msg = 'bin_edges must be a monotonically increasing 1D array with at least two values.'
+        raise ValueError(msg)
+
+    yearly_sketches = []
+    for year in years:
+        log.info(f'Building monthly sketches of {variable} for {year}.')
+        with get_era_data(
+            variables=variable, longitude=longitude, latitude=latitude, time=str(year), **kwargs
+        ) as year_data:
+            data = year_data[variable].transpose('time', 'latitude', 'longitude')
+            shape = data.shape[1:]
+
+            counts = np.zeros((12, *shape, len(bin_edges) - 1), dtype=np.uint32)
+            n = np.zeros((12, *shape), dtype=np.uint32)
+            sums = np.zeros((12, *shape))
+            sums_sq = np.zeros((12, *shape))
+            for month, month_data in data.groupby('time.month'):
+                values = month_data.values.reshape(month_data.shape[0], -1)
+                counts[month - 1] = _histogram_cells(values, bin_edges).reshape(*shape, -1)
+                n[month - 1] = np.sum(~np.isnan(values), axis=0).reshape(shape)
+                sums[month - 1] = np.nansum(values, axis=0).reshape(shape)
+                sums_sq[month - 1] = np.nansum(np.square(values), axis=0).reshape(shape)
+
+        dims = ('month', 'latitude', 'longitude')
+        yearly_sketches.append(
+            xr.Dataset(
+                {
+                    'counts': ((*dims, 'bin'), counts),
+                    'n': (dims, n),
+                    'sum': (dims, sums),
+                    'sum_sq': (dims, sums_sq),
+                },
+                coords={'month': np.arange(1, 13), 'latitude': data.latitude, 'longitude': data.longitude},
+            ).expand_dims(year=[year])
+        )
+
+    sketches = xr.concat(yearly_sketches, dim='year')
+    sketches['bin_edges'] = ('bin_edge', bin_edges)
+    sketches = sketches.assign_coords(bin=(bin_edges[:-1] + bin_edges[1:]) / 2)
+    sketches.attrs['variable'] = variable
+
+    return sketches
+
+
+def monthly_statistics(sketches: xr.Dataset, dims: list | None = None) -> xr.Dataset:
+    """Get the mean and standard deviation per year and month from the sketches.
+
+    Args:
+    ----
+        sketches (xr.Dataset): Sketches created by `build_monthly_sketches`.
+        dims (list|None): Dimensions to aggregate over, e.g. ['latitude', 'longitude'] for a regional value. If None,
+            the statistics are returned per cell.
+
+    Returns:
+    -------
+        xr.Dataset: Dataset with 'mean' and 'std' per year and month and 'mean_long_term' and 'std_long_term' per
+            month.
+
+    """
+    stats = sketches[['n', 'sum', 'sum_sq']].astype(float)
+    if dims:
+        stats = stats.sum(dims)
+    long_term = stats.sum('year')
+
+    def _mean_std(s: xr.Dataset) -> tuple[xr.DataArray, xr.DataArray]:
+        mean = s['sum'] / s['n']
+        std = np.sqrt(np.maximum(s['sum_sq'] / s['n'] - mean**2, 0))
+        return mean, std
+
+    mean, std = _mean_std(stats)
+    mean_long_term, std_long_term = _mean_std(long_term)
+
+    return xr.Dataset({'mean': mean, 'std': std, 'mean_long_term': mean_long_term, 'std_long_term': std_long_term})
+
+
+def fs_scores(sketches: xr.Dataset, dims: list | None = None) -> xr.DataArray:
+    """Calculate the Finkelstein-Schafer statistic of every candidate year and month.
+
+    The statistic is the mean absolute difference between the CDF of the candidate month and the long-term CDF of
+    that month, evaluated at the values of the candidate month. With the sketches, the values are represented by
+    their bins, so the result is exact up to the bin resolution.
+
+    Args:
+    ----
+        sketches (xr.Dataset): Sketches created by `build_monthly_sketches`.
+        dims (list|None): Dimensions to aggregate the distributions over before scoring, e.g.
+            ['latitude', 'longitude'] to score the regional distribution. If None, every cell is scored separately.
+
+    Returns:
+    -------
+        xr.DataArray: The statistic per year and month (and cell if not aggregated). Lower is more typical.
+
+    """
+    counts = sketches['counts'].astype(float)
+    if dims:
+        counts = counts.sum(dims)
+
+    long_term = counts.sum('year')
+    cdf_long_term = long_term.cumsum('bin') / long_term.sum('bin')
+    n_year = counts.sum('bin')
+    cdf_year = counts.cumsum('bin') / n_year
+
+    scores = (np.abs(cdf_year - cdf_long_term) * counts).sum('bin') / n_year
+
+    return scores.rename('fs')
+
+
+def select_typical_years(
+    scores: xr.DataArray | dict[str, xr.DataArray], weights: dict[str, float] | None = None
+) -> xr.DataArray:
+    """Select the most typical year for every month.
+
+    Args:
+    ----
+        scores (xr.DataArray|dict[str, xr.DataArray]): Scores created by `fs_scores`. Can also be a dictionary with the
+            scores of multiple variables, which are then combined as weighted sum.
+        weights (dict[str, float]|None): Weights of the variables if scores is a dictionary. If None, all variables are
+            weighted equally.
+
+    Returns:
+    -------
+        xr.DataArray: The selected year per month (and cell if the scores are per cell).
+
+    """
+    if isinstance(scores, dict):
+        if weights is None:
+            weights = {var: 1 / len(scores) for var in scores}
+        missing = set(scores) - set(weights)
+        if missing:
+            msg = f'No weights given for the variables {sorted(missing)}.'
+            raise ValueError(msg)
+        scores = sum(weights[var] * score for var, score in scores.items())
+
+    return scores.idxmin('year').rename('typical_year')
@@ -0,0 +1,329 @@
+"""Storage backends for data sources on network drives or remote filesystems.
+
+A `Storage` points to the root directory of a data source. It can be a local or UNC path or any fsspec-style URL
+(e.g. 's3://bucket/era5', requires `fsspec` and the matching filesystem package). Optionally, reads go through a
+`BlockCache`, which keeps recently read byte ranges of the files locally with LRU eviction and reads ahead a few
+blocks on every miss. This suits the chunked access pattern of NetCDF files over SMB or object stores, where many
+small reads of the same regions are otherwise sent over the network again and again.
+
+Example usage:
+    storage = Storage('//vfiler2/statsdata/WeatherData/Data_from_Copernicus', block_cache=BlockCache())
+    files = [storage.open(path) for path in storage.glob('2010/_Wind_100_u*.nc')]
+"""
+
+import glob
+import io
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+
+
+class BlockCache:
+
+    """Thread-safe LRU cache of fixed-size byte blocks of files.
+
+    The cache can be shared between files and storages. Blocks are identified by the file path and their index.
+    `hits` and `misses` count the requested blocks found in and missing from the cache. Blocks beyond the requested
+    range are read ahead on a miss; they are counted in `readahead_fills` and their first use in `readahead_hits`.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 2**20, block_size: int = 4 * 2**20, readahead_blocks: int = 4):
+        """Initialize the cache.
+
+        Args:
+        ----
+            max_bytes (int, optional): Maximum number of bytes to keep. Defaults to 512 MiB.
+            block_size (int, optional): Size of a single block in bytes. Defaults to 4 MiB.
+            readahead_blocks (int, optional): Number of blocks fetched with a single read on a miss, including the
+                missing block. Defaults to 4.
+
+        """
+        if block_size <= 0 or max_bytes < block_size or readahead_blocks < 1:
+            msg = 'block_size must be positive, max_bytes at least block_size and readahead_blocks at least 1.'
+            raise ValueError(msg)
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self.readahead_blocks = readahead_blocks
+        self.hits = 0
+        self.misses = 0
+        self.readahead_fills = 0
+        self.readahead_hits = 0
+        self._blocks = OrderedDict()
+        self._prefetched = set()
+        self._n_bytes = 0
+        self._lock = threading.Lock()
+
+    def read(self, path: str, start: int, stop: int, size: int, read_range: Callable[[int, int], bytes]) -> bytes:
+        """Read the bytes [start, stop) of a file through the cache.
+
+        Args:
+        ----
+            path (str): Path of the file, used as key.
+            start (int): First byte to read.
+            stop (int): Byte after the last byte to read.
+            size (int): Total size of the file in bytes.
+            read_range (Callable[[int, int], bytes]): Function reading the bytes [start, stop) from the file.
+
+        Returns:
+        -------
+            bytes: The requested bytes.
+
+        """
+        stop = min(stop, size)
+        if start >= stop:
+            return b''
+
+        first_block = start // self.block_size
+        last_block = (stop - 1) // self.block_size
+        n_blocks = -(-size // self.block_size)
+
+        parts = []
+        block_idx = first_block
+        while block_idx <= last_block:
+            key = (path, block_idx)
+            n_requested = last_block - block_idx + 1
+            with self._lock:
+                block = self._blocks.get(key)
+                if block is not None:
+                    self._blocks.move_to_end(key)
+                    if key in self._prefetched:
+                        self._prefetched.discard(key)
+                        self.readahead_hits += 1
+                    else:
+                        self.hits += 1
+                else:
+                    self.misses += 1
+                    # Read ahead until the read-ahead limit, the end of the file or the next cached block
+                    fetch_stop = block_idx + 1
+                    while (
+                        fetch_stop < min(block_idx + max(self.readahead_blocks, n_requested), n_blocks)
+                        and (path, fetch_stop) not in self._blocks
+                    ):
+                        fetch_stop += 1
+            if block is not None:
+                parts.append(block)
+                block_idx += 1
+                continue
+
+            data = read_range(block_idx * self.block_size, min(fetch_stop * self.block_size, size))
+            blocks = [data[i : i + self.block_size] for i in range(0, len(data), self.block_size)]
+            self._insert(path, block_idx, blocks, n_requested)
+            # The requested blocks of the fetched range are used directly, not looked up again as hits
+            n_used = max(1, min(len(blocks), n_requested))
+            parts.extend(blocks[:n_used])
+            block_idx += n_used
+
+        offset = first_block * self.block_size
+        return b''.join(parts)[start - offset : stop - offset]
+
+    def _insert(self, path: str, first_block: int, blocks: list[bytes], n_requested: int) -> None:
+        """Insert consecutive blocks and evict the least recently used blocks if the cache is full.
+
+        The blocks after the first n_requested ones were read ahead and are marked as such.
+        """
+        with self._lock:
+            for i, block in enumerate(blocks):
+                key = (path, first_block + i)
+                if key in self._blocks:
+                    self._n_bytes -= len(self._blocks.pop(key))
+                self._blocks[key] = block
+                self._n_bytes += len(block)
+                if i >= n_requested:
+                    self._prefetched.add(key)
+                    self.readahead_fills += 1
+                else:
+                    self._prefetched.discard(key)
+            while self._n_bytes > self.max_bytes:
+                evicted_key, evicted = self._blocks.popitem(last=False)
+                self._prefetched.discard(evicted_key)
+                self._n_bytes -= len(evicted)
+
+    def clear(self) -> None:
+        """Remove all blocks from the cache and reset the statistics."""
+        with self._lock:
+            self._blocks.clear()
+            self._prefetched.clear()
+            self._n_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.readahead_fills = 0
+            self.readahead_hits = 0
+
+    @property
+    def n_bytes(self) -> int:
+        """Number of bytes currently held in the cache."""
+        return self._n_bytes
+
+
+class CachedFile(io.RawIOBase):
+
+    """Read-only file object which serves all reads through a `BlockCache`."""
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        read_range: Callable[[int, int], bytes],
+        cache: BlockCache,
+        on_close: Callable[[], None] | None = None,
+    ):
+        """Initialize the file object.
+
+        Args:
+        ----
+            path (str): Path of the file, used as key in the cache.
+            size (int): Size of the file in bytes.
+            read_range (Callable[[int, int], bytes]): Function reading the bytes [start, stop) from the file.
+            cache (BlockCache): The cache to read through.
+            on_close (Callable[[], None]|None, optional): Function called when the file is closed, e.g. to release the
+                underlying handle. Defaults to None.
+
+        """
+        super().__init__()
+        self.name = path
+        self._size = size
+        self._read_range = read_range
+        self._cache = cache
+        self._on_close = on_close
+        self._pos = 0
+
+    def close(self) -> None:
+        """Close the file. Cached blocks stay in the cache."""
+        if not self.closed and self._on_close is not None:
+            self._on_close()
+        super().close()
+
+    def readable(self) -> bool:
+        """Return True since the file can be read."""
+        return True
+
+    def seekable(self) -> bool:
+        """Return True since the file supports random access."""
+        return True
+
+    def tell(self) -> int:
+        """Return the current position."""
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        """Change the current position and return it."""
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self._size + offset
+        else:
+            msg = f'Invalid whence {whence}.'
+            raise ValueError(msg)
+        return self._pos
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:
+        """Read bytes into a pre-allocated buffer and return the number of bytes read."""
+        data = self._cache.read(self.name, self._pos, self._pos + len(buffer), self._size, self._read_range)
+        buffer[: len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to size bytes, or until the end of the file if size is negative."""
+        stop = self._size if size is None or size < 0 else self._pos + size
+        data = self._cache.read(self.name, self._pos, stop, self._size, self._read_range)
+        self._pos += len(data)
+        return data
+
+
+class Storage:
+
+    """Root directory of a data source on a local path, a network drive or an fsspec filesystem."""
+
+    def __init__(self, root: str | Path, block_cache: BlockCache | None = None, storage_options: dict | None = None):
+        """Initialize the storage.
+
+        Args:
+        ----
+            root (str|Path): Root directory. Either a local or UNC path or an fsspec-style URL (e.g. 's3://bucket/dir').
+            block_cache (BlockCache|None, optional): If given, files are read through this cache. Defaults to None.
+            storage_options (dict|None, optional): Options passed to the fsspec filesystem for URLs. Defaults to None.
+
+        """
+        self.root = str(root)
+        self.block_cache = block_cache
+        self.is_remote = '://' in self.root
+
+        if self.is_remote:
+            try:
+                import fsspec
+            except ImportError as e:
+                msg = f'fsspec is required to read from {self.root}. Install it with `pip install fsspec`.'
+                raise ImportError(msg) from e
+            self._fs, self._root_path = fsspec.core.url_to_fs(self.root, **(storage_options or {}))
+        else:
+            self._fs, self._root_path = None, self.root
+
+        self._local_handles = {}
+        self._local_lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        """Return a string representation of the storage."""
+        return f'{self.__class__.__name__}({self.root!r}, block_cache={self.block_cache!r})'
+
+    def glob(self, pattern: str) -> list[str]:
+        """Get all paths matching a glob pattern relative to the root directory."""
+        if self.is_remote:
+            return sorted(self._fs.glob(f'{self._root_path.rstrip("/")}/{pattern}'))
+        return sorted(glob.glob(os.path.join(self._root_path, pattern)))
+
+    def open(self, path: str) -> str | io.IOBase:
+        """Get an object to open the file with, e.g. with xarray.
+
+        Local files without cache are returned as path, so the readers can use their native file access. In all
+        other cases a file-like object is returned.
+
+        Args:
+        ----
+            path (str): Path as returned by `glob`.
+
+        Returns:
+        -------
+            str|io.IOBase: The path or a file-like object.
+
+        """
+        if self.block_cache is None:
+            return self._fs.open(path, 'rb') if self.is_remote else path
+
+        on_close = None
+        if self.is_remote:
+            size = self._fs.size(path)
+
+            def read_range(start: int, stop: int) -> bytes:
+                return self._fs.cat_file(path, start=start, end=stop)
+
+        else:
+            size = os.path.getsize(path)
+
+            def read_range(start: int, stop: int) -> bytes:
+                with self._local_lock:
+                    if path not in self._local_handles:
+                        self._local_handles[path] = open(path, 'rb')  # noqa: SIM115 (closed in close)
+                    handle = self._local_handles[path]
+                    handle.seek(start)
+                    return handle.read(stop - start)
+
+            def on_close() -> None:
+                # The handle is opened again on the next read of another file object of the same path
+                with self._local_lock:
+                    handle = self._local_handles.pop(path, None)
+                if handle is not None:
+                    handle.close()
+
+        return CachedFile(path, size, read_range, self.block_cache, on_close)
+
+    def close(self) -> None:
+        """Close all file handles opened for reading through the cache."""
+        with self._local_lock:
+            for handle in self._local_handles.values():
+                handle.close()
+            self._local_handles.clear()
@@ -1,46 +1,755 @@
 """Python wrappers for querying the IEA data warehouse.
 
-This module contains functions for querying the IEA data warehouse. Right now only one quite simple and general
-function and a helper function are included. But this could be expanded in future.
+This module contains functions for querying the IEA data warehouse. `export_data` returns the (optionally filtered,
+aggregated and cached) rows of a table as DataFrame. Larger results can be streamed in chunks with
+`export_data_chunks`, written to Parquet with `export_to_parquet`, split into concurrent queries with
+`export_data_partitioned` or mirrored incrementally to a local directory with `sync_table`.
+
+All functions share one SQLAlchemy engine per database (see `get_engine`), so connections are pooled and reused
+across queries instead of being set up again for every call. Any other engine, e.g. a local SQLite or DuckDB
+database, can stand in for the warehouse with `register_engine`:
+
+    register_engine('Division_EDC', 'sqlite:///test.db')
+    df = export_data('V_Table1', 'Division_EDC', limit=10)
+
+The tables, columns and approximate row counts of a database are available without querying any rows with
+`get_tables` and `get_columns`, which cache the metadata for METADATA_TTL seconds. To find out where the time of
+slow exports goes, `query_report` summarizes the phase timings of all `export_data` calls of the session:
+
+    print(query_report(by='table'))
 """
+import atexit
 import collections
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
 
+import numpy as np
 import pandas as pd
-import pyodbc
 import sqlalchemy as sa
+from sqlalchemy.dialects import mssql
 
+from riselib.utils.logger import Logger
 
-def export_data(
-    table: str,
-    database: str,
-    columns: list = None,
-    conditions: dict = None,
-    return_query_string: bool = False,
-    limit: int = None,
-) -> pd.DataFrame:
-    """Get Data from IEA Data Warehouse.
+if TYPE_CHECKING:
+    import pyarrow as pa
 
-    This function exports data from a specified database table from the IEA data warehouse. It allows some additional
-    functionality and is a simple wrapper for the actual sql query.
+log = Logger(__name__)
+
+DW_SERVER = 'dw.ad.iea.org,14330'
+DW_DRIVER = 'SQL Server'
+
+# IN lists with more values are passed through a temporary table (SQL Server allows at most 2100 parameters), as are
+# the longest lists of a statement until it has at most MAX_BIND_PARAMETERS parameters
+IN_LIST_TEMP_TABLE_THRESHOLD = 1000
+MAX_BIND_PARAMETERS = 2000
+
+# Rows fetched at once by the typed fetch path, and the share of distinct values up to which text becomes categorical
+TYPED_FETCH_CHUNKSIZE = 100_000
+CATEGORICAL_MAX_UNIQUE_RATIO = 0.5
+
+# Phases of the timings of `export_data` calls and the number of calls kept in the session log of `query_report`
+QUERY_PHASES = ('connect', 'execute', 'fetch', 'postprocess', 'cache')
+QUERY_LOG_SIZE = 10_000
+
+# Seconds for which the tables and columns of a database are cached by `get_tables` and `get_columns`
+METADATA_TTL = 3600
+
+# Columns to group by for the time grains of aggregated queries and SQL of the aggregate functions
+TIME_GRAINS = {
+    'year': ['Year'],
+    'month': ['Year', 'Code Month'],
+    'day': ['Year', 'Code Month', 'Day'],
+    'hour': ['Year', 'Code Month', 'Day', 'Hour'],
+}
+AGGREGATE_FUNCTIONS = {
+    'sum': 'SUM({})',
+    'mean': 'AVG(CAST({} AS FLOAT))',  # SQL Server averages integers as integers
+    'min': 'MIN({})',
+    'max': 'MAX({})',
+    'count': 'COUNT({})',
+}
+
+# Engines by database and the pool settings of newly created warehouse engines
+_engines = {}
+_registered_databases = set()
+_engine_lock = threading.Lock()
+_pool_options = dict(pool_size=5, max_overflow=10, pool_timeout=30, pool_recycle=3600, pool_pre_ping=True)
+
+
+def _create_dw_engine(database: str) -> sa.engine.Engine:
+    """Create a pooled engine connecting to a database of the IEA data warehouse with Windows authentication."""
+    connection_string = f'DRIVER={{{DW_DRIVER}}};SERVER={DW_SERVER};DATABASE={database};Trusted_Connection=yes'
+    connection_url = sa.engine.URL.create('mssql+pyodbc', query={'odbc_connect': connection_string})
+    return sa.create_engine(connection_url, fast_executemany=True, **_pool_options)
+
+
+def get_engine(database: str) -> sa.engine.Engine:
+    """Get the shared engine of a database.
+
+    The engine of a warehouse database is created on first use and reused afterwards, so its connection pool is shared
+    by all queries. Engines registered with `register_engine` are returned instead.
 
     Args:
     ----
-    table (str): The name of the table from which to export data.
-    database (str): The name of the database where the table is located.
-    columns (list, optional): A list of column names to be included in the output. If not provided, all columns are
-        included.
-    conditions (dict, optional): A dictionary where the keys are column names and the values are conditions for
-        filtering the data. #todo right now only supports equality and exists in list conditions
-    return_query_string (bool, optional): If True, the function will return the SQL query string instead of executing
-        the query. Useful for debugging.
-    limit (int, optional): The maximum number of rows to return. If not provided, all rows are returned.
+    database (str): The name of the database.
 
     Returns:
     -------
-    df (pd.DataFrame): A DataFrame containing the exported data.
-    or
-    query_string (str): The SQL query string, if return_query_string is True.
+    engine (sa.engine.Engine): The engine of the database.
+
+    """
+    engine = _engines.get(database)
+    if engine is None:
+        with _engine_lock:
+            engine = _engines.get(database)
+            if engine is None:
+                log.debug(f'Creating engine for database {database}.')
+                engine = _engines[database] = _create_dw_engine(database)
+    return engine
+
+
+def register_engine(database: str, engine: sa.engine.Engine | str, **engine_kwargs: dict) -> sa.engine.Engine:
+    """Use another engine for a database, e.g. a local SQLite or DuckDB database standing in for the warehouse.
+
+    Args:
+    ----
+    database (str): The name of the database as used in `export_data` and `get_table_list`.
+    engine (sa.engine.Engine|str): The engine or a database URL to create it from, e.g. 'sqlite:///test.db'.
+    **engine_kwargs (dict): Arguments passed to `sa.create_engine` if engine is a URL.
+
+    Returns:
+    -------
+    engine (sa.engine.Engine): The registered engine.
+
+    """
+    if isinstance(engine, str):
+        engine = sa.create_engine(engine, **engine_kwargs)
+    with _engine_lock:
+        previous = _engines.get(database)
+        _engines[database] = engine
+        _registered_databases.add(database)
+    if previous is not None and previous is not engine:
+        previous.dispose()
+    clear_metadata_cache(database)
+    return engine
+
+
+def configure_pool(
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_timeout: float = 30,
+    pool_recycle: int = 3600,
+    pool_pre_ping: bool = True,
+) -> None:
+    """Configure the connection pool of the warehouse engines.
+
+    Existing warehouse engines are disposed and recreated with the new settings on their next use. Registered engines
+    are not affected.
+
+    Args:
+    ----
+    pool_size (int, optional): Number of connections kept open per database. Defaults to 5.
+    max_overflow (int, optional): Number of additional connections opened temporarily under load. Defaults to 10.
+    pool_timeout (float, optional): Seconds to wait for a free connection. Defaults to 30.
+    pool_recycle (int, optional): Seconds after which connections are replaced. Defaults to 3600.
+    pool_pre_ping (bool, optional): Whether to test connections before use, to replace dropped ones. Defaults to True.
+
+    """
+    _pool_options.update(
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping,
+    )
+    with _engine_lock:
+        databases = [database for database in _engines if database not in _registered_databases]
+    dispose_engines(databases)
+
+
+def dispose_engines(databases: list | str | None = None) -> None:
+    """Close all pooled connections and remove the engines from the registry.
+
+    Args:
+    ----
+    databases (list|str|None, optional): The databases to dispose the engines of. If None, all engines are disposed,
+        including registered ones.
+
+    """
+    if isinstance(databases, str):
+        databases = [databases]
+    with _engine_lock:
+        if databases is None:
+            databases = list(_engines)
+        engines = [_engines.pop(database) for database in databases if database in _engines]
+        _registered_databases.difference_update(databases)
+    for engine in engines:
+        engine.dispose()
+    clear_metadata_cache(databases)
+
+
+atexit.register(dispose_engines)
+
+
+def _dialect_name(database: str) -> str:
+    """Get the SQL dialect of a database without creating an engine. Unregistered databases are in the warehouse."""
+    engine = _engines.get(database)
+    return engine.dialect.name if engine is not None else 'mssql'
+
+
+@contextlib.contextmanager
+def _lock_file(path: Path, timeout: float, description: str) -> Iterator[None]:
+    """Hold a lock file against other processes, e.g. for the query cache index or a synced mirror.
+
+    A lock file which was not modified for timeout seconds was left behind by a crashed process and is removed, so
+    holders of the lock for longer have to touch it with `os.utime`. Raises a TimeoutError if the lock can not be
+    acquired within timeout seconds.
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            with contextlib.suppress(FileNotFoundError):
+                if time.time() - path.stat().st_mtime > timeout:
+                    log.warning(f'Removing the stale lock {path}.')
+                    path.unlink(missing_ok=True)
+                    continue
+            if time.time() > deadline:
+                msg = f'Could not lock {description} within {timeout}s.'
+                raise TimeoutError(msg) from None
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        path.unlink(missing_ok=True)
+
+
+class QueryCache:
+
+    """On-disk cache of `export_data` results.
+
+    Results are stored as Parquet files in a directory together with an index (index.json) of all entries. Entries are
+    keyed by the normalised query (table, database, columns, conditions and limit), expire after their time to live
+    and the least recently used entries are evicted if the cache grows beyond max_bytes. The cache does not know when
+    the warehouse data changes, so tables which are updated have to be invalidated explicitly or given a short TTL.
+
+    A directory can be shared by several caches, also in different processes. The index is changed under a lock file
+    (index.lock) and reloaded before every change, and the last access of an entry is the modification time of its
+    file, which is updated on every hit. Parquet files which are not in the index are removed on eviction.
+    """
+
+    # Seconds to wait for the lock of the index. A lock file older than this was left behind by a crashed process.
+    lock_timeout = 30
+
+    def __init__(self, directory: str | Path | None = None, ttl: float = 24 * 3600, max_bytes: int = 2 * 2**30):
+        """Initialize the cache.
+
+        Args:
+        ----
+        directory (str|Path, optional): Directory of the cache files. Defaults to ~/.cache/riselib/dw.
+        ttl (float, optional): Default time to live of the entries in seconds. Defaults to one day.
+        max_bytes (int, optional): Maximum total size of the cached files in bytes. Defaults to 2 GiB.
+
+        """
+        self.directory = Path(directory) if directory is not None else Path.home() / '.cache' / 'riselib' / 'dw'
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._index_path = self.directory / 'index.json'
+        self._lock_path = self.directory / 'index.lock'
+        self._index_signature = None
+        self._index = self._load_index()
+
+    def __repr__(self) -> str:
+        """Return a string representation of the cache."""
+        return f'{self.__class__.__name__}({str(self.directory)!r}, ttl={self.ttl}, max_bytes={self.max_bytes})'
+
+    def _get_index_signature(self) -> tuple | None:
+        """Get the modification time and size of the index file to detect changes by other caches."""
+        try:
+            stat = self._index_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_index(self) -> dict:
+        """Load the index, starting with an empty cache if it is missing or unreadable."""
+        self._index_signature = self._get_index_signature()
+        if self._index_signature is None:
+            return {}
+        try:
+            return json.loads(self._index_path.read_text())
+        except (OSError, ValueError):
+            log.warning(f'Could not read the query cache index {self._index_path}, starting with an empty cache.')
+            return {}
+
+    def _refresh_index(self) -> None:
+        """Reload the index if it was changed by another cache on the same directory."""
+        if self._get_index_signature() != self._index_signature:
+            self._index = self._load_index()
+
+    def _save_index(self) -> None:
+        """Write the index atomically."""
+        temp_path = self._index_path.with_suffix('.tmp')
+        temp_path.write_text(json.dumps(self._index, indent=1))
+        os.replace(temp_path, self._index_path)
+        self._index_signature = self._get_index_signature()
+
+    @contextlib.contextmanager
+    def _locked_index(self) -> Iterator[dict]:
+        """Lock the index against other threads and processes, reload it and save the changes made in the context."""
+        with self._lock, _lock_file(self._lock_path, self.lock_timeout, f'the query cache index {self._index_path}'):
+            self._index = self._load_index()
+            yield self._index
+            self._save_index()
+
+    @staticmethod
+    def make_key(
+        table: str,
+        database: str,
+        columns: list | None = None,
+        conditions: dict | None = None,
+        limit: int | None = None,
+        **options: dict,
+    ) -> str:
+        """Get the cache key of a query.
+
+        Equivalent queries get the same key: the conditions are sorted by column, the values of list conditions are
+        sorted and de-duplicated and single-value lists are treated like the value itself. Further options of the
+        query (e.g. aggregations) are part of the key if they are not None.
+
+        Returns:
+        -------
+        key (str): Hex digest identifying the query.
+
+        """
+
+        def _normalize_value(val: object) -> object:
+            if isinstance(val, collections.abc.Sequence | np.ndarray) and not isinstance(val, str):
+                val = sorted({_python_value(v) for v in val}, key=repr)
+                return val[0] if len(val) == 1 else val
+            return _python_value(val)
+
+        query = {
+            'table': table,
+            'database': database,
+            'columns': list(columns) if columns else None,
+            'conditions': {col: _normalize_value(val) for col, val in sorted((conditions or {}).items())},
+            'limit': limit,
+            **{name: value for name, value in options.items() if value is not None},
+        }
+        return hashlib.sha256(json.dumps(query, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        """Get a cached result or None if there is no valid entry for the key."""
+        with self._lock:
+            self._refresh_index()
+            entry = self._index.get(key)
+            path = self.directory / entry['file'] if entry is not None else None
+            if entry is not None and (time.time() > entry['expires'] or not path.exists()):
+                with self._locked_index() as index:
+                    # Check again, another cache may have stored the entry again in the meantime
+                    entry = index.get(key)
+                    if entry is not None and (time.time() > entry['expires'] or not path.exists()):
+                        self._remove(key)
+                entry = None
+
+        df = None
+        if entry is not None:
+            # The modification time of the file is the last access of the entry for the LRU eviction
+            try:
+                os.utime(path)
+                df = pd.read_parquet(path)
+            except FileNotFoundError:
+                # Evicted by another cache in the meantime
+                df = None
+        with self._lock:
+            if df is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return df
+
+    def put(self, key: str, df: pd.DataFrame, ttl: float | None = None, **info: dict) -> None:
+        """Store a result.
+
+        Args:
+        ----
+        key (str): Key of the query, see `make_key`.
+        df (pd.DataFrame): The result.
+        ttl (float, optional): Time to live of the entry in seconds. Defaults to the ttl of the cache.
+        **info (dict): Further information stored in the index and used by `invalidate`, e.g. table and database.
+
+        """
+        file_name = f'{key}.parquet'
+        temp_path = self.directory / f'{key}.{os.getpid()}.{threading.get_ident()}.tmp'
+        df.to_parquet(temp_path)
+        with self._locked_index() as index:
+            os.replace(temp_path, self.directory / file_name)
+            now = time.time()
+            index[key] = {
+                **info,
+                'file': file_name,
+                'n_bytes': (self.directory / file_name).stat().st_size,
+                'created': now,
+                'expires': now + (self.ttl if ttl is None else ttl),
+            }
+            self._evict()
+
+    def _remove(self, key: str) -> None:
+        """Remove an entry and its file."""
+        entry = self._index.pop(key)
+        (self.directory / entry['file']).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        """Remove expired entries and then the least recently used ones until the cache fits into max_bytes.
+
+        Must be called with the locked index. Also removes the Parquet files which are not in the index.
+        """
+        now = time.time()
+        for key in [key for key, entry in self._index.items() if now > entry['expires']]:
+            self._remove(key)
+
+        last_access = {}
+        for key, entry in list(self._index.items()):
+            try:
+                last_access[key] = (self.directory / entry['file']).stat().st_mtime
+            except FileNotFoundError:
+                del self._index[key]
+        by_last_access = sorted(last_access, key=last_access.get)
+        while by_last_access and self.n_bytes > self.max_bytes:
+            self._remove(by_last_access.pop(0))
+
+        self._collect_garbage()
+
+    def _collect_garbage(self) -> None:
+        """Remove the Parquet files which are not in the index. Must be called with the locked index."""
+        files = {entry['file'] for entry in self._index.values()}
+        for path in self.directory.glob('*.parquet'):
+            if path.name not in files:
+                path.unlink(missing_ok=True)
+
+    def invalidate(self, table: str | None = None, database: str | None = None) -> int:
+        """Remove all entries of a table and/or database.
+
+        Args:
+        ----
+        table (str, optional): Remove the entries of this table. If not provided, the entries of all tables.
+        database (str, optional): Remove the entries of this database. If not provided, the entries of all databases.
+
+        Returns:
+        -------
+        n_entries (int): The number of removed entries.
+
+        """
+        with self._locked_index() as index:
+            keys = [
+                key
+                for key, entry in index.items()
+                if (table is None or entry.get('table') == table)
+                and (database is None or entry.get('database') == database)
+            ]
+            for key in keys:
+                self._remove(key)
+            self._collect_garbage()
+        return len(keys)
+
+    def clear(self) -> None:
+        """Remove all entries and reset the statistics."""
+        self.invalidate()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def n_bytes(self) -> int:
+        """Total size of the cached files in bytes."""
+        return sum(entry['n_bytes'] for entry in self._index.values())
 
+    def stats(self) -> dict:
+        """Get the hit and miss counts, number of entries and size of the cache."""
+        with self._lock:
+            self._refresh_index()
+        return {'hits': self.hits, 'misses': self.misses, 'n_entries': len(self._index), 'n_bytes': self.n_bytes}
+
+
+_query_cache = None
+
+
+def enable_query_cache(
+    directory: str | Path | None = None, ttl: float = 24 * 3600, max_bytes: int = 2 * 2**30
+) -> QueryCache:
+    """Cache the results of all `export_data` calls on disk, see `QueryCache` for the arguments.
+
+    Returns:
+    -------
+    cache (QueryCache): The cache, e.g. to get its statistics or invalidate entries.
+
+    """
+    global _query_cache
+    _query_cache = QueryCache(directory, ttl, max_bytes)
+    return _query_cache
+
+
+def disable_query_cache() -> None:
+    """Stop caching the results of `export_data` calls. The cached files are kept."""
+    global _query_cache
+    _query_cache = None
+
+
+class QueryMetrics:
+
+    """Timings, size and cache use of a single `export_data` call.
+
+    The time is split into the phases 'connect' (checking out a pooled connection), 'execute' (the database running the
+    statements until the first rows are ready), 'fetch' (transferring the rows into a DataFrame), 'postprocess'
+    (creating the derived columns) and 'cache' (reading from or writing to the query cache). A phase nested in another
+    one is not counted in the outer phase, so the phases add up to the total time.
+    """
+
+    def __init__(self, table: str, database: str, columns: list | None = None, conditions: dict | None = None):
+        """Initialize the metrics of a query, see `export_data` for the arguments."""
+        self.table = table
+        self.database = database
+        self.columns = list(columns) if columns else None
+        self.conditions = _describe_conditions(conditions)
+        self.started = pd.Timestamp.now()
+        self.phases = dict.fromkeys(QUERY_PHASES, 0.0)
+        self.rows = 0
+        self.n_bytes = 0
+        self.cache_hit = False
+        self._active = []  # Running phases as [name, start, seconds of nested phases]
+
+    def __repr__(self) -> str:
+        """Return a string representation of the metrics."""
+        return f'{self.__class__.__name__}({self.table!r}, rows={self.rows}, total={self.total:.3f}s)'
+
+    @property
+    def total(self) -> float:
+        """Total time of the query in seconds."""
+        return sum(self.phases.values())
+
+    def start_phase(self, name: str) -> None:
+        """Start timing a phase. Phases can be nested and have to be ended in reverse order."""
+        self._active.append([name, time.perf_counter(), 0.0])
+
+    def end_phase(self) -> None:
+        """End the phase started last and add its time without nested phases."""
+        name, start, nested = self._active.pop()
+        elapsed = time.perf_counter() - start
+        self.phases[name] += elapsed - nested
+        if self._active:
+            self._active[-1][2] += elapsed
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the code in the context as phase."""
+        self.start_phase(name)
+        try:
+            yield
+        finally:
+            self.end_phase()
+
+    @contextlib.contextmanager
+    def track_execute(self, conn: sa.engine.Connection) -> Iterator[None]:
+        """Time all statements executed on a connection in the context as 'execute' phase."""
+        n_active = len(self._active)
+
+        def _before_execute(*args: tuple) -> None:
+            self.start_phase('execute')
+
+        def _after_execute(*args: tuple) -> None:
+            self.end_phase()
+
+        sa.event.listen(conn, 'before_cursor_execute', _before_execute)
+        sa.event.listen(conn, 'after_cursor_execute', _after_execute)
+        try:
+            yield
+        finally:
+            sa.event.remove(conn, 'before_cursor_execute', _before_execute)
+            sa.event.remove(conn, 'after_cursor_execute', _after_execute)
+            # A failed statement does not end its phase
+            while len(self._active) > n_active:
+                self.end_phase()
+
+    def as_dict(self) -> dict:
+        """Get the metrics as flat dictionary, e.g. as row of a DataFrame."""
+        return {
+            'started': self.started,
+            'table': self.table,
+            'database': self.database,
+            'columns': ', '.join(self.columns) if self.columns else '*',
+            'conditions': self.conditions,
+            **self.phases,
+            'total': self.total,
+            'rows': self.rows,
+            'bytes': self.n_bytes,
+            'cache_hit': self.cache_hit,
+        }
+
+
+# Metrics of the latest export_data calls of the session
+_query_log = collections.deque(maxlen=QUERY_LOG_SIZE)
+_query_log_lock = threading.Lock()
+
+
+def _describe_conditions(conditions: dict | None) -> str:
+    """Describe query conditions in a short string. Lists of more than five values are shown by their length."""
+    parts = []
+    for col, val in sorted((conditions or {}).items()):
+        if isinstance(val, collections.abc.Sequence | np.ndarray) and not isinstance(val, str):
+            val = [_python_value(v) for v in val]
+            parts.append(f'{col}={val!r}' if len(val) <= 5 else f'{col}=[{len(val)} values]')
+        else:
+            parts.append(f'{col}={_python_value(val)!r}')
+    return ', '.join(parts)
+
+
+def _record_query(metrics: QueryMetrics, df: pd.DataFrame) -> None:
+    """Add the size of the result to the metrics of a query, store them in the session log and log them."""
+    metrics.rows = len(df)
+    metrics.n_bytes = int(df.memory_usage(index=False).sum())
+    with _query_log_lock:
+        _query_log.append(metrics)
+
+    phases = ', '.join(f'{name} {seconds:.3f}s' for name, seconds in metrics.phases.items() if seconds)
+    source = ' from cache' if metrics.cache_hit else ''
+    log.debug(
+        f'Exported {metrics.rows} rows ({metrics.n_bytes / 2**20:.1f} MiB) of {metrics.table}{source} in '
+        f'{metrics.total:.3f}s ({phases}).'
+    )
+
+
+def get_query_log() -> list[QueryMetrics]:
+    """Get the metrics of the latest `export_data` calls of the session, oldest first."""
+    with _query_log_lock:
+        return list(_query_log)
+
+
+def clear_query_log() -> None:
+    """Remove all metrics from the session log."""
+    with _query_log_lock:
+        _query_log.clear()
+
+
+def query_report(by: list | str = ('table', 'conditions')) -> pd.DataFrame:
+    """Summarize the timings of the `export_data` calls of the session.
+
+    Args:
+    ----
+    by (list|str, optional): Fields of the metrics to group the calls by, e.g. 'table' or ['table', 'columns'].
+        Defaults to the table and the conditions.
+
+    Returns:
+    -------
+    report (pd.DataFrame): The number of queries and cache hits, the sums of the phase timings in seconds, the rows
+        and the bytes per group, sorted by the total time (largest first).
+
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    records = pd.DataFrame([metrics.as_dict() for metrics in get_query_log()])
+    if records.empty:
+        return pd.DataFrame(columns=[*by, 'queries', 'cache_hits', *QUERY_PHASES, 'total', 'rows', 'bytes'])
+
+    sums = {name: (name, 'sum') for name in [*QUERY_PHASES, 'total', 'rows', 'bytes']}
+    report = records.groupby(by, dropna=False).agg(queries=('total', 'size'), cache_hits=('cache_hit', 'sum'), **sums)
+
+    return report.sort_values('total', ascending=False).reset_index()
+
+
+def _python_value(val: object) -> object:
+    """Convert NumPy scalars to Python values, which all database drivers can bind."""
+    return val.item() if isinstance(val, np.generic) else val
+
+
+def _sql_type(values: list, dialect_name: str) -> str:
+    """Get the SQL type of the value column of a temporary IN-list table."""
+    if all(isinstance(val, int | np.integer) and not isinstance(val, bool) for val in values):
+        return 'BIGINT'
+    if all(isinstance(val, int | float | np.number) and not isinstance(val, bool) for val in values):
+        return 'FLOAT' if dialect_name == 'mssql' else 'DOUBLE PRECISION'
+    return 'NVARCHAR(4000)' if dialect_name == 'mssql' else 'VARCHAR'
+
+
+@contextlib.contextmanager
+def _in_list_tables(conn: sa.engine.Connection, temp_tables: dict) -> Iterator[None]:
+    """Create and fill the temporary tables of large IN lists on a connection and drop them afterwards.
+
+    Temporary tables live as long as the session, so they are only visible to queries on the same connection.
+    """
+    dialect_name = conn.dialect.name
+    created = []
+    try:
+        for name, values in temp_tables.items():
+            if dialect_name == 'mssql':
+                conn.execute(sa.text(f'CREATE TABLE {name} (value {_sql_type(values, dialect_name)})'))
+            else:
+                conn.execute(sa.text(f'CREATE TEMPORARY TABLE {name} (value {_sql_type(values, dialect_name)})'))
+            created.append(name)
+            conn.execute(sa.text(f'INSERT INTO {name} (value) VALUES (:value)'), [{'value': val} for val in values])
+        yield
+    finally:
+        for name in created:
+            conn.execute(sa.text(f'DROP TABLE {name}'))
+        if created:
+            # Otherwise the drop is rolled back when the connection is returned to the pool
+            conn.commit()
+
+
+def _aggregate_outputs(aggregations: dict) -> list[tuple[str, str, str]]:
+    """Get the output column, function and source column of every aggregate, see `export_data`."""
+    outputs = []
+    for col, funcs in aggregations.items():
+        funcs = [funcs] if isinstance(funcs, str) else list(funcs)
+        for func in funcs:
+            if func not in AGGREGATE_FUNCTIONS:
+                msg = f"Unknown aggregate function '{func}'. Use one of {list(AGGREGATE_FUNCTIONS)}."
+                raise ValueError(msg)
+            outputs.append((col if len(funcs) == 1 else f'{col}_{func}', func, col))
+    return outputs
+
+
+def _aggregated_columns(group_by: list | None, aggregations: dict) -> list:
+    """Get the columns of an aggregated result except 'datetime', which is created by the time grain."""
+    return list(group_by or []) + [output for output, _, _ in _aggregate_outputs(aggregations)]
+
+
+def _build_query(
+    table: str,
+    database: str,
+    columns: list | None,
+    conditions: dict | None,
+    limit: int | None,
+    distinct: bool = False,
+    group_by: list | None = None,
+    aggregations: dict | None = None,
+    time_grain: str | None = None,
+    where_sql: tuple[str, dict] | None = None,
+    inline_values: bool = False,
+) -> tuple[sa.TextClause, dict]:
+    """Build the SQL query of `export_data`, see there for the arguments. With distinct, duplicate rows are dropped.
+    where_sql is an additional filter as SQL expression and dictionary of its bound parameters.
+
+    The condition values are bound as parameters, so the query text only depends on the filtered columns (and the
+    length of IN lists) and the server can reuse its plan. IN lists longer than IN_LIST_TEMP_TABLE_THRESHOLD are
+    loaded into temporary tables, as are the longest further lists while the statement has more than
+    MAX_BIND_PARAMETERS parameters. The temporary tables are returned as dictionary of table name and values and have
+    to be created with `_in_list_tables` on the connection executing the query. With inline_values, all values are
+    written into the query text instead (e.g. to show the query), so no temporary tables are needed.
     """
     db_cols = columns
 
@@ -61,70 +770,1025 @@ def export_data(
     else:
         select_string = '*'
 
-    # Define where clause string
-    if conditions:
+    # Aggregate on the server, grouped by the given columns and the columns of the time grain
+    group_clause = ''
+    if aggregations:
+        if columns:
+            msg = 'columns can not be combined with aggregations, use group_by to select the grouping columns.'
+            raise ValueError(msg)
+        if time_grain is not None and time_grain not in TIME_GRAINS:
+            msg = f"Unknown time_grain '{time_grain}'. Use one of {list(TIME_GRAINS)}."
+            raise ValueError(msg)
+        group_cols = ['Region' if col == 'Region_Nospace' else col for col in group_by or []]
+        group_cols += TIME_GRAINS[time_grain] if time_grain is not None else []
+        quoted_group_cols = [f'"{col}"' for col in group_cols]
+        aggregates = [
+            AGGREGATE_FUNCTIONS[func].format(f'"{col}"') + f' AS "{output}"'
+            for output, func, col in _aggregate_outputs(aggregations)
+        ]
+        select_string = ','.join(quoted_group_cols + aggregates)
+        if group_cols:
+            group_clause = f'GROUP BY {",".join(quoted_group_cols)}\n    ORDER BY {",".join(quoted_group_cols)}'
+    elif group_by or time_grain:
+        msg = 'group_by and time_grain require aggregations.'
+        raise ValueError(msg)
+
+    # Normalise the condition values, single-value lists are compared by equality
+    values = {}
+    for col, val in (conditions or {}).items():
+        if isinstance(val, collections.abc.Sequence | np.ndarray) and not isinstance(val, str):
+            val = [_python_value(v) for v in val]
+            if len(val) == 1:
+                val = val[0]
+        else:
+            val = _python_value(val)
+        values[col] = val
+
+    # Pass long IN lists through temporary tables, and further the longest lists until the parameters of the whole
+    # statement fit into the limit of the server
+    temp_table_columns = set()
+    if not inline_values:
+        lists = sorted((col for col, val in values.items() if isinstance(val, list)), key=lambda col: -len(values[col]))
+        n_params = len(where_sql[1]) if where_sql is not None else 0
+        n_params += sum(len(val) if isinstance(val, list) else 1 for val in values.values())
+        for col in lists:
+            if len(values[col]) <= IN_LIST_TEMP_TABLE_THRESHOLD and n_params <= MAX_BIND_PARAMETERS:
+                break
+            temp_table_columns.add(col)
+            n_params -= len(values[col])
+
+    # Define where clause string with bound parameters
+    bind_params = []
+    temp_tables = {}
+    if values:
         where_clause = 'WHERE '
-        for col, val in conditions.items():
-            if ' ' in col:
-                col = f'[{col}]'
-            if isinstance(val, str):
-                where_clause += f" {col} = '{val}'"
-            elif isinstance(val, collections.abc.Sequence) and len(val) == 1:
-                where_clause += f" {col} = '{val[0]}'"
-            elif isinstance(val, collections.abc.Sequence):
-                where_clause += f' {col} in {tuple(val)}'
+        for i, (col, val) in enumerate(values.items()):
+            quoted_col = f'[{col}]' if ' ' in col else col
+            if not isinstance(val, list):
+                where_clause += f' {quoted_col} = :p{i}'
+                bind_params.append(sa.bindparam(f'p{i}', val))
+            elif col in temp_table_columns:
+                name = f'riselib_in_{uuid.uuid4().hex[:12]}_{i}'
+                if _dialect_name(database) == 'mssql':
+                    name = f'#{name}'
+                temp_tables[name] = val
+                where_clause += f' {quoted_col} IN (SELECT value FROM {name})'
             else:
-                where_clause += f' {col} = {val}'
+                where_clause += f' {quoted_col} IN :p{i}'
+                bind_params.append(sa.bindparam(f'p{i}', val, expanding=True))
             where_clause += '\n\tAND'
-        where_clause = where_clause.rstrip('\n\tAND')
+        where_clause = where_clause.removesuffix('\n\tAND')
     else:
         where_clause = ''
 
-    # Add limit clause
+    if where_sql is not None:
+        sql, params = where_sql
+        where_clause += f'\n\tAND ({sql})' if where_clause else f'WHERE ({sql})'
+        bind_params += [sa.bindparam(name, value) for name, value in params.items()]
+
+    # Add limit clause (SQL Server uses TOP, most other databases LIMIT)
+    limit_clause = ''
     if limit is not None:
-        select_string = f'TOP {limit} {select_string}'
+        if _dialect_name(database) == 'mssql':
+            select_string = f'TOP {limit} {select_string}'
+        else:
+            limit_clause = f'LIMIT {limit}'
+
+    if distinct:
+        select_string = f'DISTINCT {select_string}'
 
     query_string = f"""
     SELECT {select_string}
     FROM {table}
     {where_clause}
+    {group_clause}
+    {limit_clause}
     """
 
-    query_string = sa.text(query_string)
-    if return_query_string:
-        return query_string
+    query = sa.text(query_string).bindparams(*bind_params)
+    if inline_values:
+        engine = _engines.get(database)
+        dialect = engine.dialect if engine is not None else mssql.dialect()
+        query = sa.text(str(query.compile(dialect=dialect, compile_kwargs={'literal_binds': True})))
 
-    # Connect to DW
-    connection_string = (
-        'DRIVER={SQL Server};SERVER=dw.ad.iea.org,14330;DATABASE=' + database + ';Trusted_Connection=yes'
-    )
-    connection_url = sa.engine.URL.create('mssql+pyodbc', query={'odbc_connect': connection_string})
-    engine = sa.create_engine(connection_url)
+    return query, temp_tables
+
+
+def _assemble_datetime(year: pd.Series, month: pd.Series, day: pd.Series, hour: pd.Series) -> pd.Series:
+    """Assemble datetimes arithmetically from integer components, like pd.to_datetime on a DataFrame but faster.
+
+    The months since 1970 are converted to datetime64[M] and the days and hours are added as timedeltas. Invalid dates
+    (e.g. February 30) raise a ValueError like pd.to_datetime. Components with missing values fall back to
+    pd.to_datetime.
+    """
+    components = [year, month, day, hour]
+    if any(component.isna().any() for component in components):
+        parts = pd.DataFrame({'Year': year, 'Month': month, 'Day': day, 'Hour': hour})
+        return pd.to_datetime(parts)
+
+    year, month, day, hour = (np.asarray(component, dtype=np.int64) for component in components)
+    month_start = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    dates = month_start.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+    if ((month < 1) | (month > 12) | (day < 1) | (dates.astype('datetime64[M]') != month_start)).any():
+        msg = 'Cannot assemble datetimes from invalid Year, Month and Day values.'
+        raise ValueError(msg)
+    datetimes = dates.astype('datetime64[ns]') + hour.astype('timedelta64[h]')
+
+    return pd.Series(datetimes, index=components[0].index)
 
-    # Execute query (use context manager to ensure connection is closed)
-    with engine.begin() as conn:
-        df = pd.read_sql(query_string, conn)
+
+def _region_nospace(region: pd.Series) -> pd.Series:
+    """Replace the spaces in the region names and the names '-' and '/' by underscores.
+
+    The replacement runs once per distinct name instead of once per row. Categorical regions give a categorical result.
+    """
+    codes, names = pd.factorize(region)
+    new_names = pd.Series(names).str.replace(' ', '_').replace('-', '_').replace('/', '_')
+    if isinstance(region.dtype, pd.CategoricalDtype):
+        categories = pd.Index(new_names.unique())
+        new_codes = np.where(codes >= 0, categories.get_indexer(new_names)[codes], -1)
+        return pd.Series(pd.Categorical.from_codes(new_codes, categories), index=region.index)
+
+    return pd.Series(new_names.array.take(codes, allow_fill=True), index=region.index)
+
+
+def _categorical_columns(df: pd.DataFrame) -> list:
+    """Get the text columns with few distinct values (e.g. Region), which are stored as categoricals when typed."""
+    text_columns = df.select_dtypes(include=['object', 'string']).columns
+    return [col for col in text_columns if len(df) and df[col].nunique() <= CATEGORICAL_MAX_UNIQUE_RATIO * len(df)]
+
+
+def _downcast(df: pd.DataFrame, categorical_columns: list) -> pd.DataFrame:
+    """Downcast the numeric columns and convert the given text columns to categoricals.
+
+    Integers are downcast to the smallest integer type holding all values, floats to float32 (about 7 significant
+    digits).
+    """
+    converted = {}
+    for col in df.columns:
+        if col in categorical_columns:
+            converted[col] = df[col].astype('category')
+        elif pd.api.types.is_integer_dtype(df[col]):
+            converted[col] = pd.to_numeric(df[col], downcast='integer')
+        elif pd.api.types.is_float_dtype(df[col]):
+            converted[col] = df[col].astype(np.float32)
+
+    return df.assign(**converted) if converted else df
+
+
+def _concat_typed(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate typed DataFrames and keep categorical columns categorical if their categories differ."""
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype) and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = pd.api.types.union_categoricals([frame[col] for frame in frames])
+
+    return df
+
+
+def _read_typed(
+    query_string: sa.TextClause, conn: sa.engine.Connection, chunksize: int = TYPED_FETCH_CHUNKSIZE
+) -> Iterator[pd.DataFrame]:
+    """Read a query in chunks and downcast every chunk, see `_downcast`.
+
+    The categorical columns are chosen from the first chunk, so all chunks have the same kind of columns.
+    """
+    categorical_columns = None
+    for chunk in pd.read_sql(query_string, conn, chunksize=chunksize):
+        if categorical_columns is None:
+            categorical_columns = _categorical_columns(chunk)
+        yield _downcast(chunk, categorical_columns)
+
+
+def _postprocess(df: pd.DataFrame, columns: list | None, time_grain: str | None = None) -> pd.DataFrame:
+    """Create the derived 'datetime' and 'Region_Nospace' columns of `export_data` if requested.
+
+    With a time grain, 'datetime' is created from the columns of the grain and set to the start of every period.
+    """
+    if time_grain is not None:
+        components = ['Year', 'Month', 'Day', 'Hour'][: len(TIME_GRAINS[time_grain])]
+        df = df.rename(columns={'Code Month': 'Month'})
+        defaults = {'Month': 1, 'Day': 1, 'Hour': 0}
+        parts = pd.DataFrame(
+            {col: df[col] if col in components else defaults[col] for col in ['Year', 'Month', 'Day', 'Hour']},
+            index=df.index,
+        )
+        df = df.drop(columns=components)
+        df.insert(0, 'datetime', _assemble_datetime(parts['Year'], parts['Month'], parts['Day'], parts['Hour']))
 
     if columns:
         if 'datetime' in columns:
             df = (
                 df.drop(columns=['Month'], errors='ignore')
                 .rename(columns={'Code Month': 'Month'})
-                .assign(datetime=lambda x: pd.to_datetime(x[['Year', 'Month', 'Day', 'Hour']]))
+                .assign(datetime=lambda x: _assemble_datetime(x['Year'], x['Month'], x['Day'], x['Hour']))
                 .drop(columns=['Year', 'Month', 'Day', 'Hour'])
             )
         if 'Region_Nospace' in columns:
-            df = df.assign(
-                Region_Nospace=lambda x: x.Region.str.replace(' ', '_').replace('-', '_').replace('/', '_')
-            ).drop(columns=['Region'])
+            df = df.assign(Region_Nospace=lambda x: _region_nospace(x.Region)).drop(columns=['Region'])
 
         assert all(col in df.columns for col in columns), 'Not all columns were returned from the query.'
 
     return df
 
 
+def export_data(
+    table: str,
+    database: str,
+    columns: list = None,
+    conditions: dict = None,
+    return_query_string: bool = False,
+    limit: int = None,
+    cache: QueryCache | bool | None = None,
+    group_by: list = None,
+    aggregations: dict = None,
+    time_grain: str = None,
+    typed: bool = False,
+) -> pd.DataFrame:
+    """Get Data from IEA Data Warehouse.
+
+    This function exports data from a specified database table from the IEA data warehouse. It allows some additional
+    functionality and is a simple wrapper for the actual sql query. For results too large to fit into memory, use
+    `export_data_chunks` or `export_to_parquet`. The timings, size and cache use of every call are recorded as
+    `QueryMetrics` in the session log (see `get_query_log` and `query_report`) and logged at debug level.
+
+    Args:
+    ----
+    table (str): The name of the table from which to export data.
+    database (str): The name of the database where the table is located.
+    columns (list, optional): A list of column names to be included in the output. If not provided, all columns are
+        included. The columns are checked against the metadata of the table (see `get_columns`) before the query
+        runs, so unknown columns raise a ValueError without downloading any data.
+    conditions (dict, optional): A dictionary where the keys are column names and the values are conditions for
+        filtering the data. The values are sent as bound parameters, long lists through a temporary table. #todo right
+        now only supports equality and exists in list conditions
+    return_query_string (bool, optional): If True, the function will return the SQL query string instead of executing
+        the query. Useful for debugging. The condition values are written into the query text, also for long lists
+        which are otherwise passed through a temporary table.
+    limit (int, optional): The maximum number of rows to return. If not provided, all rows are returned.
+    cache (QueryCache|bool, optional): Cache to get the result from or store it in. If not provided, the cache set
+        with `enable_query_cache` is used if any. If False, no cache is used.
+    group_by (list, optional): Columns to group the aggregated data by, e.g. ['Region_Nospace'].
+    aggregations (dict, optional): If given, the data is aggregated on the server and only the aggregated rows are
+        returned. A dictionary where the keys are column names and the values are one or a list of 'sum', 'mean',
+        'min', 'max' and 'count', e.g. {'Value': 'mean'}. With multiple functions, the result columns are named
+        '<column>_<function>'. Can not be combined with columns.
+    time_grain (str, optional): Aggregate per 'year', 'month', 'day' or 'hour' (grouped by Year, Code Month, Day and
+        Hour). The result gets a 'datetime' column with the start of every period.
+    typed (bool, optional): If True, the data is fetched in chunks and every chunk is stored compactly: integers are
+        downcast, floats are stored as float32 (about 7 significant digits) and text columns with few distinct values
+        (e.g. Region) as categoricals. This uses several times less memory for large hourly tables. Defaults to False.
+
+    Returns:
+    -------
+    df (pd.DataFrame): A DataFrame containing the exported data.
+    or
+    query_string (str): The SQL query string, if return_query_string is True.
+
+    Example:
+    -------
+    >>> export_data('V_Table1', 'Division_EDC', group_by=['Region'], aggregations={'Value': 'mean'}, time_grain='month')
+
+    """
+    query_string, temp_tables = _build_query(
+        table,
+        database,
+        columns,
+        conditions,
+        limit,
+        group_by=group_by,
+        aggregations=aggregations,
+        time_grain=time_grain,
+        inline_values=return_query_string,
+    )
+    if return_query_string:
+        return query_string
+    if aggregations:
+        columns = _aggregated_columns(group_by, aggregations)
+
+    metrics = QueryMetrics(table, database, columns, conditions)
+    if cache is None:
+        cache = _query_cache
+    if cache:
+        key = QueryCache.make_key(
+            table,
+            database,
+            columns,
+            conditions,
+            limit,
+            group_by=group_by,
+            aggregations=aggregations,
+            time_grain=time_grain,
+            typed=typed or None,
+        )
+        with metrics.phase('cache'):
+            df = cache.get(key)
+        if df is not None:
+            metrics.cache_hit = True
+            _record_query(metrics, df)
+            return df
+
+    # Check the requested columns before running the query (columns are the aggregated columns if aggregating)
+    _validate_columns(
+        table, database, None if aggregations else columns, conditions, group_by, aggregations, time_grain
+    )
+
+    # Execute query on a pooled connection (the context manager returns it to the pool)
+    with metrics.phase('connect'):
+        conn = get_engine(database).connect()
+    with conn, metrics.phase('fetch'), metrics.track_execute(conn), _in_list_tables(conn, temp_tables):
+        if typed:
+            frames = []
+            for chunk in _read_typed(query_string, conn):
+                with metrics.phase('postprocess'):
+                    frames.append(_postprocess(chunk, columns, time_grain))
+            with metrics.phase('postprocess'):
+                df = _concat_typed(frames)
+        else:
+            df = pd.read_sql(query_string, conn)
+    if not typed:
+        with metrics.phase('postprocess'):
+            df = _postprocess(df, columns, time_grain)
+
+    if cache:
+        with metrics.phase('cache'):
+            cache.put(key, df, table=table, database=database)
+    _record_query(metrics, df)
+
+    return df
+
+
+def export_data_chunks(
+    table: str,
+    database: str,
+    columns: list = None,
+    conditions: dict = None,
+    limit: int = None,
+    chunksize: int = 100_000,
+    group_by: list = None,
+    aggregations: dict = None,
+    time_grain: str = None,
+    typed: bool = False,
+) -> Iterator[pd.DataFrame]:
+    """Get data from the IEA Data Warehouse in chunks of rows.
+
+    Like `export_data`, but the rows are streamed from the database (with a server-side cursor where the driver
+    supports it) and yielded as DataFrames of at most chunksize rows, so only one chunk is held in memory at a time.
+    The 'datetime' and 'Region_Nospace' columns are created per chunk. The connection is held until the generator is
+    exhausted or closed.
+
+    Args:
+    ----
+    table (str): The name of the table from which to export data.
+    database (str): The name of the database where the table is located.
+    columns (list, optional): A list of column names to be included in the output, see `export_data`.
+    conditions (dict, optional): Conditions for filtering the data, see `export_data`.
+    limit (int, optional): The maximum number of rows to return. If not provided, all rows are returned.
+    chunksize (int, optional): The maximum number of rows per chunk. Defaults to 100,000.
+    group_by (list, optional): Columns to group the aggregated data by, see `export_data`.
+    aggregations (dict, optional): Aggregations to run on the server, see `export_data`.
+    time_grain (str, optional): Time grain of the aggregations, see `export_data`.
+    typed (bool, optional): If True, every chunk is stored compactly, see `export_data`. The categorical columns are
+        chosen from the first chunk, their categories can differ between chunks. Defaults to False.
+
+    Yields:
+    ------
+    df (pd.DataFrame): The next chunk of the exported data.
+
+    """
+    query_string, temp_tables = _build_query(
+        table, database, columns, conditions, limit, group_by=group_by, aggregations=aggregations, time_grain=time_grain
+    )
+    _validate_columns(table, database, columns, conditions, group_by, aggregations, time_grain)
+    if aggregations:
+        columns = _aggregated_columns(group_by, aggregations)
+
+    with (
+        get_engine(database).connect().execution_options(stream_results=True) as conn,
+        _in_list_tables(conn, temp_tables),
+    ):
+        if typed:
+            chunks = _read_typed(query_string, conn, chunksize)
+        else:
+            chunks = pd.read_sql(query_string, conn, chunksize=chunksize)
+        for chunk in chunks:
+            yield _postprocess(chunk, columns, time_grain)
+
+
+@contextlib.contextmanager
+def _replace_on_success(path: Path) -> Iterator[Path]:
+    """Get a temporary path next to path to write a file or directory to, which replaces path when the block succeeds.
+
+    If nothing was written to the temporary path, an existing path is removed. On errors, path is left unchanged.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f'.{path.name}.{uuid.uuid4().hex[:8]}.tmp')
+    try:
+        yield temp_path
+        if path.is_dir():
+            shutil.rmtree(path)
+        if temp_path.exists():
+            os.replace(temp_path, path)
+        else:
+            path.unlink(missing_ok=True)
+    finally:
+        if temp_path.is_dir():
+            shutil.rmtree(temp_path)
+        else:
+            temp_path.unlink(missing_ok=True)
+
+
+def _arrow_type(type_name: str) -> 'pa.DataType':
+    """Get the Arrow type of the values of a database type, see `get_columns`. Unknown types are read as strings."""
+    import pyarrow as pa
+
+    type_name = type_name.lower()
+    if 'int' in type_name:
+        return pa.int64()
+    if type_name in ('bit', 'boolean'):
+        return pa.bool_()
+    if any(name in type_name for name in ('float', 'real', 'double', 'decimal', 'numeric', 'money')):
+        return pa.float64()
+    if type_name == 'date':
+        return pa.date32()
+    if 'date' in type_name or 'time' in type_name:
+        return pa.timestamp('us')
+    return pa.large_string()
+
+
+def _arrow_schema(chunk: pd.DataFrame, table: str, database: str) -> 'pa.Schema':
+    """Get the Arrow schema of an export from its first chunk.
+
+    Arrow gives columns without any value the type null, which the values of later chunks can not be cast to. The
+    type of these columns is taken from the metadata of the table instead, or string if it is not available.
+    """
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+    null_columns = [field.name for field in schema if pa.types.is_null(field.type)]
+    if not null_columns:
+        return schema
+
+    try:
+        metadata = get_columns(table, database)
+        type_names = dict(zip(metadata['name'], metadata['type'], strict=True))
+    except sa.exc.SQLAlchemyError as e:
+        log.debug(f'Types of {table} not available, columns without values are written as strings: {e}')
+        type_names = {}
+    for name in null_columns:
+        schema = schema.set(schema.get_field_index(name), pa.field(name, _arrow_type(type_names.get(name, ''))))
+    return schema
+
+
+def export_to_parquet(
+    path: str | Path,
+    table: str,
+    database: str,
+    columns: list = None,
+    conditions: dict = None,
+    limit: int = None,
+    chunksize: int = 100_000,
+    partition_cols: list = None,
+) -> int:
+    """Export data from the IEA Data Warehouse to Parquet without holding the full result in memory.
+
+    The chunks of `export_data_chunks` are written one by one, either to a single Parquet file or, with partition_cols,
+    to a Parquet dataset partitioned by these columns (one directory per value, e.g. 'Year=2020/'). The schema is
+    fixed by the first chunk, later chunks are cast to it. Columns without any value in the first chunk get the type
+    of the column in the table (see `get_columns`). The export is written next to path first and replaces an existing
+    file or dataset only when it is complete, so no files of previous exports are left behind.
+
+    Args:
+    ----
+    path (str|Path): The Parquet file, or the root directory of the dataset if partition_cols is given.
+    table (str): The name of the table from which to export data.
+    database (str): The name of the database where the table is located.
+    columns (list, optional): A list of column names to be included in the output, see `export_data`.
+    conditions (dict, optional): Conditions for filtering the data, see `export_data`.
+    limit (int, optional): The maximum number of rows to export. If not provided, all rows are exported.
+    chunksize (int, optional): The maximum number of rows fetched and written at once. Defaults to 100,000.
+    partition_cols (list, optional): Columns to partition the dataset by. If not provided, a single file is written.
+
+    Returns:
+    -------
+    n_rows (int): The number of exported rows.
+
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        msg = 'pyarrow is required to export to Parquet. Install it with `pip install pyarrow`.'
+        raise ImportError(msg) from e
+
+    n_rows = 0
+    schema = None
+    writer = None
+    with _replace_on_success(Path(path)) as temp_path:
+        try:
+            for i, chunk in enumerate(export_data_chunks(table, database, columns, conditions, limit, chunksize)):
+                if schema is None:
+                    schema = _arrow_schema(chunk, table, database)
+                arrow_table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                if partition_cols:
+                    pq.write_to_dataset(
+                        arrow_table,
+                        root_path=str(temp_path),
+                        partition_cols=partition_cols,
+                        basename_template=f'part-{i}-{{i}}.parquet',
+                    )
+                else:
+                    if writer is None:
+                        writer = pq.ParquetWriter(str(temp_path), schema)
+                    writer.write_table(arrow_table)
+                n_rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    log.info(f'Exported {n_rows} rows of {table} to {path}.')
+
+    return n_rows
+
+
+def export_data_partitioned(
+    table: str,
+    database: str,
+    partition_by: str,
+    partitions: list = None,
+    n_partitions: int = None,
+    columns: list = None,
+    conditions: dict = None,
+    max_workers: int = 4,
+    parquet_path: str | Path = None,
+    cache: QueryCache | bool | None = None,
+    typed: bool = False,
+) -> pd.DataFrame | int:
+    """Get data from the IEA Data Warehouse with concurrent queries per partition.
+
+    The request is split along a column (e.g. 'Year' or 'Region') into one query per value or per group of values.
+    The queries run concurrently on a bounded thread pool over the pooled connections of the database (see
+    `configure_pool`), so large extracts can use the parallelism of the warehouse. The results are concatenated in
+    the order of the partitions, or written to one Parquet file per partition.
+
+    Args:
+    ----
+    table (str): The name of the table from which to export data.
+    database (str): The name of the database where the table is located.
+    partition_by (str): The column to split the request along. Must be a column of the table.
+    partitions (list, optional): The values of partition_by to export. If not provided, the values in the conditions
+        are used if partition_by is filtered and otherwise all distinct values of the table (with the conditions).
+    n_partitions (int, optional): Number of queries to split the values into (consecutive groups of sorted values). If
+        not provided, one query per value is run.
+    columns (list, optional): A list of column names to be included in the output, see `export_data`.
+    conditions (dict, optional): Conditions for filtering the data, see `export_data`.
+    max_workers (int, optional): Maximum number of concurrent queries. Defaults to 4.
+    parquet_path (str|Path, optional): If given, every partition is written to 'part-<i>.parquet' in this directory
+        (see `export_to_parquet`) instead of being returned. The directory is replaced when all partitions are written.
+    cache (QueryCache|bool, optional): Cache of the partition queries, see `export_data`.
+    typed (bool, optional): If True, the partitions are stored compactly, see `export_data`. Categorical columns stay
+        categorical when the partitions are concatenated. Defaults to False.
+
+    Returns:
+    -------
+    df (pd.DataFrame): A DataFrame containing the exported data of all partitions.
+    or
+    n_rows (int): The number of exported rows, if parquet_path is given.
+
+    """
+    conditions = dict(conditions or {})
+    if partitions is None:
+        if partition_by in conditions:
+            partitions = conditions[partition_by]
+            if isinstance(partitions, str) or not isinstance(partitions, collections.abc.Sequence):
+                partitions = [partitions]
+        else:
+            query_string, temp_tables = _build_query(table, database, [partition_by], conditions, None, distinct=True)
+            with get_engine(database).connect() as conn, _in_list_tables(conn, temp_tables):
+                partitions = pd.read_sql(query_string, conn)[partition_by].dropna().tolist()
+    partitions = sorted(partitions)
+    if not partitions:
+        return 0 if parquet_path is not None else pd.DataFrame(columns=columns)
+
+    n_groups = len(partitions) if n_partitions is None else max(1, min(n_partitions, len(partitions)))
+    groups = [list(group) for group in np.array_split(np.array(partitions, dtype=object), n_groups)]
+    log.info(f'Exporting {table} in {len(groups)} partitions by {partition_by} with {max_workers} workers.')
+
+    def _export_partition(i: int, group: list, directory: Path | None = None) -> pd.DataFrame | int:
+        partition_conditions = {**conditions, partition_by: group}
+        if directory is not None:
+            path = directory / f'part-{i:05d}.parquet'
+            return export_to_parquet(path, table, database, columns, partition_conditions)
+        return export_data(table, database, columns, partition_conditions, cache=cache, typed=typed)
+
+    if parquet_path is not None:
+        # Write the files to a new directory, which replaces the files of previous exports when complete
+        with _replace_on_success(Path(parquet_path)) as temp_dir:
+            temp_dir.mkdir()
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(_export_partition, range(len(groups)), groups, [temp_dir] * len(groups)))
+        return sum(results)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_export_partition, range(len(groups)), groups))
+
+    return _concat_typed(results) if typed else pd.concat(results, ignore_index=True)
+
+
+SYNC_STATE_FILE = '_sync_state.json'
+SYNC_LOCK_FILE = '_sync.lock'
+
+# Seconds to wait for the lock of a mirror. A lock file not touched for this long was left behind by a crashed run.
+SYNC_LOCK_TIMEOUT = 600
+
+
+def _mirror_dir(directory: str | Path, database: str, table: str) -> Path:
+    """Get the directory of the local mirror of a table."""
+    return Path(directory) / database / table
+
+
+def _load_sync_state(mirror_dir: Path) -> dict:
+    """Load the state of a local mirror or an empty state if it was not synced yet."""
+    state_path = mirror_dir / SYNC_STATE_FILE
+    if not state_path.exists():
+        return {'watermark': None, 'watermark_type': None, 'files': [], 'n_rows': 0}
+    return json.loads(state_path.read_text())
+
+
+def _commit_sync_state(mirror_dir: Path, state: dict) -> None:
+    """Write the state of a local mirror atomically. Files of the mirror which are not in the state are removed.
+
+    Must be called with the lock of the mirror, otherwise the new files of other runs are removed.
+    """
+    temp_path = mirror_dir / f'{SYNC_STATE_FILE}.tmp'
+    temp_path.write_text(json.dumps(state, indent=1))
+    os.replace(temp_path, mirror_dir / SYNC_STATE_FILE)
+    for path in mirror_dir.glob('*.parquet'):
+        if path.name not in state['files']:
+            path.unlink()
+
+
+def _encode_watermark(value: object) -> tuple[object, str]:
+    """Encode a watermark value and its type for the JSON state."""
+    if isinstance(value, pd.Timestamp | np.datetime64):
+        return pd.Timestamp(value).isoformat(), 'datetime'
+    if isinstance(value, bytes):
+        return value.hex(), 'bytes'
+    return _python_value(value), 'value'
+
+
+def _decode_watermark(value: object, watermark_type: str) -> object:
+    """Decode a watermark value of the JSON state."""
+    if watermark_type == 'datetime':
+        return pd.Timestamp(value)
+    if watermark_type == 'bytes':
+        return bytes.fromhex(value)
+    return value
+
+
+def _watermark_filter(watermark: str, value: object) -> tuple[str, dict]:
+    """Get the SQL filter of all rows beyond a watermark.
+
+    The 'datetime' watermark compares the columns Year, Code Month, Day and Hour lexicographically, all other
+    watermarks are compared as column.
+    """
+    if watermark == 'datetime':
+        value = pd.Timestamp(value)
+        sql = (
+            '"Year" > :wm_year OR ("Year" = :wm_year AND ("Code Month" > :wm_month OR ("Code Month" = :wm_month '
+            'AND ("Day" > :wm_day OR ("Day" = :wm_day AND "Hour" > :wm_hour)))))'
+        )
+        return sql, {'wm_year': value.year, 'wm_month': value.month, 'wm_day': value.day, 'wm_hour': value.hour}
+    return f'"{watermark}" > :wm_value', {'wm_value': value}
+
+
+def _watermark_values(df: pd.DataFrame, watermark: str) -> pd.Series:
+    """Get the watermark values of the rows of an exported chunk."""
+    if watermark in df.columns:
+        return df[watermark]
+    if watermark == 'datetime':
+        return _assemble_datetime(df['Year'], df['Code Month'], df['Day'], df['Hour'])
+    msg = f"The watermark column '{watermark}' is not in the exported data."
+    raise KeyError(msg)
+
+
+def sync_table(
+    table: str,
+    database: str,
+    directory: str | Path,
+    columns: list = None,
+    conditions: dict = None,
+    watermark: str = 'datetime',
+    key_columns: list = None,
+    chunksize: int = 100_000,
+) -> int:
+    """Incrementally sync a warehouse table to a local Parquet mirror.
+
+    Every run only fetches the rows beyond the high-water mark of the previous run, i.e. rows with a later 'datetime'
+    (from the columns Year, Code Month, Day and Hour) or a larger value of another watermark column, e.g. an
+    increasing id or rowversion column. The new rows are appended as new Parquet files or, with key_columns, upserted
+    into the mirror (which rewrites it). The state of the mirror (watermark and files) is committed atomically after
+    the new files are written, so an interrupted run leaves the previous state intact. Concurrent runs on the same
+    mirror wait for each other on a lock file in the mirror directory. Read the mirror with
+    `read_synced_table`.
+
+    Args:
+    ----
+    table (str): The name of the table to sync.
+    database (str): The name of the database where the table is located.
+    directory (str|Path): Root directory of the local mirrors. The mirror is stored in <directory>/<database>/<table>.
+    columns (list, optional): A list of column names to sync, see `export_data`. Must include the watermark column or
+        'datetime' for the datetime watermark if given.
+    conditions (dict, optional): Conditions for filtering the synced data, see `export_data`. Should be the same on
+        every run of a mirror.
+    watermark (str, optional): The column to track new rows by. Defaults to 'datetime'.
+    key_columns (list, optional): If given, rows with the same key as synced rows replace them (upsert), e.g. to
+        pick up corrections. If not provided, new rows are appended.
+    chunksize (int, optional): The maximum number of rows fetched at once. Defaults to 100,000.
+
+    Returns:
+    -------
+    n_rows (int): The number of fetched rows.
+
+    """
+    if columns and watermark not in columns:
+        msg = f"columns must include the watermark column '{watermark}'."
+        raise ValueError(msg)
+
+    mirror_dir = _mirror_dir(directory, database, table)
+    mirror_dir.mkdir(parents=True, exist_ok=True)
+    # Runs on the same mirror are serialised, each one continues from the state committed by the previous one
+    lock_path = mirror_dir / SYNC_LOCK_FILE
+    with _lock_file(lock_path, SYNC_LOCK_TIMEOUT, f'the mirror {mirror_dir}'):
+        state = _load_sync_state(mirror_dir)
+
+        where_sql = None
+        if state['watermark'] is not None:
+            where_sql = _watermark_filter(watermark, _decode_watermark(state['watermark'], state['watermark_type']))
+        query_string, temp_tables = _build_query(table, database, columns, conditions, None, where_sql=where_sql)
+
+        # Fetch the new rows into new files, which only become part of the mirror when the state is committed
+        run_id = f'{time.strftime("%Y%m%dT%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        new_files = []
+        n_rows = 0
+        max_watermark = None
+        committed = False
+        try:
+            with (
+                get_engine(database).connect().execution_options(stream_results=True) as conn,
+                _in_list_tables(conn, temp_tables),
+            ):
+                for i, chunk in enumerate(pd.read_sql(query_string, conn, chunksize=chunksize)):
+                    # Without new rows, the driver still yields one empty chunk
+                    if chunk.empty:
+                        continue
+                    chunk_watermark = _watermark_values(chunk, watermark).max()
+                    chunk = _postprocess(chunk, columns)
+                    if max_watermark is None or chunk_watermark > max_watermark:
+                        max_watermark = chunk_watermark
+                    file_name = f'part-{run_id}-{i:05d}.parquet'
+                    new_files.append(file_name)
+                    chunk.to_parquet(mirror_dir / file_name, index=False)
+                    n_rows += len(chunk)
+                    # Keep the lock from being taken as stale during long runs
+                    os.utime(lock_path)
+
+            if n_rows == 0:
+                log.info(f'{table} is up to date.')
+                return 0
+
+            if key_columns:
+                # Upsert: rewrite the mirror with the new rows replacing synced rows with the same key
+                frames = [pd.read_parquet(mirror_dir / file_name) for file_name in state['files'] + new_files]
+                merged = pd.concat(frames, ignore_index=True).drop_duplicates(subset=key_columns, keep='last')
+                file_name = f'data-{run_id}.parquet'
+                new_files.append(file_name)
+                merged.to_parquet(mirror_dir / file_name, index=False)
+                files, total_rows = [file_name], len(merged)
+            else:
+                files, total_rows = state['files'] + new_files, state['n_rows'] + n_rows
+
+            watermark_value, watermark_type = _encode_watermark(max_watermark)
+            _commit_sync_state(
+                mirror_dir,
+                {
+                    'watermark': watermark_value,
+                    'watermark_type': watermark_type,
+                    'files': files,
+                    'n_rows': total_rows,
+                    'last_sync': pd.Timestamp.now().isoformat(),
+                },
+            )
+            committed = True
+        finally:
+            # Files of runs which did not commit are not part of the mirror
+            if not committed:
+                for file_name in new_files:
+                    (mirror_dir / file_name).unlink(missing_ok=True)
+
+    log.info(f'Synced {n_rows} new rows of {table}, the mirror has {total_rows} rows.')
+
+    return n_rows
+
+
+def read_synced_table(table: str, database: str, directory: str | Path, **kwargs: dict) -> pd.DataFrame:
+    """Read the local mirror of a table created by `sync_table`.
+
+    Args:
+    ----
+    table (str): The name of the table.
+    database (str): The name of the database where the table is located.
+    directory (str|Path): Root directory of the local mirrors.
+    **kwargs (dict): Further arguments passed to `pd.read_parquet`, e.g. columns or filters.
+
+    Returns:
+    -------
+    df (pd.DataFrame): The synced data.
+
+    """
+    mirror_dir = _mirror_dir(directory, database, table)
+    state = _load_sync_state(mirror_dir)
+    if not state['files']:
+        msg = f'{table} of {database} has not been synced to {directory} yet.'
+        raise FileNotFoundError(msg)
+
+    return pd.concat(
+        [pd.read_parquet(mirror_dir / file_name, **kwargs) for file_name in state['files']], ignore_index=True
+    )
+
+
+# Cached metadata by (database, kind[, table]) as tuples of expiry time and DataFrame
+_metadata_cache = {}
+_metadata_lock = threading.Lock()
+
+
+def _cached_metadata(key: tuple, load: Callable[[], pd.DataFrame], refresh: bool) -> pd.DataFrame:
+    """Get metadata from the cache or load and cache it if it is missing, expired or refresh is True."""
+    with _metadata_lock:
+        entry = _metadata_cache.get(key)
+    if refresh or entry is None or time.time() > entry[0]:
+        entry = (time.time() + METADATA_TTL, load())
+        with _metadata_lock:
+            _metadata_cache[key] = entry
+    return entry[1].copy()
+
+
+def clear_metadata_cache(databases: list | str | None = None) -> None:
+    """Remove the cached metadata of some or all databases, so it is queried again on the next use.
+
+    Args:
+    ----
+    databases (list|str|None, optional): The databases to clear the metadata of. If None, all metadata is cleared.
+
+    """
+    if isinstance(databases, str):
+        databases = [databases]
+    with _metadata_lock:
+        for key in list(_metadata_cache):
+            if databases is None or key[0] in databases:
+                del _metadata_cache[key]
+
+
+def get_tables(database: str, refresh: bool = False) -> pd.DataFrame:
+    """Get the tables and views of a database with their approximate number of rows.
+
+    On SQL Server the tables are listed from INFORMATION_SCHEMA and the row counts are taken from sys.partitions, which
+    is cheap but not exact while rows are being written. Views and the tables of other databases have no row count.
+    The result is cached for METADATA_TTL seconds.
+
+    Args:
+    ----
+    database (str): The name of the database.
+    refresh (bool, optional): If True, the metadata is queried again even if it is cached. Defaults to False.
+
+    Returns:
+    -------
+    tables (pd.DataFrame): A DataFrame with the columns 'table', 'type' ('table' or 'view') and 'rows'.
+
+    """
+
+    def _load() -> pd.DataFrame:
+        engine = get_engine(database)
+        with engine.connect() as conn:
+            if engine.dialect.name == 'mssql':
+                query = sa.text(
+                    """
+    SELECT t.TABLE_NAME AS "table",
+        CASE WHEN t.TABLE_TYPE = 'VIEW' THEN 'view' ELSE 'table' END AS "type",
+        r.n_rows AS "rows"
+    FROM INFORMATION_SCHEMA.TABLES t
+    LEFT JOIN (
+        SELECT object_id, SUM(rows) AS n_rows FROM sys.partitions WHERE index_id IN (0, 1) GROUP BY object_id
+    ) r ON r.object_id = OBJECT_ID(QUOTENAME(t.TABLE_SCHEMA) + '.' + QUOTENAME(t.TABLE_NAME))
+    ORDER BY t.TABLE_NAME
+    """
+                )
+                return pd.read_sql(query, conn).astype({'rows': float})
+            inspector = sa.inspect(conn)
+            table_names = inspector.get_table_names()
+            view_names = inspector.get_view_names()
+        return pd.DataFrame(
+            {
+                'table': table_names + view_names,
+                'type': ['table'] * len(table_names) + ['view'] * len(view_names),
+                'rows': np.nan,
+            }
+        )
+
+    return _cached_metadata((database, 'tables'), _load, refresh)
+
+
+def get_columns(table: str, database: str, refresh: bool = False) -> pd.DataFrame:
+    """Get the columns of a table or view with their types, without querying any rows.
+
+    The result is cached for METADATA_TTL seconds.
+
+    Args:
+    ----
+    table (str): The name of the table or view.
+    database (str): The name of the database where the table is located.
+    refresh (bool, optional): If True, the metadata is queried again even if it is cached. Defaults to False.
+
+    Returns:
+    -------
+    columns (pd.DataFrame): A DataFrame with the columns 'name', 'type' (type name of the database) and 'nullable'
+        in the order of the table. Empty if the table does not exist.
+
+    """
+
+    def _load() -> pd.DataFrame:
+        engine = get_engine(database)
+        with engine.connect() as conn:
+            if engine.dialect.name == 'mssql':
+                query = sa.text(
+                    """
+    SELECT COLUMN_NAME AS "name", DATA_TYPE AS "type", CASE WHEN IS_NULLABLE = 'YES' THEN 1 ELSE 0 END AS "nullable"
+    FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_NAME = :table
+    ORDER BY ORDINAL_POSITION
+    """
+                ).bindparams(table=table.split('.')[-1].strip('[]"'))
+                return pd.read_sql(query, conn).astype({'nullable': bool})
+            try:
+                columns = sa.inspect(conn).get_columns(table)
+            except sa.exc.NoSuchTableError:
+                columns = []
+        return pd.DataFrame(
+            {
+                'name': [col['name'] for col in columns],
+                'type': [str(col['type']) for col in columns],
+                'nullable': [bool(col['nullable']) for col in columns],
+            }
+        )
+
+    return _cached_metadata((database, 'columns', table), _load, refresh)
+
+
+def _validate_columns(
+    table: str,
+    database: str,
+    columns: list | None = None,
+    conditions: dict | None = None,
+    group_by: list | None = None,
+    aggregations: dict | None = None,
+    time_grain: str | None = None,
+) -> None:
+    """Check that all columns of a query exist in the table before running it, see `export_data` for the arguments.
+
+    The derived 'datetime' and 'Region_Nospace' columns are checked by their source columns. If the metadata can not
+    be queried or the table is unknown (e.g. a synonym), the query runs unchecked.
+    """
+    required = []
+    for col in [*(columns or []), *(conditions or {}), *(group_by or []), *(aggregations or {})]:
+        if col == 'datetime':
+            required += ['Year', 'Code Month', 'Day', 'Hour']
+        elif col == 'Region_Nospace':
+            required.append('Region')
+        else:
+            required.append(col)
+    required += TIME_GRAINS.get(time_grain, [])
+    if not required:
+        return
+
+    try:
+        available = get_columns(table, database)['name'].tolist()
+    except sa.exc.SQLAlchemyError as e:
+        log.debug(f'Columns of {table} not checked, the metadata is not available: {e}')
+        return
+    if not available:
+        log.debug(f'Columns of {table} not checked, the table was not found in the metadata.')
+        return
+
+    missing = [col for col in dict.fromkeys(required) if col not in available]
+    if missing:
+        msg = f'Columns {missing} not found in {table}. Available columns: {available}.'
+        raise ValueError(msg)
+
+
 def get_table_list(filter_string: str = 'V_', database: str = 'Division_EDC') -> list:
-    """This function queries a specified database and returns a list of table names that contain a specified filter string.
+    """This function queries a specified database and returns a list of table names that contain a filter string.
 
     Args:
     ----
@@ -143,10 +1807,6 @@ def get_table_list(filter_string: str = 'V_', database: str = 'Division_EDC') ->
     ['V_Table1', 'V_Table2', 'V_Table3']
 
     """
-    # cursor.description describes the different row fields, incl. table_name
-
-    conn = pyodbc.connect('DRIVER={SQL Server}; SERVER=dw.ad.iea.org,14330; DATABASE=' + database)
-    cursor = conn.cursor()
-    tables = [row.table_name for row in cursor.tables() if filter_string in row.table_name]
+    tables = [table_name for table_name in get_tables(database)['table'] if filter_string in table_name]
 
     return tables
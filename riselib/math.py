@@ -1,21 +1,63 @@
 """General math functions."""
 
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import pandas as pd
 import numpy as np
+import xarray as xr
 from scipy import stats
 
-def normalize(values: np.ndarray) -> np.ndarray:
+def _float_dtype(values: np.ndarray, dtype: str | np.dtype | None = None) -> np.dtype:
+    """
+    Get the floating point type to calculate in
+
+    Float arrays keep their type (e.g. float32), all other arrays are calculated in float64 unless a dtype is given.
+    """
+    if dtype is not None:
+        return np.dtype(dtype)
+    if np.issubdtype(values.dtype, np.floating):
+        return values.dtype
+    return np.dtype(np.float64)
+
+
+NORMALIZE_BLOCK_BYTES = 2**26
+
+def normalize(
+    values: np.ndarray,
+    dtype: str | np.dtype | None = None,
+    axis: int | tuple | None = None,
+    out: np.ndarray | None = None,
+    skipna: bool = True,
+    block_size: int | None = None,
+) -> np.ndarray:
     """Normalize the values in a given array.
 
-    It is a min-max normalization, which scales the values to a range of 0 to 1.
+    It is a min-max normalization, which scales the values to a range of 0 to 1. The minimum and maximum are taken
+    over the whole array or along the given axis, e.g. axis=0 normalizes every column of a feature matrix on its own.
+
+    The result is written directly into out, so normalize(values, out=values) works in place without any full-size
+    temporary. For large arrays, e.g. memory-mapped feature matrices, the values are processed in blocks of
+    block_size rows (along the first axis), so only one block is in memory at a time.
 
     Args:
     ----
         values: An array containing the values to be normalized.
+        dtype: Floating point type of the result. If None, float inputs keep their type (e.g. float32) and all other
+            inputs are normalized in float64. Ignored if out is given.
+        axis: Axis or axes to take the minimum and maximum along. If None, they are taken over the whole array.
+        out: Float array of the same shape to write the result to, can be values itself. If None, a new array is
+            allocated.
+        skipna: If True, NaNs are ignored for the minimum and maximum (and stay NaN in the result). If False, any
+            NaN makes the affected results NaN.
+        block_size: Number of rows (along the first axis) to process at once. If None, memory-mapped arrays are
+            processed in blocks of about 64 MiB and all other arrays at once.
 
     Returns:
     -------
-        An array containing the normalized values.
+        An array containing the normalized values. Series, DataFrames and DataArrays are returned as such, with the
+        index, columns or coordinates of the input. Dask-backed DataArrays are normalized lazily (out and block_size
+        are ignored then).
 
     Example:
     -------
@@ -24,34 +66,221 @@ def normalize(values: np.ndarray) -> np.ndarray:
         [0.0, 0.25, 0.5, 0.75, 1.0]
 
     """
-    min_value = np.min(values)
-    max_value = np.max(values)
-    normalized_values = (values - min_value) / (max_value - min_value)
+    if isinstance(values, xr.DataArray):
+        if values.chunks is not None and out is None:
+            dims = None if axis is None else [values.dims[a] for a in np.atleast_1d(axis)]
+            da = _as_float_xr(values, dtype)
+            min_value = da.min(dims, skipna=skipna)
+            return (da - min_value) / (da.max(dims, skipna=skipna) - min_value)
+        return values.copy(data=normalize(values.to_numpy(), dtype, axis, out, skipna, block_size))
+    if isinstance(values, pd.Series):
+        result = normalize(values.to_numpy(), dtype, axis, out, skipna, block_size)
+        return pd.Series(result, index=values.index, name=values.name, copy=False)
+    if isinstance(values, pd.DataFrame):
+        result = normalize(values.to_numpy(), dtype, axis, out, skipna, block_size)
+        return pd.DataFrame(result, index=values.index, columns=values.columns, copy=False)
+
+    if not isinstance(values, np.ndarray):
+        values = np.asarray(values)
+    if out is None:
+        out = np.empty(values.shape, dtype=_float_dtype(values, dtype))
+    elif out.shape != values.shape or not np.issubdtype(out.dtype, np.floating):
+        msg = f'out must be a float array of shape {values.shape}, got {out.dtype} {out.shape}.'
+        raise ValueError(msg)
+
+    if values.ndim == 0:
+        axis, blocks = None, [...]
+    else:
+        if axis is not None:
+            axis = tuple(a % values.ndim for a in np.atleast_1d(axis))
+        if block_size is None:
+            row_bytes = max(values[:1].nbytes, 1)
+            block_size = NORMALIZE_BLOCK_BYTES // row_bytes if isinstance(values, np.memmap) else len(values)
+        block_size = max(block_size, 1)
+        blocks = [slice(i, i + block_size) for i in range(0, len(values), block_size)]
+    # The statistics are per block if the first axis is not reduced, otherwise they are combined over the blocks
+    per_block = axis is not None and 0 not in axis
+
+    # np.fmin/np.fmax reduce without the NaN-replacing copy of np.nanmin/np.nanmax
+    minimum, maximum = (np.fmin, np.fmax) if skipna else (np.minimum, np.maximum)
+    min_values, max_values = [], []
+    for block in blocks:
+        block_min = minimum.reduce(values[block], axis=axis, keepdims=True)
+        block_max = maximum.reduce(values[block], axis=axis, keepdims=True)
+        if per_block or not min_values:
+            min_values.append(block_min)
+            max_values.append(block_max)
+        else:
+            minimum(min_values[0], block_min, out=min_values[0])
+            maximum(max_values[0], block_max, out=max_values[0])
+
+    for i, block in enumerate(blocks):
+        min_value = min_values[i if per_block else 0].astype(out.dtype)
+        value_range = max_values[i if per_block else 0].astype(out.dtype) - min_value
+        np.subtract(values[block], min_value, out=out[block])
+        np.divide(out[block], value_range, out=out[block])
+
+    return out
+
+def _hourly_basis_weights(res_min, method):
+    """
+    Basis weights of the interpolants for the fractional offsets of one hour at the given resolution. For every
+    offset there is a second set of weights one hour further, which extrapolates the last interval into the last hour.
+    Returns an array of shape (2, 4, n_offsets): weights of y_i, y_i+1 and the second derivatives (cubic) or slopes
+    (pchip) at i and i+1.
+    """
+    offsets = np.arange(0, 60, res_min) / 60
+    s = np.stack([offsets, offsets + 1])
+    if method == 'cubic':
+        return np.stack([1 - s, s, ((1 - s) ** 3 - (1 - s)) / 6, (s**3 - s) / 6], axis=1)
+    return np.stack([2 * s**3 - 3 * s**2 + 1, -2 * s**3 + 3 * s**2, s**3 - 2 * s**2 + s, s**3 - s**2], axis=1)
+
+def _natural_spline_second_derivatives(y):
+    """
+    Second derivatives of natural cubic splines through equidistant points (unit spacing) along the first axis of a
+    2D array. All columns are solved at once with one banded (tridiagonal) solve with multiple right-hand sides.
+    """
+    from scipy.linalg import solveh_banded
+
+    n = y.shape[0]
+    second_derivatives = np.zeros_like(y)
+    if n < 3:
+        return second_derivatives
+
+    banded = np.empty((2, n - 2))
+    banded[0] = 1
+    banded[1] = 4
+    rhs = y[2:] - y[1:-1]
+    rhs -= y[1:-1]
+    rhs += y[:-2]
+    rhs *= 6
+    second_derivatives[1:-1] = solveh_banded(banded, rhs, check_finite=False)
+
+    return second_derivatives
+
+def _pchip_slopes(y):
+    """
+    Slopes of monotone piecewise cubic Hermite interpolants (Fritsch-Carlson, like scipy's PchipInterpolator)
+    through equidistant points (unit spacing) along the first axis of a 2D array
+    """
+    delta = np.diff(y, axis=0)
+    slopes = np.zeros_like(y)
+    if y.shape[0] == 2:
+        slopes[:] = delta
+        return slopes
 
-    return normalized_values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        harmonic_mean = 2 / (1 / delta[:-1] + 1 / delta[1:])
+    same_sign = np.sign(delta[:-1]) * np.sign(delta[1:]) > 0
+    slopes[1:-1] = np.where(same_sign, harmonic_mean, 0)
 
+    for edge, d0, d1 in ((0, delta[0], delta[1]), (-1, delta[-1], delta[-2])):
+        slope = (3 * d0 - d1) / 2
+        slope = np.where(np.sign(slope) != np.sign(d0), 0, slope)
+        slope = np.where((np.sign(d0) != np.sign(d1)) & (np.abs(slope) > np.abs(3 * d0)), 3 * d0, slope)
+        slopes[edge] = slope
 
+    return slopes
 
+def _upsample_hourly(values, axis, res_min=30, method='cubic'):
+    """
+    Upsample equidistant hourly values along an axis to res_min minutes. Every hour i is followed by the values at
+    i + res_min / 60, i + 2 * res_min / 60, ..., so the last hour is extrapolated with the last interval.
+    """
+    dtype = _float_dtype(values)
+    y = np.moveaxis(values, axis, 0)
+    n, rest = y.shape[0], y.shape[1:]
+    y = y.reshape(n, -1).astype(np.float64)
 
-# def spline_interp_hrly_xr(y, res_min=30, dim='time'):
-#     """
-#     Spline interpolation of a time series to a higher resolution.
-#     The function interpolates the time series to a higher resolution by using spline interpolation. The resolution is specified in minutes. The default resolution is 30 minutes. The function returns the interpolated time series.
-#     """
+    if method == 'cubic':
+        derivatives = _natural_spline_second_derivatives(y)
+    else:
+        derivatives = _pchip_slopes(y)
+    weights = _hourly_basis_weights(res_min, method)
+    n_offsets = weights.shape[-1]
 
+    # Accumulate offset by offset directly into the result, with two temporaries of the size of the input
+    result = np.empty((n, n_offsets, y.shape[1]), dtype=dtype)
+    terms = (y[:-1], y[1:], derivatives[:-1], derivatives[1:])
+    last_terms = (y[-2], y[-1], derivatives[-2], derivatives[-1])
+    temp, product = np.empty_like(y[:-1]), np.empty_like(y[:-1])
+    for k in range(n_offsets):
+        np.multiply(terms[0], weights[0, 0, k], out=temp)
+        for term, weight in zip(terms[1:], weights[0, 1:, k]):
+            temp += np.multiply(term, weight, out=product)
+        result[:-1, k] = temp
+        result[-1, k] = sum(term * weight for term, weight in zip(last_terms, weights[1, :, k]))
 
-#     res = '{}min'.format(res_min)
+    return np.moveaxis(result.reshape(n * n_offsets, *rest), 0, axis)
 
-#     xnew = pd.date_range(start=y.time.values[0],
-#                          end=pd.to_datetime(y.time.values[-1]) + datetime.timedelta(minutes=60-res_min),
-#                          freq=res)
+def _upsample_hourly_block(values, axis, halo, n_blocks, res_min, method, block_id=None):
+    """
+    Upsample a block extended by halo values on both sides and trim the upsampled halo again. The first and last
+    blocks are not extended on the outer side.
+    """
+    left = halo if block_id[axis] > 0 else 0
+    right = halo if block_id[axis] < n_blocks - 1 else 0
+    result = _upsample_hourly(values, axis, res_min, method)
+    n_offsets = 60 // res_min
+    index = [slice(None)] * result.ndim
+    index[axis] = slice(left * n_offsets, result.shape[axis] - right * n_offsets)
+    return result[tuple(index)]
 
-#     tck = xarray_extras.interpolate.splrep(y, dim)
-#     ynew = xarray_extras.interpolate.splev(xnew, tck)
+def spline_interp_hrly_xr(y, res_min=30, dim='time', method='cubic', halo=24):
+    """
+    Spline interpolation of a time series to a higher resolution.
+    The function interpolates hourly values along dim to a higher resolution, which is specified in minutes (default
+    30 minutes). The interpolants of all cells are fitted at once: natural cubic splines (method='cubic') with one
+    banded solve for all cells, or monotone piecewise cubic Hermite interpolants (method='pchip'), which do not
+    overshoot, e.g. below zero. The last hour is extrapolated with the last interval.
+
+    Dask arrays are upsampled lazily chunk by chunk. Every chunk is extended by halo hours of its neighbours, so the
+    result equals the one on the full array up to a relative difference of about 0.27 ** halo for cubic splines and
+    exactly for pchip (halo >= 2).
+    """
+    if method not in ('cubic', 'pchip'):
+        msg = f"Unknown method '{method}'. Use 'cubic' or 'pchip'."
+        raise ValueError(msg)
+    if res_min <= 0 or 60 % res_min:
+        msg = f'res_min must divide 60, got {res_min}.'
+        raise ValueError(msg)
+    if y.sizes[dim] < 2:
+        msg = f'At least two values along {dim} are required.'
+        raise ValueError(msg)
+
+    time = pd.DatetimeIndex(y[dim].values)
+    if len(time) > 1 and not (time[1:] - time[:-1] == pd.Timedelta('1h')).all():
+        msg = f'The values along {dim} must be hourly without gaps.'
+        raise ValueError(msg)
+
+    res = '{}min'.format(res_min)
+    xnew = pd.date_range(start=time[0], end=time[-1] + pd.Timedelta(minutes=60 - res_min), freq=res)
+
+    axis = y.get_axis_num(dim)
+    n_offsets = 60 // res_min
+    if y.chunks is None:
+        data = _upsample_hourly(y.values, axis, res_min, method)
+    else:
+        import dask.array as dsa
+        from dask.array.overlap import ensure_minimum_chunksize
 
-#     return ynew
+        halo = max(halo, 2)
+        data = y.data
+        chunks = ensure_minimum_chunksize(halo, data.chunks[axis])
+        if chunks != data.chunks[axis]:
+            data = data.rechunk({axis: chunks})
+        extended = dsa.overlap.overlap(data, depth={axis: halo}, boundary='none')
+        out_chunks = tuple(tuple(c * n_offsets for c in chunks) if i == axis else c
+                           for i, c in enumerate(data.chunks))
+        dtype = _float_dtype(y)
+        data = extended.map_blocks(_upsample_hourly_block, axis=axis, halo=halo, n_blocks=len(chunks),
+                                   res_min=res_min, method=method, chunks=out_chunks, dtype=dtype,
+                                   meta=np.array((), dtype=dtype))
 
+    coords = {name: coord for name, coord in y.coords.items() if dim not in coord.dims}
+    coords[dim] = xnew
 
+    return xr.DataArray(data, dims=y.dims, coords=coords, name=y.name, attrs=y.attrs)
 
 def remove_outliers(df, column, n_std=3):
     """
@@ -94,47 +323,726 @@ def detect_sudden_changes(df, column, window=5, threshold=3):
 
     return df
 
+def _like_float32(result, reference):
+    """
+    Cast the float64 results of rolling operations back to float32 where the reference data is float32
+    """
+    if isinstance(result, pd.Series):
+        return result.astype(np.float32) if reference.dtype == np.float32 else result
+    float32_columns = reference.columns[reference.dtypes == np.float32]
+    return result.astype(dict.fromkeys(float32_columns, np.float32))
+
 def smooth_timeseries(df, column, window=5, new_column_name=False):
     """
     Smooth time series using moving average
     """
+    smoothed = _like_float32(df[column].rolling(window=window).mean(), df[column])
     if new_column_name:
-        df[f'{column}_smoothed'] = df[column].rolling(window=window).mean()
+        df[f'{column}_smoothed'] = smoothed
     else:
-        df[column] = df[column].rolling(window=window).mean()
+        df[column] = smoothed
         
     return df
 
+def _rolling_mean_std(values, window, axis=0):
+    """
+    Rolling mean and standard deviation (ddof=1) along an axis, like pandas rolling with min_periods=window.
+    Windows containing NaNs give NaN. Only the two result arrays and one temporary of the same size are allocated.
+    """
+    mean = np.full(values.shape, np.nan, dtype=values.dtype)
+    std = np.full(values.shape, np.nan, dtype=values.dtype)
+    n = values.shape[axis]
+    if n < window:
+        return mean, std
+    # Views with the axis in front, the results are written through to mean and std
+    _fill_rolling_mean_std(np.moveaxis(values, axis, 0), window, np.moveaxis(mean, axis, 0), np.moveaxis(std, axis, 0))
+
+    return mean, std
+
+def _fill_rolling_mean_std(values, window, mean, std):
+    """
+    Write the rolling mean and standard deviation along the first axis into the pre-allocated NaN arrays
+    """
+    n = values.shape[0]
+
+    windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=0)
+    mean[window - 1:] = windows.mean(axis=-1)
+
+    sum_sq = np.zeros_like(mean[window - 1:])
+    deviation = np.empty_like(sum_sq)
+    for j in range(window):
+        np.subtract(values[j:n - window + 1 + j], mean[window - 1:], out=deviation)
+        sum_sq += np.square(deviation, out=deviation)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.sqrt(sum_sq / (window - 1), out=std[window - 1:])
+
+def _interpolate_linear(values):
+    """
+    Linearly interpolate NaNs along the first axis of a 2D array in place, like pandas interpolate('linear'):
+    gaps are interpolated by position, trailing NaNs get the last valid value and leading NaNs are kept
+    """
+    columns = np.flatnonzero(np.isnan(values).any(axis=0))
+    if len(columns) == 0:
+        return values
+    block = values[:, columns]
+    n = block.shape[0]
+    index_dtype = np.int32 if n < 2**31 else np.int64
+
+    valid = ~np.isnan(block)
+    positions = np.arange(n, dtype=index_dtype)[:, np.newaxis]
+    previous = np.maximum.accumulate(np.where(valid, positions, -1), axis=0)
+    following = np.minimum.accumulate(np.where(valid, positions, n)[::-1], axis=0)[::-1]
+
+    missing_rows, missing_cols = np.nonzero(~valid & (previous >= 0))
+    previous = previous[missing_rows, missing_cols]
+    following = following[missing_rows, missing_cols]
+    trailing = following == n
+    following[trailing] = previous[trailing]
+
+    previous_values = block[previous, missing_cols]
+    following_values = block[following, missing_cols]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = np.where(trailing, 0, (missing_rows - previous) / (following - previous))
+    block[missing_rows, missing_cols] = previous_values + (following_values - previous_values) * weights
+
+    values[:, columns] = block
+    return values
+
+def _nanquantile(values, quantiles):
+    """
+    Quantiles per column ignoring NaNs with linear interpolation (like pandas quantile), computed for all columns at
+    once from one sort instead of column by column like np.nanquantile
+    """
+    sorted_values = np.sort(values, axis=0)  # NaNs are sorted to the end
+    counts = np.sum(~np.isnan(values), axis=0)
+
+    results = []
+    for q in quantiles:
+        position = q * (counts - 1)
+        lower = np.clip(np.floor(position), 0, None).astype(np.intp)
+        upper = np.minimum(lower + 1, np.maximum(counts - 1, 0))
+        lower_values = np.take_along_axis(sorted_values, lower[np.newaxis], axis=0)[0]
+        upper_values = np.take_along_axis(sorted_values, upper[np.newaxis], axis=0)[0]
+        result = lower_values + (upper_values - lower_values) * (position - lower)
+        results.append(np.where(counts > 0, result, np.nan))
+
+    return results
+
+def _clean_values(values, methods, n_std=3, window=5, threshold=3):
+    """
+    Apply the cleaning methods of clean_timeseries column-wise in place to a 2D float array (time x series).
+    The methods are applied in the same order and on the same intermediate data as the DataFrame functions, but all
+    masks are applied to the one array. Returns a boolean array of the values removed by the masking methods, which
+    like the DataFrame functions includes missing values for all methods except 'iqr'.
+    """
+    removed = np.zeros(values.shape, dtype=bool)
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        # All-NaN columns are expected and simply stay NaN
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+
+        if 'positive' in methods:
+            mask = ~(values > 0)
+            removed |= mask
+            values[mask] = np.nan
+
+        if 'std' in methods:
+            mean = np.nanmean(values, axis=0)
+            std = np.nanstd(values, axis=0, ddof=1)
+            mask = ~((values <= mean + n_std * std) & (values >= mean - n_std * std))
+            removed |= mask
+            values[mask] = np.nan
+
+        if 'iqr' in methods:
+            q1, q3 = _nanquantile(values, [0.25, 0.75])
+            iqr = q3 - q1
+            mask = (values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)
+            removed |= mask
+            values[mask] = np.nan
+
+        if 'sudden_changes' in methods:
+            rolling_mean, rolling_std = _rolling_mean_std(values, window)
+            z_scores = np.abs((values - rolling_mean) / rolling_std)
+            mask = ~(z_scores < threshold)
+            removed |= mask
+            values[mask] = np.nan
+            del rolling_mean, rolling_std, z_scores
+
+        if 'smooth' in methods:
+            values[:] = _rolling_mean_std(values, window)[0]
+
+    return removed
+
 def clean_timeseries(df, column, methods=['std', 'iqr', 'sudden_changes', 'positive'],
                      n_std=3, window=5, threshold=3, interpolation = 'linear'):
     """
     Clean time series data using multiple methods
+
+    All requested methods run column-wise on one NumPy copy of the data (see _clean_values) instead of copying the
+    DataFrame for every method, and the interpolation runs once on that copy. With column=None every column is
+    cleaned on its own, with a list of columns only those columns are cleaned and with a single column the rows
+    removed from that column are removed from all columns.
     """
+    if column is None:
+        columns = list(df.columns)
+    elif isinstance(column, str):
+        columns = [column]
+    else:
+        columns = list(column)
+    targets = df.columns.get_indexer(columns)
+    if (targets < 0).any():
+        msg = f'Columns {[col for col in columns if col not in df.columns]} not found.'
+        raise KeyError(msg)
 
-    df_copy = df.copy()
+    float32_columns = df.columns[df.dtypes == np.float32]
+    dtype = np.float32 if len(float32_columns) == len(df.columns) else np.float64
+    values = df.to_numpy(dtype=dtype, copy=True)
+    target_values = values[:, targets]
+    removed = _clean_values(target_values, methods, n_std, window, threshold)
+    values[:, targets] = target_values
+    del target_values
 
-    if column is None:
-        column = df.columns
+    if isinstance(column, str):
+        values[removed[:, 0]] = np.nan
 
-    if 'positive' in methods:
-        df = df.where(df[column] > 0)
+    ## Interpolate missing values, while also not dropping the first values (at window length)
+    values[:window] = df.iloc[:window].to_numpy(dtype=values.dtype)
+    if interpolation == 'linear':
+        df = pd.DataFrame(_interpolate_linear(values), index=df.index, columns=df.columns, copy=False)
+    else:
+        df = pd.DataFrame(values, index=df.index, columns=df.columns, copy=False).interpolate(interpolation)
 
-    if 'std' in methods:
-        df = remove_outliers(df, column, n_std)
+    if dtype == np.float64 and len(float32_columns):
+        df = df.astype(dict.fromkeys(float32_columns, np.float32))
 
-    if 'iqr' in methods:
-        df = remove_outliers_iqr(df, column)
+    return df
 
-    if 'sudden_changes' in methods:
-        df = detect_sudden_changes(df, column, window, threshold)
+def _clean_columns(values, methods, n_std=3, window=5, threshold=3, interpolation='linear'):
+    """
+    Clean every column of a 2D float array (time x series) in place like clean_timeseries with column=None
+    """
+    head = values[:window].copy()
+    _clean_values(values, methods, n_std, window, threshold)
+    values[:window] = head
+    if interpolation == 'linear':
+        return _interpolate_linear(values)
+    values[:] = pd.DataFrame(values, copy=False).interpolate(interpolation).to_numpy()
+    return values
+
+def clean_timeseries_batch(data, methods=('std', 'iqr', 'sudden_changes', 'positive'), n_std=3, window=5,
+                           threshold=3, interpolation='linear', dim='time', n_jobs=None, min_series_per_job=1000):
+    """
+    Clean many time series at once, e.g. one per grid cell or region
+
+    The series are the columns of a 2D array or DataFrame (time x series) or all cells of a DataArray along dim. The
+    result is the same as calling clean_timeseries with column=None, but all masks are computed with vectorized NumPy
+    operations over all series and the interpolation runs across all series at once. With n_jobs, very wide inputs
+    are split into column blocks of at least min_series_per_job series, which are cleaned in a process pool.
+    Returns the same type as the input.
+    """
+    if isinstance(data, xr.DataArray):
+        transposed = data.transpose(dim, ...)
+        values = transposed.to_numpy().reshape(transposed.shape[0], -1)
+    elif isinstance(data, pd.DataFrame):
+        values = data.to_numpy()
+    else:
+        values = np.asarray(data)
+        if values.ndim != 2:
+            msg = f'Arrays must be 2D (time x series), got {values.ndim} dimensions.'
+            raise ValueError(msg)
+    dtype = values.dtype if values.dtype in (np.float32, np.float64) else np.float64
+    values = values.astype(dtype, copy=True)
+
+    kwargs = dict(methods=methods, n_std=n_std, window=window, threshold=threshold, interpolation=interpolation)
+    n_series = values.shape[1]
+    if n_jobs is None or n_jobs == 1 or n_series < 2 * min_series_per_job:
+        values = _clean_columns(values, **kwargs)
+    else:
+        n_blocks = min(n_jobs, n_series // min_series_per_job)
+        bounds = np.linspace(0, n_series, n_blocks + 1).astype(int)
+        blocks = [values[:, start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [executor.submit(_clean_columns, block, **kwargs) for block in blocks]
+            for start, stop, future in zip(bounds[:-1], bounds[1:], futures):
+                values[:, start:stop] = future.result()
+
+    if isinstance(data, xr.DataArray):
+        return transposed.copy(data=values.reshape(transposed.shape)).transpose(*data.dims)
+    if isinstance(data, pd.DataFrame):
+        return pd.DataFrame(values, index=data.index, columns=data.columns, copy=False)
+    return values
+
+def _map_rolling_xr(func, da, dim, window, **kwargs):
+    """
+    Apply func(values, axis, window, **kwargs) of a rolling window operation along dim to a DataArray. Dask arrays are
+    processed chunk by chunk with the previous window - 1 values prepended to every chunk, so that the windows at the
+    chunk edges are complete and the result equals the one on the full array.
+    """
+    axis = da.get_axis_num(dim)
+    if da.chunks is None:
+        return da.copy(data=func(da.values, axis=axis, window=window, **kwargs))
+
+    depth = {i: (window - 1, 0) if i == axis else 0 for i in range(da.ndim)}
+    data = da.data.map_overlap(func, depth=depth, boundary='none', dtype=da.dtype, meta=np.array((), dtype=da.dtype),
+                               axis=axis, window=window, **kwargs)
+    return da.copy(data=data)
+
+def _sudden_changes_block(values, axis, window=5, threshold=3):
+    """
+    Set the values with a rolling z-score of at least threshold (or NaN) to NaN, see detect_sudden_changes
+    """
+    rolling_mean, rolling_std = _rolling_mean_std(values, window, axis)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z_scores = np.abs((values - rolling_mean) / rolling_std)
+    return np.where(z_scores < threshold, values, np.nan)
 
+def _smooth_block(values, axis, window=5):
+    """
+    Rolling mean of a block, see smooth_timeseries
+    """
+    return _rolling_mean_std(values, window, axis)[0]
+
+def _interpolate_linear_last_axis(values):
+    """
+    Linearly interpolate NaNs along the last axis of an array of any shape, see _interpolate_linear
+    """
+    n = values.shape[-1]
+    block = np.array(np.moveaxis(values, -1, 0), order='C')
+    _interpolate_linear(block.reshape(n, -1))
+    return np.moveaxis(block, 0, -1)
+
+def _as_float_xr(da, dtype=None):
+    """
+    Cast a DataArray to the floating point type to calculate in, see _float_dtype
+    """
+    return da.astype(_float_dtype(da, dtype), copy=False)
+
+def normalize_xr(da, dim=None, dtype=None):
+    """
+    Min-max normalize a DataArray (lazily for dask) along a dimension or list of dimensions, ignoring NaNs
+
+    With dim=None, the minimum and maximum of the whole array are used, like normalize.
+    """
+    da = _as_float_xr(da, dtype)
+    min_value = da.min(dim)
+    return (da - min_value) / (da.max(dim) - min_value)
+
+def remove_outliers_xr(da, dim='time', n_std=3):
+    """
+    Remove outliers along a dimension using standard deviation method, see remove_outliers
+    """
+    da = _as_float_xr(da)
+    mean = da.mean(dim)
+    std = da.std(dim, ddof=1)
+
+    return da.where((da <= mean + (n_std * std)) & (da >= mean - (n_std * std)))
+
+def remove_outliers_iqr_xr(da, dim='time'):
+    """
+    Remove outliers along a dimension using IQR method, see remove_outliers_iqr
+    Dask arrays are rechunked to a single chunk along dim for the quantiles.
+    """
+    da = _as_float_xr(da)
+    quantiles = (da.chunk({dim: -1}) if da.chunks is not None else da).quantile([0.25, 0.75], dim)
+    Q1 = quantiles.sel(quantile=0.25, drop=True)
+    Q3 = quantiles.sel(quantile=0.75, drop=True)
+    IQR = Q3 - Q1
+
+    return da.where(~((da < (Q1 - 1.5 * IQR)) | (da > (Q3 + 1.5 * IQR))))
+
+def detect_sudden_changes_xr(da, dim='time', window=5, threshold=3):
+    """
+    Detect and remove sudden changes/spikes along a dimension, see detect_sudden_changes
+    """
+    return _map_rolling_xr(_sudden_changes_block, _as_float_xr(da), dim, window, threshold=threshold)
+
+def smooth_timeseries_xr(da, dim='time', window=5):
+    """
+    Smooth a DataArray along a dimension using moving average, see smooth_timeseries
+    """
+    return _map_rolling_xr(_smooth_block, _as_float_xr(da), dim, window)
+
+def clean_timeseries_xr(da, dim='time', methods=('std', 'iqr', 'sudden_changes', 'positive'),
+                        n_std=3, window=5, threshold=3, interpolation='linear'):
+    """
+    Clean every series of a DataArray (e.g. every cell of an ERA5 cube) along a dimension, like clean_timeseries with
+    column=None
+
+    The methods are applied in the same order as in clean_timeseries and are lazy for dask arrays, so cubes can be
+    cleaned without loading them or flattening them to a DataFrame. The rolling methods run chunk by chunk with an
+    overlap of window - 1 values. Only 'iqr' and the interpolation need all values of a series in one chunk, so the
+    array is rechunked to a single chunk along dim for these steps. Linear interpolation matches clean_timeseries,
+    other methods are passed to xarray's interpolate_na.
+    """
+    original = _as_float_xr(da)
+    da = original
+
+    if 'positive' in methods:
+        da = da.where(da > 0)
+    if 'std' in methods:
+        da = remove_outliers_xr(da, dim, n_std)
+    if 'iqr' in methods:
+        da = remove_outliers_iqr_xr(da, dim)
+    if 'sudden_changes' in methods:
+        da = detect_sudden_changes_xr(da, dim, window, threshold)
     if 'smooth' in methods:
-        df = smooth_timeseries(df, column, window)
-        
+        da = smooth_timeseries_xr(da, dim, window)
 
     ## Interpolate missing values, while also not dropping the first values (at window length)
-    df.iloc[:window,:] = df_copy.iloc[:window,:]
-    df = df.interpolate(interpolation)
+    da = da.where(xr.DataArray(np.arange(da.sizes[dim]) >= window, dims=dim), original)
+    if da.chunks is not None:
+        da = da.chunk({dim: -1})
+    if interpolation == 'linear':
+        da = xr.apply_ufunc(_interpolate_linear_last_axis, da, input_core_dims=[[dim]], output_core_dims=[[dim]],
+                            dask='parallelized', output_dtypes=[da.dtype], keep_attrs=True).transpose(*original.dims)
+    else:
+        da = da.interpolate_na(dim, method=interpolation, use_coordinate=False)
 
-    return df
+    return da
+
+class StreamingCleaner:
+    """
+    Clean time series arriving in chunks (e.g. monthly) without re-cleaning the full history
+
+    The cleaner consumes consecutive chunks of a DataFrame with update and returns the rows which are final. Every
+    column is cleaned on its own like clean_timeseries with column=None. To get the same results as the batch
+    functions, the state between chunks is carried over:
+        - the last window - 1 rows before the spike detection and before the smoothing, so the rolling windows are
+          continued across chunk boundaries,
+        - the rows which can not be interpolated yet, since the next valid value of a column is still to come. These
+          rows are returned with a later update or with flush.
+    The concatenated results are identical to clean_timeseries on the concatenated chunks. 'std' and 'iqr' need the
+    statistics of the full series and are not supported; use build_quantile_sketches and remove_outliers_streaming in
+    two passes instead. Only linear interpolation is supported.
+    """
+
+    def __init__(self, methods: tuple = ('sudden_changes', 'positive'), window: int = 5, threshold: float = 3):
+        """
+        Set up the cleaner with the methods and parameters of clean_timeseries
+        """
+        unsupported = [method for method in ('std', 'iqr') if method in methods]
+        if unsupported:
+            msg = (
+                f'The methods {unsupported} are not supported for streaming since they need the statistics of the full '
+                'series. Use build_quantile_sketches and remove_outliers_streaming instead.'
+            )
+            raise ValueError(msg)
+        self.methods = methods
+        self.window = window
+        self.threshold = threshold
+
+        self.columns = None
+        self._n_rows = 0
+        self._spike_tail = self._smooth_tail = None
+        self._pending = self._pending_index = None
+        self._n_emitted = 0
+
+    def _continue_rolling(self, values: np.ndarray, tail: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Calculate the rolling mean and std of a chunk, continuing the windows from the tail of the last chunk
+        """
+        extended = np.concatenate([tail, values])
+        mean, std = _rolling_mean_std(extended, self.window)
+        new_tail = extended[max(0, len(extended) - (self.window - 1)):] if self.window > 1 else extended[:0]
+        return mean[len(tail):], std[len(tail):], new_tail.copy()
+
+    def update(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Clean the next chunk (with the same columns as the previous ones) and return the rows which are final
+
+        These can be fewer or more rows than the chunk.
+        """
+        if self.columns is None:
+            self.columns = chunk.columns
+            n_columns = len(chunk.columns)
+            self._spike_tail = np.empty((0, n_columns))
+            self._smooth_tail = np.empty((0, n_columns))
+            self._pending = np.empty((0, n_columns))
+            self._pending_index = chunk.index[:0]
+        elif not chunk.columns.equals(self.columns):
+            msg = 'All chunks must have the same columns.'
+            raise ValueError(msg)
+
+        original = chunk.to_numpy(dtype=np.float64)
+        values = original.copy()
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if 'positive' in self.methods:
+                values[~(values > 0)] = np.nan
+
+            if 'sudden_changes' in self.methods:
+                rolling_mean, rolling_std, self._spike_tail = self._continue_rolling(values, self._spike_tail)
+                values[~(np.abs((values - rolling_mean) / rolling_std) < self.threshold)] = np.nan
+
+            if 'smooth' in self.methods:
+                values, _, self._smooth_tail = self._continue_rolling(values, self._smooth_tail)
+
+        # Keep the first values of the whole series (at window length) like clean_timeseries
+        n_head = max(0, min(self.window - self._n_rows, len(values)))
+        values[:n_head] = original[:n_head]
+        self._n_rows += len(values)
+
+        self._pending = np.concatenate([self._pending, values])
+        self._pending_index = self._pending_index.append(chunk.index)
+
+        return self._emit(final=False)
+
+    def flush(self) -> pd.DataFrame:
+        """
+        Return the remaining rows at the end of the series, with trailing gaps filled by the last valid values
+        """
+        if self.columns is None:
+            return pd.DataFrame()
+        return self._emit(final=True)
+
+    def _emit(self, final: bool) -> pd.DataFrame:
+        """
+        Interpolate the pending rows and return the ones which can not change anymore
+        """
+        valid = ~np.isnan(self._pending)
+        has_valid = valid.any(axis=0)
+        n_pending = len(self._pending)
+
+        if final or not has_valid.any():
+            last_final = n_pending - 1
+        else:
+            # Rows up to the last valid value of every column are final (columns without any valid value so far only
+            # have leading NaNs, which stay NaN)
+            last_valid = n_pending - 1 - np.argmax(valid[::-1], axis=0)
+            last_final = int(last_valid[has_valid].min())
+
+        interpolated = _interpolate_linear(self._pending.copy())
+        emitted = pd.DataFrame(
+            interpolated[self._n_emitted:last_final + 1],
+            index=self._pending_index[self._n_emitted:last_final + 1],
+            columns=self.columns,
+        )
+
+        # Keep the rows from the last valid value of every column up to the last final row, so the next gaps can be
+        # interpolated from them
+        valid_final = valid[:last_final + 1]
+        has_valid_final = valid_final.any(axis=0)
+        if has_valid_final.any() and not final:
+            last_valid_final = last_final - np.argmax(valid_final[::-1], axis=0)
+            keep_from = int(last_valid_final[has_valid_final].min())
+        else:
+            keep_from = last_final + 1
+        self._pending = self._pending[keep_from:]
+        self._pending_index = self._pending_index[keep_from:]
+        self._n_emitted = last_final + 1 - keep_from
+
+        return emitted
+
+class QuantileSketch:
+    """
+    Mergeable approximate quantile sketch (KLL) with exact count, mean, standard deviation, min and max
+
+    The sketch keeps a small set of weighted sample values in levels, where a value on level h stands for 2^h input
+    values. Whenever a level exceeds its capacity, it is sorted and every other value (with a random offset) moves up
+    one level. The memory is O(k) independent of the number of values and the rank error of the quantiles is about
+    1.7 / k (around 1% for the default k=200). As long as no value has been compacted, the quantiles are exact.
+
+    Sketches can be built chunk by chunk with update and in parallel on separate parts of the data, which are combined
+    with merge. Together with remove_outliers_streaming, this allows removing outliers from larger-than-memory data in
+    two streaming passes: one to build the sketches and one to apply the thresholds.
+    """
+
+    def __init__(self, k: int = 200, seed: int | None = None):
+        """
+        Create an empty sketch, k is the capacity of the top level (which sets the accuracy) and seed the seed of the
+        random compaction offsets
+        """
+        if k < 8:
+            msg = 'k must be at least 8.'
+            raise ValueError(msg)
+        self.k = k
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        """
+        Capacity of a level, which shrinks geometrically with the distance to the top level
+        """
+        depth = len(self._levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self) -> None:
+        """
+        Compact the lowest level above its capacity until all levels are within their capacity
+        """
+        while True:
+            for level, items in enumerate(self._levels):
+                if len(items) > self._capacity(level):
+                    break
+            else:
+                return
+
+            if level + 1 == len(self._levels):
+                self._levels.append(np.empty(0))
+            items = np.sort(items)
+            # With an odd number of values, one random value stays on the level
+            if len(items) % 2:
+                leftover = self._rng.integers(len(items))
+                remaining, items = items[leftover:leftover + 1], np.delete(items, leftover)
+            else:
+                remaining = items[:0]
+            offset = self._rng.integers(2)
+            self._levels[level + 1] = np.concatenate([self._levels[level + 1], items[offset::2]])
+            self._levels[level] = remaining
+
+    def _merge_stats(self, count: int, mean: float, m2: float, minimum: float, maximum: float) -> None:
+        """
+        Merge count, mean and sum of squared deviations of other values into the running statistics
+        """
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self._mean
+        self._mean += delta * count / total
+        self._m2 += m2 + delta**2 * self.count * count / total
+        self.count = total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+
+    def update(self, values: np.ndarray) -> 'QuantileSketch':
+        """
+        Add values of any shape (e.g. a chunk of a column) to the sketch, ignoring NaNs, and return the sketch
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+
+        mean = values.mean()
+        self._merge_stats(len(values), mean, np.square(values - mean).sum(), values.min(), values.max())
+        self._levels[0] = np.concatenate([self._levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        """
+        Merge the sketch of other values with the same k (e.g. built in another process) into this one and return it
+        """
+        if other.k != self.k:
+            msg = f'Only sketches with the same k can be merged, got {self.k} and {other.k}.'
+            raise ValueError(msg)
+        self._merge_stats(other.count, other._mean, other._m2, other.min, other.max)
+        for level, items in enumerate(other._levels):
+            if level == len(self._levels):
+                self._levels.append(np.empty(0))
+            self._levels[level] = np.concatenate([self._levels[level], items])
+        self._compress()
+        return self
+
+    def quantile(self, q: float | np.ndarray) -> float | np.ndarray:
+        """
+        Get approximate quantile(s) between 0 and 1 of the values added so far, NaN if the sketch is empty
+        """
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan)[()]
+        if len(self._levels) == 1:
+            # Nothing was compacted, so all values are still there
+            return np.quantile(self._levels[0], q)
+
+        values = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(items), 2.0**level) for level, items in enumerate(self._levels)])
+        order = np.argsort(values)
+        values, weights = values[order], weights[order]
+        centres = (np.cumsum(weights) - weights / 2) / weights.sum()
+
+        return np.interp(q, np.concatenate([[0], centres, [1]]), np.concatenate([[self.min], values, [self.max]]))
+
+    @property
+    def mean(self) -> float:
+        """
+        Mean of the values added so far
+        """
+        return self._mean if self.count else np.nan
+
+    @property
+    def std(self) -> float:
+        """
+        Standard deviation (ddof=1) of the values added so far
+        """
+        return np.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+    def iqr_bounds(self, factor: float = 1.5) -> tuple[float, float]:
+        """
+        Get the bounds of the IQR method (values outside are outliers), see remove_outliers_iqr
+        """
+        q1, q3 = self.quantile([0.25, 0.75])
+        iqr = q3 - q1
+        return q1 - factor * iqr, q3 + factor * iqr
+
+    def std_bounds(self, n_std: float = 3) -> tuple[float, float]:
+        """
+        Get the bounds of the standard deviation method (values outside are outliers), see remove_outliers
+        """
+        return self.mean - n_std * self.std, self.mean + n_std * self.std
+
+
+def _sketch_chunk(chunk, columns, k):
+    """
+    Build the sketches of the columns of a single chunk
+    """
+    return {column: QuantileSketch(k).update(chunk[column].to_numpy()) for column in columns}
+
+def build_quantile_sketches(chunks, columns=None, k=200, n_jobs=None):
+    """
+    Build one QuantileSketch per column from an iterable of DataFrame chunks, e.g. read chunk by chunk from disk
+
+    With n_jobs, the chunks are sketched in a process pool and the sketches are merged as they complete. At most
+    2 * n_jobs chunks are submitted at a time and only the sketches are returned from the workers, so the chunks
+    never need to fit into memory together.
+    """
+    sketches = {}
+
+    def _merge(chunk_sketches):
+        for column, sketch in chunk_sketches.items():
+            if column in sketches:
+                sketches[column].merge(sketch)
+            else:
+                sketches[column] = sketch
+
+    if n_jobs is None or n_jobs == 1:
+        for chunk in chunks:
+            _merge(_sketch_chunk(chunk, chunk.columns if columns is None else columns, k))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            pending = set()
+            for chunk in chunks:
+                # Wait for a free slot, so the chunks are read from the iterable only as fast as they are sketched
+                if len(pending) >= 2 * n_jobs:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        _merge(future.result())
+                pending.add(executor.submit(_sketch_chunk, chunk, chunk.columns if columns is None else columns, k))
+            for future in wait(pending).done:
+                _merge(future.result())
+
+    return sketches
+
+def remove_outliers_streaming(chunks, sketches, method='iqr', n_std=3):
+    """
+    Remove outliers from DataFrame chunks with thresholds estimated by build_quantile_sketches (second pass)
+
+    Yields the chunks with outliers of every sketched column set to NaN, like remove_outliers_iqr (method='iqr') or
+    remove_outliers (method='std') on the full column. Values of other columns are kept.
+    """
+    if method == 'iqr':
+        bounds = {column: sketch.iqr_bounds() for column, sketch in sketches.items()}
+    elif method == 'std':
+        bounds = {column: sketch.std_bounds(n_std) for column, sketch in sketches.items()}
+    else:
+        msg = f"Unknown method '{method}'. Use 'iqr' or 'std'."
+        raise ValueError(msg)
 
+    for chunk in chunks:
+        chunk = chunk.copy()
+        for column, (lower, upper) in bounds.items():
+            chunk[column] = chunk[column].where((chunk[column] >= lower) & (chunk[column] <= upper))
+        yield chunk
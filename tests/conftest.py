@@ -0,0 +1,25 @@
+"""Shared fixtures of the tests."""
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+
+@pytest.fixture
+def era5_dir(tmp_path):
+    """Write small ERA5-like files of the wind components in the layout of the ERA5 directory.
+
+    Like the original files, the values are packed to int16 with scale factor and offset, and some are missing.
+    """
+    time = pd.date_range('2020-01-01', '2020-01-03 23:00', freq='h')
+    coords = {'time': time, 'latitude': [50.0, 49.75, 49.5], 'longitude': [0.0, 0.25, 0.5]}
+    rng = np.random.default_rng(0)
+    (tmp_path / '2020').mkdir()
+    for var in ['u10', 'v10', 'u100', 'v100']:
+        values = rng.normal(3, 5, (len(time), 3, 3)).astype(np.float32)
+        values[rng.random(values.shape) < 0.02] = np.nan
+        ds = xr.Dataset({var: (('time', 'latitude', 'longitude'), values)}, coords=coords)
+        ds[var].encoding.update(dtype='int16', scale_factor=0.001, add_offset=0.5, _FillValue=-32767)
+        ds.to_netcdf(tmp_path / '2020' / f'_Wind_{var[1:]}_{var[0]}_data_Copernicus_hourly_2020.nc')
+    return tmp_path
@@ -0,0 +1,266 @@
+"""Tests of the warehouse queries, the query cache and the table sync against a local SQLite database."""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+
+from riselib import dw
+
+DATABASE = 'TEST_DW'
+TABLE = 'V_Hourly'
+REGIONS = ['North Sea', 'South-East', "O'Brien", 'West']
+
+
+def _hourly_data(start: str, periods: int) -> pd.DataFrame:
+    index = pd.date_range(start, periods=periods, freq='h')
+    frames = []
+    for i, region in enumerate(REGIONS):
+        frames.append(
+            pd.DataFrame(
+                {
+                    'Year': index.year,
+                    'Code Month': index.month,
+                    'Day': index.day,
+                    'Hour': index.hour + 1,
+                    'Region': region,
+                    'Value': np.arange(periods, dtype=float) + 1000 * i,
+                }
+            )
+        )
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = dw.register_engine(DATABASE, f'sqlite:///{tmp_path / "dw.db"}')
+    _hourly_data('2020-01-01', 24 * 60).to_sql(TABLE, engine, index=False)
+    yield engine
+    dw.dispose_engines(DATABASE)
+    dw.disable_query_cache()
+
+
+def _table_names(engine: sa.engine.Engine) -> list:
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("SELECT name FROM sqlite_temp_master WHERE type = 'table'").scalars().all()
+
+
+def test_conditions_are_bound_parameters(engine):
+    query, temp_tables = dw._build_query(TABLE, DATABASE, ['Value'], {'Region': "O'Brien", 'Day': [1, 2]}, None)
+    assert "O'Brien" not in str(query)
+    assert temp_tables == {}
+
+    df = dw.export_data(TABLE, DATABASE, conditions={'Region': "O'Brien", 'Day': [1, 2]})
+    assert set(df['Region']) == {"O'Brien"}
+    assert set(df['Day']) == {1, 2}
+    assert len(df) == 2 * 2 * 24
+
+
+def test_long_in_lists_use_temp_tables(engine):
+    values = list(np.arange(0, 5000, dtype=float))
+    query, temp_tables = dw._build_query(TABLE, DATABASE, None, {'Value': values}, None)
+    assert len(temp_tables) == 1
+    assert len(str(query)) < 1000
+
+    df = dw.export_data(TABLE, DATABASE, conditions={'Value': values, 'Region': ['North Sea', 'West']})
+    expected = _hourly_data('2020-01-01', 24 * 60)
+    expected = expected[expected['Value'].isin(values) & expected['Region'].isin(['North Sea', 'West'])]
+    assert len(df) == len(expected)
+    assert _table_names(engine) == []
+
+
+def test_return_query_string_inlines_long_in_lists(engine):
+    values = list(range(2000))
+    query = dw.export_data(TABLE, DATABASE, conditions={'Value': values}, return_query_string=True)
+    assert '1999' in str(query)
+
+    # The query is executable on its own, the values are not in a temporary table
+    with engine.connect() as conn:
+        n_rows = len(conn.execute(query).fetchall())
+    assert n_rows == len(dw.export_data(TABLE, DATABASE, conditions={'Value': values}))
+
+
+def test_aggregation_matches_pandas(engine):
+    df = dw.export_data(
+        TABLE,
+        DATABASE,
+        conditions={'Region': ['North Sea', 'West']},
+        group_by=['Region'],
+        aggregations={'Value': ['sum', 'mean', 'count']},
+        time_grain='month',
+    )
+    data = _hourly_data('2020-01-01', 24 * 60)
+    data = data[data['Region'].isin(['North Sea', 'West'])]
+    expected = data.groupby(['Region', 'Year', 'Code Month'])['Value'].agg(['sum', 'mean', 'count']).reset_index()
+
+    df = df.sort_values(['Region', 'datetime']).reset_index(drop=True)
+    assert len(df) == len(expected)
+    np.testing.assert_allclose(df['Value_sum'], expected['sum'])
+    np.testing.assert_allclose(df['Value_mean'], expected['mean'])
+    np.testing.assert_array_equal(df['Value_count'], expected['count'])
+    assert list(df['datetime'].dt.month.unique()) == [1, 2]
+
+
+def test_query_cache_hits(engine, tmp_path):
+    cache = dw.enable_query_cache(tmp_path / 'cache')
+    first = dw.export_data(TABLE, DATABASE, conditions={'Region': 'West', 'Day': [2, 1]})
+    second = dw.export_data(TABLE, DATABASE, conditions={'Day': [1, 2], 'Region': ['West']})
+    pd.testing.assert_frame_equal(first, second)
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+    assert cache.invalidate(table=TABLE) == 1
+    assert list((tmp_path / 'cache').glob('*.parquet')) == []
+
+
+def test_query_caches_share_a_directory(tmp_path):
+    first = dw.QueryCache(tmp_path)
+    second = dw.QueryCache(tmp_path)
+    df = pd.DataFrame({'Value': np.arange(10.0)})
+
+    first.put('a', df, table=TABLE)
+    second.put('b', df, table=TABLE)
+    assert first.stats()['n_entries'] == 2
+    pd.testing.assert_frame_equal(first.get('b'), df)
+    pd.testing.assert_frame_equal(dw.QueryCache(tmp_path).get('a'), df)
+
+    assert second.invalidate() == 2
+    assert first.get('a') is None
+
+
+def test_query_cache_evicts_least_recently_used_across_caches(tmp_path):
+    df = pd.DataFrame({'Value': np.arange(1000.0)})
+    first = dw.QueryCache(tmp_path)
+    first.put('a', df)
+    first.put('b', df)
+    entry_bytes = first.n_bytes // 2
+
+    # A hit of another cache makes 'a' the most recently used entry
+    past = time.time() - 60
+    os.utime(tmp_path / 'a.parquet', (past, past))
+    os.utime(tmp_path / 'b.parquet', (past + 1, past + 1))
+    second = dw.QueryCache(tmp_path, max_bytes=int(2.5 * entry_bytes))
+    assert second.get('a') is not None
+
+    second.put('c', df)
+    assert first.get('b') is None
+    assert first.get('a') is not None
+    assert sorted(path.stem for path in tmp_path.glob('*.parquet')) == ['a', 'c']
+
+
+def test_query_cache_removes_orphan_files(tmp_path):
+    cache = dw.QueryCache(tmp_path)
+    pd.DataFrame({'Value': [1.0]}).to_parquet(tmp_path / 'orphan.parquet')
+    cache.put('a', pd.DataFrame({'Value': [2.0]}))
+    assert [path.name for path in tmp_path.glob('*.parquet')] == ['a.parquet']
+
+
+def _mirror_files(directory) -> list:
+    return sorted(path.name for path in dw._mirror_dir(directory, DATABASE, TABLE).glob('*.parquet'))
+
+
+def test_sync_table_appends_new_rows(engine, tmp_path):
+    columns = ['datetime', 'Region', 'Value']
+    assert dw.sync_table(TABLE, DATABASE, tmp_path, columns=columns) == 4 * 24 * 60
+
+    _hourly_data('2020-03-01', 24).to_sql(TABLE, engine, index=False, if_exists='append')
+    assert dw.sync_table(TABLE, DATABASE, tmp_path, columns=columns) == 4 * 24
+    df = dw.read_synced_table(TABLE, DATABASE, tmp_path)
+    assert len(df) == 4 * 24 * 61
+    assert not df.duplicated(['datetime', 'Region']).any()
+
+    # A run without new rows leaves no files behind
+    files = _mirror_files(tmp_path)
+    assert dw.sync_table(TABLE, DATABASE, tmp_path, columns=columns) == 0
+    assert _mirror_files(tmp_path) == files
+
+
+def test_sync_table_upserts_by_key(engine, tmp_path):
+    versions = pd.DataFrame({'Id': [1, 2, 3], 'Region': ['North Sea', 'West', "O'Brien"], 'Value': [1.0, 2.0, 3.0]})
+    versions.to_sql('Versions', engine, index=False)
+    dw.sync_table('Versions', DATABASE, tmp_path, watermark='Id', key_columns=['Region'])
+
+    # A correction of West and a new region
+    pd.DataFrame({'Id': [4, 5], 'Region': ['West', 'South-East'], 'Value': [-2.0, 4.0]}).to_sql(
+        'Versions', engine, index=False, if_exists='append'
+    )
+    assert dw.sync_table('Versions', DATABASE, tmp_path, watermark='Id', key_columns=['Region']) == 2
+    df = dw.read_synced_table('Versions', DATABASE, tmp_path).set_index('Region')
+    assert df['Value'].to_dict() == {'North Sea': 1.0, "O'Brien": 3.0, 'West': -2.0, 'South-East': 4.0}
+
+
+def test_sync_table_removes_files_of_failed_runs(engine, tmp_path, monkeypatch):
+    def _fail(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(dw, '_commit_sync_state', _fail)
+    with pytest.raises(OSError, match='disk full'):
+        dw.sync_table(TABLE, DATABASE, tmp_path)
+    assert _mirror_files(tmp_path) == []
+
+
+def test_concurrent_sync_table_runs(engine, tmp_path):
+    columns = ['datetime', 'Region', 'Value']
+
+    def _sync(_: int) -> int:
+        return dw.sync_table(TABLE, DATABASE, tmp_path, columns, chunksize=500)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        n_rows = list(executor.map(_sync, range(4)))
+
+    # The first run syncs all rows, the others wait for it and find the mirror up to date
+    assert sorted(n_rows) == [0, 0, 0, 4 * 24 * 60]
+    df = dw.read_synced_table(TABLE, DATABASE, tmp_path)
+    assert len(df) == 4 * 24 * 60
+    state = dw._load_sync_state(dw._mirror_dir(tmp_path, DATABASE, TABLE))
+    assert _mirror_files(tmp_path) == sorted(state['files'])
+
+
+@pytest.fixture
+def sparse_table(engine):
+    """A table whose Note column only has values after the first 100 rows."""
+    data = pd.DataFrame({'Id': np.arange(300), 'Year': np.repeat([2020, 2021, 2022], 100)})
+    data['Note'] = [None] * 100 + [f'note {i}' for i in range(100, 300)]
+    data['Flag'] = [None] * 150 + [1] * 150
+    data.to_sql('Sparse', engine, index=False, dtype={'Note': sa.Text, 'Flag': sa.Integer})
+    return data
+
+
+def test_export_to_parquet_with_sparse_columns(sparse_table, tmp_path):
+    path = tmp_path / 'sparse.parquet'
+    assert dw.export_to_parquet(path, 'Sparse', DATABASE, chunksize=100) == 300
+    df = pd.read_parquet(path)
+    assert df['Note'].tolist() == sparse_table['Note'].tolist()
+    assert df['Flag'].isna().sum() == 150
+
+    assert dw.export_to_parquet(tmp_path / 'dataset', 'Sparse', DATABASE, chunksize=100, partition_cols=['Year']) == 300
+    df = pd.read_parquet(tmp_path / 'dataset').sort_values('Id')
+    assert df['Note'].tolist() == sparse_table['Note'].tolist()
+
+
+def test_export_to_parquet_replaces_previous_exports(sparse_table, tmp_path):
+    path = tmp_path / 'dataset'
+    dw.export_to_parquet(path, 'Sparse', DATABASE, chunksize=50, partition_cols=['Year'])
+    dw.export_to_parquet(path, 'Sparse', DATABASE, conditions={'Year': 2020}, chunksize=100, partition_cols=['Year'])
+    assert [p.relative_to(path).as_posix() for p in path.rglob('*.parquet')] == ['Year=2020/part-0-0.parquet']
+    assert len(pd.read_parquet(path)) == 100
+
+    dw.export_data_partitioned('Sparse', DATABASE, 'Year', parquet_path=path)
+    dw.export_data_partitioned('Sparse', DATABASE, 'Year', partitions=[2021], parquet_path=path)
+    assert sorted(p.name for p in path.iterdir()) == ['part-00000.parquet']
+    assert list(tmp_path.glob('.*.tmp')) == []
+
+
+def test_medium_in_lists_fit_the_parameter_limit(engine):
+    conditions = {'Value': list(np.arange(900.0)), 'Day': list(range(1, 901)), 'Hour': list(range(1, 901))}
+    query, temp_tables = dw._build_query(TABLE, DATABASE, None, conditions, None)
+    assert len(temp_tables) == 1
+    assert sum(len(values) for values in query.compile().params.values()) == 1800 <= dw.MAX_BIND_PARAMETERS
+
+    df = dw.export_data(TABLE, DATABASE, conditions=conditions)
+    data = _hourly_data('2020-01-01', 24 * 60)
+    assert len(df) == (data['Value'] < 900).sum()
@@ -0,0 +1,59 @@
+"""Tests of loading ERA5 data from a local directory standing in for the network drive."""
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from riselib.data.era5 import get_era_data
+from riselib.weather import extrapolate_wind_speed, obtain_wind_vector
+
+SELECTION = dict(longitude=slice(0, 0.5), latitude=slice(50, 49.5), time='2020-01')
+
+
+def test_float32_matches_default_decoding(era5_dir):
+    with (
+        get_era_data('u100', storage=era5_dir, dtype='float32', **SELECTION) as ds,
+        get_era_data('u100', storage=era5_dir, **SELECTION) as expected,
+    ):
+        assert ds.u100.dtype == np.float32
+        assert ds.u100.isnull().any()
+        np.testing.assert_allclose(ds.u100.values, expected.u100.values, rtol=1e-6, atol=1e-6)
+
+
+def test_float32_round_trips_through_netcdf(era5_dir, tmp_path):
+    with get_era_data('u100', storage=era5_dir, dtype='float32', **SELECTION) as ds:
+        for key in ('_FillValue', 'scale_factor', 'add_offset'):
+            assert key not in ds.u100.attrs
+        ds.to_netcdf(tmp_path / 'u100.nc')
+        with xr.open_dataset(tmp_path / 'u100.nc') as written:
+            assert written.u100.dtype == np.float32
+            np.testing.assert_array_equal(written.u100.values, ds.u100.values)
+
+
+def test_derived_variables_are_lazy_and_match_components(era5_dir):
+    variables = ['ws10', 'wd100', 'ws_hub']
+    with (
+        get_era_data(variables, storage=era5_dir, hub_height=60, **SELECTION) as ds,
+        get_era_data(['u10', 'v10', 'u100', 'v100'], storage=era5_dir, **SELECTION) as components,
+    ):
+        # The components loaded for the derived variables are dropped
+        assert sorted(ds.data_vars) == sorted(variables)
+        assert all(ds[var].chunks is not None for var in variables)
+
+        ws10, _ = obtain_wind_vector(components.u10.values, components.v10.values)
+        ws100, wd100 = obtain_wind_vector(components.u100.values, components.v100.values)
+        np.testing.assert_allclose(ds.ws10.values, ws10)
+        np.testing.assert_allclose(ds.wd100.values, wd100)
+        np.testing.assert_allclose(ds.ws_hub.values, extrapolate_wind_speed(ws10, ws100, 60))
+
+
+def test_requested_components_are_kept(era5_dir):
+    with get_era_data(['ws100', 'u100'], storage=era5_dir, **SELECTION) as ds:
+        assert sorted(ds.data_vars) == ['u100', 'ws100']
+    with get_era_data(['ws10', 'wind_10'], storage=era5_dir, **SELECTION) as ds:
+        assert sorted(ds.data_vars) == ['u10', 'v10', 'ws10']
+
+
+def test_ws_hub_requires_hub_height(era5_dir):
+    with pytest.raises(ValueError, match='hub_height'):
+        get_era_data('ws_hub', storage=era5_dir, **SELECTION)
@@ -0,0 +1,164 @@
+"""Tests of the monthly sketches, Finkelstein-Schafer scores and typical-year selection in riselib.data.era5_stats."""
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from riselib.data.era5_stats import build_monthly_sketches, fs_scores, monthly_statistics, select_typical_years
+
+YEARS = [2018, 2019, 2020, 2021, 2022]
+# Shift of the monthly distribution per year. Every month, another year is shifted by 0 and thus the typical one.
+SHIFTS = np.array([-2.0, -1.0, 0.0, 1.0, 2.0])
+BIN_EDGES = np.arange(-4, 4.01, 0.25)
+SELECTION = dict(longitude=slice(0, 0.25), latitude=slice(50, 49.75))
+
+
+def _typical_year(month: int) -> int:
+    return YEARS[month % len(YEARS)]
+
+
+@pytest.fixture
+def stats_dir(tmp_path):
+    """Write hourly u100 files of several years where the typical year of every month is known."""
+    rng = np.random.default_rng(0)
+    values = {}
+    for year in YEARS:
+        time = pd.date_range(f'{year}-01-01', f'{year}-12-31 23:00', freq='h')
+        shifts = [
+            SHIFTS[(YEARS.index(year) - YEARS.index(_typical_year(month)) + 2) % len(YEARS)] for month in time.month
+        ]
+        data = rng.normal(0, 1, (len(time), 2, 2)) + np.reshape(shifts, (-1, 1, 1))
+        data[rng.random(data.shape) < 0.01] = np.nan
+        coords = {'time': time, 'latitude': [50.0, 49.75], 'longitude': [0.0, 0.25]}
+        (tmp_path / str(year)).mkdir()
+        ds = xr.Dataset({'u100': (('time', 'latitude', 'longitude'), data)}, coords=coords)
+        ds.to_netcdf(tmp_path / str(year) / f'_Wind_100_u_data_Copernicus_hourly_{year}.nc')
+        values[year] = ds.u100
+    return tmp_path, values
+
+
+@pytest.fixture
+def sketches(stats_dir):
+    storage, _ = stats_dir
+    return build_monthly_sketches('u100', YEARS, bin_edges=BIN_EDGES, storage=storage, **SELECTION)
+
+
+def _month_values(values: dict, year: int, month: int) -> np.ndarray:
+    """Values of a month with time as first and the cells as second dimension."""
+    data = values[year].sel(time=f'{year}-{month:02d}').transpose('time', 'latitude', 'longitude')
+    return data.values.reshape(data.shape[0], -1)
+
+
+def _bin_index(values: np.ndarray) -> np.ndarray:
+    """Bin of every value, where values outside of the edges belong to the first or last bin."""
+    return np.clip(np.searchsorted(BIN_EDGES, values, side='right') - 1, 0, len(BIN_EDGES) - 2)
+
+
+def test_sketches_match_numpy(stats_dir, sketches):
+    _, values = stats_dir
+    assert sketches['counts'].dims == ('year', 'month', 'latitude', 'longitude', 'bin')
+    assert sketches.attrs['variable'] == 'u100'
+    np.testing.assert_array_equal(sketches['bin_edges'], BIN_EDGES)
+
+    for year in [2018, 2022]:
+        for month in [1, 2, 7]:
+            month_values = _month_values(values, year, month)
+            sketch = sketches.sel(year=year, month=month)
+            for cell in range(month_values.shape[1]):
+                cell_values = month_values[:, cell]
+                cell_values = cell_values[~np.isnan(cell_values)]
+                # Values outside of the edges are counted into the first or last bin
+                clipped = np.clip(cell_values, BIN_EDGES[0], BIN_EDGES[-1] - 1e-9)
+                counts = sketch['counts'].values.reshape(-1, len(BIN_EDGES) - 1)[cell]
+                np.testing.assert_array_equal(counts, np.histogram(clipped, BIN_EDGES)[0])
+                assert sketch['n'].values.reshape(-1)[cell] == len(cell_values)
+                np.testing.assert_allclose(sketch['sum'].values.reshape(-1)[cell], cell_values.sum())
+                np.testing.assert_allclose(sketch['sum_sq'].values.reshape(-1)[cell], np.square(cell_values).sum())
+
+                # Quantiles read from the sketch are exact up to the bin width
+                cdf = np.cumsum(counts) / counts.sum()
+                for q in [0.1, 0.5, 0.9]:
+                    quantile = BIN_EDGES[1:][np.searchsorted(cdf, q)]
+                    assert abs(quantile - np.quantile(cell_values, q)) <= BIN_EDGES[1] - BIN_EDGES[0]
+
+
+def test_monthly_statistics(stats_dir, sketches):
+    _, values = stats_dir
+    stats = monthly_statistics(sketches)
+    regional = monthly_statistics(sketches, dims=['latitude', 'longitude'])
+
+    for month in [3, 12]:
+        month_values = _month_values(values, 2019, month)
+        np.testing.assert_allclose(
+            stats['mean'].sel(year=2019, month=month).values.reshape(-1), np.nanmean(month_values, axis=0)
+        )
+        np.testing.assert_allclose(
+            stats['std'].sel(year=2019, month=month).values.reshape(-1), np.nanstd(month_values, axis=0)
+        )
+        np.testing.assert_allclose(regional['mean'].sel(year=2019, month=month), np.nanmean(month_values))
+        np.testing.assert_allclose(regional['std'].sel(year=2019, month=month), np.nanstd(month_values))
+
+        all_years = np.concatenate([_month_values(values, year, month) for year in YEARS])
+        np.testing.assert_allclose(regional['mean_long_term'].sel(month=month), np.nanmean(all_years), atol=1e-12)
+        np.testing.assert_allclose(regional['std_long_term'].sel(month=month), np.nanstd(all_years))
+
+
+def _reference_fs(candidate: np.ndarray, long_term: np.ndarray) -> float:
+    """Finkelstein-Schafer statistic of binned raw values, computed value by value."""
+    candidate_bins = _bin_index(candidate[~np.isnan(candidate)])
+    long_term_bins = np.sort(_bin_index(long_term[~np.isnan(long_term)]))
+    cdf_candidate = np.searchsorted(np.sort(candidate_bins), candidate_bins, side='right') / len(candidate_bins)
+    cdf_long_term = np.searchsorted(long_term_bins, candidate_bins, side='right') / len(long_term_bins)
+    return np.mean(np.abs(cdf_candidate - cdf_long_term))
+
+
+def test_fs_scores_match_reference(stats_dir, sketches):
+    _, values = stats_dir
+    scores = fs_scores(sketches)
+    regional = fs_scores(sketches, dims=['latitude', 'longitude'])
+    assert scores.name == 'fs'
+    assert scores.dims == ('year', 'month', 'latitude', 'longitude')
+
+    for month in [4, 9]:
+        long_term = np.concatenate([_month_values(values, year, month) for year in YEARS])
+        for year in [2020, 2021]:
+            candidate = _month_values(values, year, month)
+            np.testing.assert_allclose(
+                scores.sel(year=year, month=month).values.reshape(-1),
+                [_reference_fs(candidate[:, cell], long_term[:, cell]) for cell in range(candidate.shape[1])],
+            )
+            np.testing.assert_allclose(
+                regional.sel(year=year, month=month), _reference_fs(candidate.ravel(), long_term.ravel())
+            )
+
+
+def test_fs_scores_of_identical_years_are_zero(sketches):
+    identical = sketches.copy()
+    identical['counts'] = xr.ones_like(sketches['counts']) * sketches['counts'].sel(year=2018)
+    np.testing.assert_allclose(fs_scores(identical), 0, atol=1e-12)
+
+
+def test_select_typical_years(sketches):
+    expected = [_typical_year(month) for month in range(1, 13)]
+    regional = fs_scores(sketches, dims=['latitude', 'longitude'])
+    typical_years = select_typical_years(regional)
+    assert typical_years.name == 'typical_year'
+    np.testing.assert_array_equal(typical_years.sel(month=range(1, 13)), expected)
+
+    # Every cell on its own has the same typical years
+    per_cell = select_typical_years(fs_scores(sketches))
+    np.testing.assert_array_equal(
+        per_cell.transpose('month', ...).values.reshape(12, -1), np.repeat([expected], 4, 0).T
+    )
+
+    # A second variable, which prefers another year, changes the selection only with weight
+    reversed_scores = regional.assign_coords(year=regional.year[::-1].values)
+    np.testing.assert_array_equal(
+        select_typical_years({'u100': regional, 'other': reversed_scores}, weights={'u100': 1, 'other': 0}), expected
+    )
+    other = select_typical_years({'u100': regional, 'other': reversed_scores}, weights={'u100': 0, 'other': 1})
+    np.testing.assert_array_equal(other, [YEARS[::-1][YEARS.index(year)] for year in expected])
+
+    with pytest.raises(ValueError, match='No weights'):
+        select_typical_years({'u100': regional, 'other': reversed_scores}, weights={'u100': 1})
@@ -0,0 +1,304 @@
+"""Tests of the time series cleaning, interpolation and normalisation in riselib.math."""
+
+import itertools
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from scipy.interpolate import CubicSpline, PchipInterpolator
+
+from riselib import math
+from riselib.math import QuantileSketch, build_quantile_sketches, remove_outliers_streaming
+
+METHODS = ['std', 'iqr', 'sudden_changes', 'positive']
+
+
+def _hourly_series(n_series: int, n_hours: int = 2000, nan_fraction: float = 0.03, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    hours = np.arange(n_hours)[:, np.newaxis]
+    phase = rng.uniform(0, 2 * np.pi, n_series)
+    values = 10 + 3 * np.sin(2 * np.pi * hours / 24 + phase) + rng.normal(0, 1, (n_hours, n_series))
+    values[rng.random(values.shape) < 0.005] *= -5
+    values[rng.random(values.shape) < 0.005] *= 10
+    values[rng.random(values.shape) < nan_fraction] = np.nan
+    index = pd.date_range('2020-01-01', periods=n_hours, freq='h')
+    return pd.DataFrame(values, index=index, columns=[f'series_{i}' for i in range(n_series)])
+
+
+def _reference_clean_timeseries(df, column, methods, n_std=3, window=5, threshold=3):
+    """The DataFrame implementation of clean_timeseries before the single-pass engine."""
+    df_copy = df.copy()
+    if column is None:
+        column = df.columns
+    if 'positive' in methods:
+        df = df.where(df[column] > 0)
+    if 'std' in methods:
+        mean, std = df[column].mean(), df[column].std()
+        df = df.where((df[column] <= mean + n_std * std) & (df[column] >= mean - n_std * std))
+    if 'iqr' in methods:
+        q1, q3 = df[column].quantile(0.25), df[column].quantile(0.75)
+        iqr = q3 - q1
+        df = df.where(~((df[column] < q1 - 1.5 * iqr) | (df[column] > q3 + 1.5 * iqr)))
+    if 'sudden_changes' in methods:
+        rolling = df[column].rolling(window=window)
+        z_scores = np.abs((df[column] - rolling.mean()) / rolling.std())
+        df = df.where(z_scores < threshold)
+    if 'smooth' in methods:
+        df[column] = df[column].rolling(window=window).mean()
+    df.iloc[:window, :] = df_copy.iloc[:window, :]
+    return df.interpolate('linear')
+
+
+@pytest.mark.parametrize('column', ['series_0', None])
+@pytest.mark.parametrize(
+    'methods', [list(methods) for k in (1, 2, 4) for methods in itertools.combinations([*METHODS, 'smooth'], k)]
+)
+def test_clean_timeseries_matches_reference(methods, column):
+    df = _hourly_series(3)
+    expected = _reference_clean_timeseries(df.copy(), column, methods)
+    pd.testing.assert_frame_equal(math.clean_timeseries(df.copy(), column, methods), expected)
+
+
+def test_clean_timeseries_keeps_missing_rows_for_iqr():
+    # Only the outliers of the column are removed from all columns, not the rows where the column was missing before
+    df = _hourly_series(3)
+    df.iloc[100:110, 0] = np.nan
+    cleaned = math.clean_timeseries(df, 'series_0', ['iqr'])
+    pd.testing.assert_frame_equal(cleaned.iloc[100:110, 1:], df.iloc[100:110, 1:])
+
+
+def test_clean_timeseries_keeps_float32():
+    df = _hourly_series(2).astype(np.float32)
+    cleaned = math.clean_timeseries(df, None, METHODS)
+    assert (cleaned.dtypes == np.float32).all()
+    expected = _reference_clean_timeseries(df.astype(np.float64), None, METHODS)
+    np.testing.assert_allclose(cleaned.to_numpy(), expected.to_numpy(), rtol=1e-5)
+
+
+def test_clean_timeseries_batch_matches_clean_timeseries():
+    df = _hourly_series(6)
+    expected = math.clean_timeseries(df, None, METHODS)
+
+    pd.testing.assert_frame_equal(math.clean_timeseries_batch(df, METHODS), expected)
+    np.testing.assert_array_equal(math.clean_timeseries_batch(df.to_numpy(), METHODS), expected.to_numpy())
+
+    # The series of a DataArray are all cells along the time dimension
+    da = xr.DataArray(
+        df.to_numpy().reshape(len(df), 2, 3).transpose(1, 0, 2), dims=['y', 'time', 'x'], coords={'time': df.index}
+    )
+    cleaned = math.clean_timeseries_batch(da, METHODS)
+    assert cleaned.dims == da.dims
+    np.testing.assert_array_equal(cleaned.transpose('time', ...).to_numpy().reshape(len(df), 6), expected.to_numpy())
+
+
+def test_clean_timeseries_batch_in_processes():
+    df = _hourly_series(9)
+    cleaned = math.clean_timeseries_batch(df, METHODS, n_jobs=2, min_series_per_job=3)
+    pd.testing.assert_frame_equal(cleaned, math.clean_timeseries(df, None, METHODS))
+
+
+@pytest.mark.parametrize('methods', [('sudden_changes', 'positive'), ('positive', 'sudden_changes', 'smooth')])
+@pytest.mark.parametrize('chunk_sizes', [[2000], [1, 3, 996, 1000], [24] * 83 + [8], [700, 700, 600]])
+def test_streaming_cleaner_matches_clean_timeseries(methods, chunk_sizes):
+    df = _hourly_series(3)
+    # Long gaps span several chunks
+    df.iloc[650:760, 1] = np.nan
+    df.iloc[-30:, 2] = np.nan
+
+    cleaner = math.StreamingCleaner(methods)
+    bounds = np.cumsum([0, *chunk_sizes])
+    results = [cleaner.update(df.iloc[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:], strict=True)]
+    streamed = pd.concat([*results, cleaner.flush()])
+
+    pd.testing.assert_frame_equal(streamed, math.clean_timeseries(df, None, list(methods)), check_freq=False)
+
+
+@pytest.mark.parametrize('method', ['std', 'iqr'])
+def test_streaming_cleaner_refuses_methods_of_the_full_series(method):
+    with pytest.raises(ValueError, match='remove_outliers_streaming'):
+        math.StreamingCleaner([method, 'positive'])
+
+
+def _rank_errors(values: np.ndarray, quantiles: np.ndarray, estimates: np.ndarray) -> np.ndarray:
+    return np.abs(np.searchsorted(np.sort(values), estimates) / len(values) - quantiles)
+
+
+def test_quantile_sketch_within_rank_error():
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(0, 1, 200_000)
+    values[rng.random(len(values)) < 0.01] = np.nan
+    valid = values[~np.isnan(values)]
+
+    sketch = QuantileSketch(k=200, seed=0)
+    for chunk in np.array_split(values, 37):
+        sketch.update(chunk)
+    quantiles = np.linspace(0.01, 0.99, 99)
+    assert _rank_errors(valid, quantiles, sketch.quantile(quantiles)).max() < 1.7 / 200
+
+    assert sketch.count == len(valid)
+    assert (sketch.min, sketch.max) == (valid.min(), valid.max())
+    np.testing.assert_allclose([sketch.mean, sketch.std], [valid.mean(), valid.std(ddof=1)])
+
+
+def test_quantile_sketch_is_exact_before_compaction():
+    values = np.random.default_rng(1).normal(size=150)
+    sketch = QuantileSketch(k=200).update(values)
+    np.testing.assert_array_equal(sketch.quantile([0.1, 0.5, 0.9]), np.quantile(values, [0.1, 0.5, 0.9]))
+    assert np.isnan(QuantileSketch().quantile(0.5))
+
+
+def test_merged_sketches_match_data():
+    rng = np.random.default_rng(2)
+    parts = [rng.normal(i, 1, 50_000) for i in range(4)]
+    sketch = QuantileSketch(seed=0).update(parts[0])
+    for part in parts[1:]:
+        sketch.merge(QuantileSketch(seed=0).update(part))
+    values = np.concatenate(parts)
+    quantiles = np.array([0.05, 0.25, 0.5, 0.75, 0.95])
+    assert _rank_errors(values, quantiles, sketch.quantile(quantiles)).max() < 1.7 / 200
+    np.testing.assert_allclose(sketch.std, values.std(ddof=1))
+
+    with pytest.raises(ValueError, match='same k'):
+        sketch.merge(QuantileSketch(k=100))
+
+
+@pytest.mark.parametrize('n_jobs', [None, 2])
+def test_remove_outliers_streaming_matches_remove_outliers(n_jobs):
+    df = _hourly_series(2, n_hours=5000)
+    chunks = [df.iloc[start : start + 700] for start in range(0, len(df), 700)]
+    sketches = build_quantile_sketches(chunks, k=10_000, n_jobs=n_jobs)
+    assert sorted(sketches) == list(df.columns)
+
+    # With k larger than the number of values the sketches are exact
+    streamed = pd.concat(remove_outliers_streaming(chunks, sketches, method='std'))
+    for column in df.columns:
+        expected = math.remove_outliers(df[[column]], column)[column]
+        pd.testing.assert_series_equal(streamed[column], expected)
+    streamed = pd.concat(remove_outliers_streaming(chunks, sketches, method='iqr'))
+    for column in df.columns:
+        expected = math.remove_outliers_iqr(df[[column]], column)[column]
+        pd.testing.assert_series_equal(streamed[column], expected)
+
+
+def _cube(n_time: int = 2000, nan_fraction: float = 0.03) -> xr.DataArray:
+    """Hourly series of a 3 x 4 grid as DataArray with the time dimension in the middle."""
+    df = _hourly_series(12, n_hours=n_time, nan_fraction=nan_fraction)
+    return xr.DataArray(
+        df.to_numpy().reshape(n_time, 3, 4).transpose(1, 0, 2),
+        dims=['latitude', 'time', 'longitude'],
+        coords={'time': df.index},
+    )
+
+
+def _as_frame(da: xr.DataArray) -> pd.DataFrame:
+    values = da.transpose('time', ...).to_numpy()
+    return pd.DataFrame(values.reshape(len(values), -1), index=da.indexes['time'])
+
+
+@pytest.mark.parametrize('methods', [METHODS, ['positive', 'sudden_changes', 'smooth']])
+def test_clean_timeseries_xr_matches_clean_timeseries(methods):
+    da = _cube()
+    cleaned = math.clean_timeseries_xr(da, methods=methods)
+    assert cleaned.dims == da.dims
+    expected = math.clean_timeseries(_as_frame(da), None, methods)
+    np.testing.assert_allclose(_as_frame(cleaned).to_numpy(), expected.to_numpy(), rtol=1e-12)
+
+
+@pytest.mark.parametrize('methods', [METHODS, ['positive', 'sudden_changes', 'smooth']])
+def test_clean_timeseries_xr_dask_matches_in_memory(methods):
+    da = _cube()
+    chunked = math.clean_timeseries_xr(da.chunk({'time': 300, 'latitude': 1}), methods=methods)
+    # The cleaning stays lazy until computed
+    assert chunked.chunks is not None
+    np.testing.assert_allclose(chunked.compute().to_numpy(), math.clean_timeseries_xr(da, methods=methods).to_numpy())
+
+    normalized = math.normalize_xr(da.chunk({'time': 300}), dim='time')
+    assert normalized.chunks is not None
+    np.testing.assert_allclose(normalized.compute().to_numpy(), math.normalize_xr(da, dim='time').to_numpy())
+
+
+@pytest.mark.parametrize('res_min', [30, 15, 10])
+@pytest.mark.parametrize(
+    ('method', 'interpolator'),
+    [('cubic', partial(CubicSpline, bc_type='natural', axis=1)), ('pchip', partial(PchipInterpolator, axis=1))],
+)
+def test_spline_interp_hrly_xr_matches_scipy(method, interpolator, res_min):
+    da = _cube(100, nan_fraction=0).isel(longitude=0)
+    upsampled = math.spline_interp_hrly_xr(da, res_min=res_min, method=method)
+
+    assert upsampled.dims == da.dims
+    assert upsampled.sizes['time'] == 100 * 60 // res_min
+    assert (upsampled.indexes['time'][1:] - upsampled.indexes['time'][:-1] == pd.Timedelta(minutes=res_min)).all()
+    # The last hour is extrapolated with the interpolant of the last interval
+    hours = np.arange(100 * 60 // res_min) * res_min / 60
+    expected = interpolator(np.arange(100), da.to_numpy())(hours)
+    np.testing.assert_allclose(upsampled.to_numpy(), expected, rtol=1e-10, atol=1e-10)
+
+
+@pytest.mark.parametrize(('method', 'rtol'), [('cubic', 1e-10), ('pchip', 0)])
+def test_spline_interp_hrly_xr_dask_matches_in_memory(method, rtol):
+    da = _cube(500, nan_fraction=0).astype(np.float32)
+    expected = math.spline_interp_hrly_xr(da, method=method)
+    chunked = math.spline_interp_hrly_xr(da.chunk({'time': 100, 'latitude': 1}), method=method)
+    assert chunked.chunks is not None
+    assert chunked.dtype == np.float32
+    np.testing.assert_allclose(chunked.compute().to_numpy(), expected.to_numpy(), rtol=rtol)
+
+
+def _reference_normalize(values: np.ndarray, axis=None) -> np.ndarray:
+    min_value = np.nanmin(values, axis=axis, keepdims=True)
+    return (values - min_value) / (np.nanmax(values, axis=axis, keepdims=True) - min_value)
+
+
+@pytest.mark.parametrize('axis', [None, 0, 1, (0, 2), -1])
+@pytest.mark.filterwarnings('ignore:invalid value encountered:RuntimeWarning')  # Cells without any valid value
+def test_normalize_along_axes(axis):
+    values = _cube(200).to_numpy()
+    expected = _reference_normalize(values, axis)
+    np.testing.assert_allclose(math.normalize(values, axis=axis), expected)
+    # Processing in blocks of rows gives the same result
+    np.testing.assert_allclose(math.normalize(values, axis=axis, block_size=2), expected)
+
+
+def test_normalize_skipna():
+    values = np.array([[1.0, 2.0, np.nan], [3.0, 5.0, 4.0]])
+    np.testing.assert_array_equal(math.normalize(values, axis=1), [[0, 1, np.nan], [0, 1, 0.5]])
+    np.testing.assert_array_equal(math.normalize(values, axis=1, skipna=False), [[np.nan] * 3, [0, 1, 0.5]])
+
+
+def test_normalize_in_place(tmp_path):
+    values = _cube(200).to_numpy().astype(np.float32)
+    expected = _reference_normalize(values, axis=1)
+    result = math.normalize(values, axis=1, out=values)
+    assert result is values
+    assert values.dtype == np.float32
+    np.testing.assert_allclose(values, expected, rtol=1e-6)
+
+    # Memory-mapped arrays are normalized block by block
+    memmap = np.lib.format.open_memmap(tmp_path / 'values.npy', mode='w+', dtype=np.float64, shape=(50, 40))
+    memmap[:] = np.random.default_rng(0).normal(size=(50, 40))
+    expected = _reference_normalize(np.array(memmap), axis=0)
+    math.normalize(memmap, axis=0, out=memmap, block_size=7)
+    np.testing.assert_allclose(memmap, expected)
+
+    with pytest.raises(ValueError, match='float array'):
+        math.normalize(values, out=np.empty(3))
+
+
+def test_normalize_keeps_types():
+    df = _hourly_series(3)
+    result = math.normalize(df, axis=0)
+    pd.testing.assert_frame_equal(result, (df - df.min()) / (df.max() - df.min()))
+    result = math.normalize(df['series_0'])
+    assert isinstance(result, pd.Series)
+    assert result.index.equals(df.index)
+    assert result.name == 'series_0'
+
+    da = _cube(200)
+    expected = math.normalize_xr(da, dim='time')
+    xr.testing.assert_allclose(math.normalize(da, axis=1), expected)
+    chunked = math.normalize(da.chunk({'time': 50}), axis=1)
+    assert chunked.chunks is not None
+    xr.testing.assert_allclose(chunked.compute(), expected)
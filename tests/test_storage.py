@@ -0,0 +1,106 @@
+"""Tests of the storage backends and the ERA5 loading from a local directory standing in for the network drive."""
+
+import threading
+
+import numpy as np
+import pytest
+
+from riselib.data.era5 import get_era_data
+from riselib.data.storage import BlockCache, Storage
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / 'data.bin'
+    path.write_bytes(bytes(range(256)) * 40)  # 10240 bytes
+    return path
+
+
+def test_cached_reads_match_file(data_file):
+    storage = Storage(data_file.parent, block_cache=BlockCache(max_bytes=4096, block_size=1024, readahead_blocks=2))
+    content = data_file.read_bytes()
+    file = storage.open(str(data_file))
+
+    rng = np.random.default_rng(0)
+    for start in rng.integers(0, len(content), 50):
+        size = int(rng.integers(1, 3000))
+        file.seek(int(start))
+        assert file.read(size) == content[start : start + size]
+    file.seek(0)
+    assert file.read() == content
+
+    assert storage.block_cache.n_bytes <= 4096
+    file.close()
+    storage.close()
+
+
+def test_readahead_is_counted_separately(data_file):
+    cache = BlockCache(max_bytes=10240, block_size=1024, readahead_blocks=4)
+    file = Storage(data_file.parent, block_cache=cache).open(str(data_file))
+
+    # One miss for the first block, which reads ahead three more blocks
+    file.read(1024)
+    assert (cache.hits, cache.misses, cache.readahead_fills, cache.readahead_hits) == (0, 1, 3, 0)
+
+    # A read spanning several missing blocks fetches them at once without counting them as hits
+    file.seek(4 * 1024)
+    file.read(3 * 1024)
+    assert (cache.hits, cache.misses, cache.readahead_fills) == (0, 2, 4)
+
+    # The blocks read ahead are counted once as readahead hits, afterwards as hits
+    file.seek(1024)
+    file.read(2 * 1024)
+    file.seek(1024)
+    file.read(1024)
+    assert (cache.hits, cache.readahead_hits) == (1, 2)
+
+    cache.clear()
+    assert (cache.hits, cache.misses, cache.readahead_fills, cache.readahead_hits, cache.n_bytes) == (0, 0, 0, 0, 0)
+
+
+def test_concurrent_reads(data_file):
+    storage = Storage(data_file.parent, block_cache=BlockCache(max_bytes=2048, block_size=512, readahead_blocks=3))
+    content = data_file.read_bytes()
+    errors = []
+
+    def _read(seed: int) -> None:
+        file = storage.open(str(data_file))
+        rng = np.random.default_rng(seed)
+        for _ in range(200):
+            start, size = int(rng.integers(0, len(content))), int(rng.integers(1, 2000))
+            file.seek(start)
+            if file.read(size) != content[start : start + size]:
+                errors.append((start, size))
+
+    threads = [threading.Thread(target=_read, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert storage.block_cache.n_bytes <= 2048
+    storage.close()
+
+
+def test_close_releases_handles(data_file):
+    storage = Storage(data_file.parent, block_cache=BlockCache(block_size=1024))
+    file = storage.open(str(data_file))
+    file.read(10)
+    assert len(storage._local_handles) == 1
+    file.close()
+    assert not storage._local_handles
+
+
+@pytest.mark.parametrize('block_cache', [None, BlockCache(block_size=4096)])
+def test_get_era_data_from_local_directory(era5_dir, block_cache):
+    storage = Storage(era5_dir, block_cache=block_cache)
+    kwargs = dict(longitude=slice(0, 0.5), latitude=slice(50, 49.5), time='2020-01', storage=storage)
+
+    with get_era_data(['ws10', 'u100'], **kwargs) as ds:
+        assert sorted(ds.data_vars) == ['u100', 'ws10']
+        with get_era_data(['u10', 'v10'], **kwargs) as components:
+            expected = np.hypot(components.u10, components.v10)
+            np.testing.assert_allclose(ds.ws10.values, expected.values, rtol=1e-6)
+
+    assert not storage._local_handles
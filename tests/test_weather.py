@@ -0,0 +1,330 @@
+"""Tests of the wind vector, shear extrapolation, wind roses and capacity factors in riselib.weather."""
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from riselib.weather import (
+    WindRoseAccumulator,
+    extrapolate_wind_speed,
+    obtain_wind_vector,
+    wind_capacity_factors,
+    wind_rose,
+)
+
+
+def _wind_speeds(shape: tuple = (200, 4, 5), seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    ws10 = rng.weibull(2, shape) * 6
+    ws100 = ws10 * rng.uniform(0.9, 1.6, shape)
+    ws10[0, 0, 0] = 0  # Calm at the lower level
+    return ws10, ws100
+
+
+@pytest.mark.parametrize('law', ['power', 'log'])
+def test_extrapolation_passes_through_both_levels(law):
+    ws10, ws100 = _wind_speeds()
+    np.testing.assert_allclose(extrapolate_wind_speed(ws10, ws100, 100, law=law), ws100)
+    np.testing.assert_allclose(extrapolate_wind_speed(ws10, ws100, 10, law=law)[ws10 > 0], ws10[ws10 > 0])
+
+
+def test_power_law_extrapolation():
+    ws10, ws100 = _wind_speeds()
+    with np.errstate(divide='ignore'):
+        alpha = np.log(ws100 / ws10) / np.log(10)
+    alpha[0, 0, 0] = 1 / 7
+    np.testing.assert_allclose(extrapolate_wind_speed(ws10, ws100, 150), ws100 * 1.5**alpha)
+
+    with pytest.raises(ValueError, match='shear law'):
+        extrapolate_wind_speed(ws10, ws100, 150, law='linear')
+
+
+def test_log_law_extrapolation():
+    ws10, ws100 = _wind_speeds()
+    expected = ws10 + (ws100 - ws10) * np.log(15) / np.log(10)
+    np.testing.assert_allclose(extrapolate_wind_speed(ws10, ws100, 150, law='log'), expected)
+    # Below the lower level the speed does not become negative
+    assert (extrapolate_wind_speed(ws10, ws100 * 0.1, 1, law='log') >= 0).all()
+
+
+def test_extrapolation_keeps_float32_and_dask_lazy():
+    ws10, ws100 = (ws.astype(np.float32) for ws in _wind_speeds())
+    assert extrapolate_wind_speed(ws10, ws100, 120).dtype == np.float32
+
+    dims = ['time', 'latitude', 'longitude']
+    chunked = xr.apply_ufunc(
+        extrapolate_wind_speed,
+        xr.DataArray(ws10, dims=dims).chunk({'time': 50}),
+        xr.DataArray(ws100, dims=dims).chunk({'time': 50}),
+        kwargs=dict(height=120),
+        dask='parallelized',
+        output_dtypes=[np.float32],
+    )
+    assert chunked.chunks is not None
+    np.testing.assert_allclose(chunked.compute().values, extrapolate_wind_speed(ws10, ws100, 120), rtol=1e-6)
+
+
+def _baseline_wind_vector(u: np.ndarray, v: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Wind speed and azimuth with the original formulas, which obtain_wind_vector must reproduce."""
+    wind_speed = np.sqrt(u**2 + v**2)
+    wind_azimuth = np.arctan2(u, v)
+    wind_azimuth[wind_azimuth < 0] += 2 * np.pi
+    return wind_speed, wind_azimuth
+
+
+def _wind_components(shape: tuple = (50, 4, 5), seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    u, v = rng.normal(0, 6, (2, *shape))
+    u[0, 0, :2] = 0
+    v[0, 0, :2] = [0, -3]  # Calm and due south
+    return u, v
+
+
+def test_wind_vector_matches_baseline():
+    u, v = _wind_components()
+    wind_speed, wind_azimuth = obtain_wind_vector(u, v)
+    expected_speed, expected_azimuth = _baseline_wind_vector(u, v)
+    np.testing.assert_allclose(wind_speed, expected_speed, rtol=1e-14)
+    np.testing.assert_allclose(wind_azimuth, expected_azimuth, rtol=1e-14)
+    assert ((wind_azimuth >= 0) & (wind_azimuth < 2 * np.pi)).all()
+
+
+def test_blocked_wind_vector_into_out_arrays():
+    u, v = _wind_components()
+    expected_speed, expected_azimuth = _baseline_wind_vector(u, v)
+
+    # A block size smaller than one time step still processes one row per block
+    for block_size in [1, 7, 40, u.size]:
+        out = np.empty_like(u), np.empty_like(u)
+        result = obtain_wind_vector(u, v, out=out, block_size=block_size)
+        assert result[0] is out[0] and result[1] is out[1]
+        np.testing.assert_allclose(out[0], expected_speed, rtol=1e-14)
+        np.testing.assert_allclose(out[1], expected_azimuth, rtol=1e-14)
+
+    # The wind speed may overwrite u in place
+    azimuth = np.empty_like(u)
+    wind_speed, _ = obtain_wind_vector(u, v, out=(u, azimuth), block_size=40)
+    assert wind_speed is u
+    np.testing.assert_allclose(u, expected_speed, rtol=1e-14)
+    np.testing.assert_allclose(azimuth, expected_azimuth, rtol=1e-14)
+
+    with pytest.raises(ValueError, match='share memory'):
+        obtain_wind_vector(u, v, out=(np.empty_like(u), v))
+    with pytest.raises(ValueError, match='shape'):
+        obtain_wind_vector(u, v, out=(np.empty(3), np.empty(3)))
+
+
+def test_wind_vector_types():
+    u, v = (values.astype(np.float32) for values in _wind_components())
+    wind_speed, wind_azimuth = obtain_wind_vector(u, v)
+    assert wind_speed.dtype == wind_azimuth.dtype == np.float32
+    assert obtain_wind_vector(u, v, dtype='float64')[0].dtype == np.float64
+    assert obtain_wind_vector(np.array([3]), np.array([4]))[0].dtype == np.float64
+
+    speed, azimuth = obtain_wind_vector(3.0, -4.0)
+    assert np.ndim(speed) == 0
+    assert speed == 5
+    np.testing.assert_allclose(azimuth, np.arctan2(3, -4))
+
+    index = pd.date_range('2020-01-01', periods=5, freq='h')
+    wind_speed, wind_azimuth = obtain_wind_vector(pd.Series(u[:5, 0, 0], index=index), v[:5, 0, 0])
+    assert isinstance(wind_speed, pd.Series) and isinstance(wind_azimuth, pd.Series)
+    pd.testing.assert_index_equal(wind_speed.index, index)
+
+
+def test_wind_vector_stays_lazy():
+    u, v = (values.astype(np.float32) for values in _wind_components())
+    expected_speed, expected_azimuth = _baseline_wind_vector(u, v)
+    dims = ['time', 'latitude', 'longitude']
+    u_da = xr.DataArray(u, dims=dims).chunk({'time': 10})
+    v_da = xr.DataArray(v, dims=dims).chunk({'time': 10})
+
+    wind_speed, wind_azimuth = obtain_wind_vector(u_da, v_da)
+    assert isinstance(wind_speed, xr.DataArray)
+    assert wind_speed.chunks is not None and wind_azimuth.chunks is not None
+    assert wind_speed.dtype == np.float32
+    np.testing.assert_allclose(wind_speed.values, expected_speed, rtol=1e-6)
+    np.testing.assert_allclose(wind_azimuth.values, expected_azimuth, rtol=1e-6)
+
+    # A python scalar keeps the type of the DataArray
+    assert obtain_wind_vector(u_da, 0.0)[0].dtype == np.float32
+
+    wind_speed, _ = obtain_wind_vector(u_da.data, v_da.data)
+    assert hasattr(wind_speed, '__dask_graph__')
+    np.testing.assert_allclose(wind_speed.compute(), expected_speed, rtol=1e-6)
+
+    with pytest.raises(ValueError, match='out is not supported'):
+        obtain_wind_vector(u_da, v_da, out=(u, v))
+
+
+SPEED_BINS = [0, 2, 4, 7, 10, np.inf]
+
+
+def _reference_rose(wind_speed: np.ndarray, wind_azimuth: np.ndarray, n_sectors: int) -> np.ndarray:
+    """Counts per cell with np.histogram2d, with the sectors shifted by half a width so that sector 0 is centred."""
+    wind_speed = wind_speed.reshape(len(wind_speed), -1)
+    shifted = (wind_azimuth.reshape(len(wind_azimuth), -1) + np.pi / n_sectors) % (2 * np.pi)
+    sector_edges = np.linspace(0, 2 * np.pi, n_sectors + 1)
+    counts = [
+        np.histogram2d(wind_speed[:, i], shifted[:, i], bins=[SPEED_BINS, sector_edges])[0]
+        for i in range(wind_speed.shape[1])
+    ]
+    return np.stack(counts)
+
+
+def _wind_rose_data(n_times: int = 24 * 90, seed: int = 0) -> xr.Dataset:
+    u, v = _wind_components((n_times, 3, 4), seed)
+    wind_speed, wind_azimuth = obtain_wind_vector(u, v)
+    dims = ['time', 'latitude', 'longitude']
+    time = pd.date_range('2020-01-01', periods=n_times, freq='h')
+    return xr.Dataset({'ws': (dims, wind_speed), 'wd': (dims, wind_azimuth)}, coords={'time': time})
+
+
+@pytest.mark.parametrize('n_sectors', [8, 16])
+def test_wind_rose_matches_histogram2d(n_sectors):
+    data = _wind_rose_data()
+    frequencies = wind_rose(data.ws.values, data.wd.values, SPEED_BINS, n_sectors=n_sectors)
+    assert frequencies.shape == (3, 4, len(SPEED_BINS) - 1, n_sectors)
+
+    expected = _reference_rose(data.ws.values, data.wd.values, n_sectors)
+    expected /= expected.sum(axis=(-2, -1), keepdims=True)
+    np.testing.assert_allclose(frequencies.reshape(expected.shape), expected, rtol=1e-12)
+
+
+def test_wind_rose_sectors_are_centred_on_north():
+    speed = np.full(4, 5.0)
+    # Just west of north, north, just east of north and due east
+    azimuth = np.array([2 * np.pi - 0.1, 0, 0.1, np.pi / 2])
+    frequencies = wind_rose(speed, azimuth, SPEED_BINS, n_sectors=4)
+    np.testing.assert_array_equal(frequencies[2], [0.75, 0.25, 0, 0])
+    assert frequencies[[0, 1, 3, 4]].sum() == 0
+
+
+def test_wind_rose_groups_by_month_and_hour():
+    data = _wind_rose_data()
+    for groupby, groups in [('month', data.time.dt.month.values - 1), ('hour', data.time.dt.hour.values)]:
+        frequencies = wind_rose(data.ws, data.wd, SPEED_BINS, n_sectors=8, groupby=groupby)
+        for group in np.unique(groups):
+            selected = groups == group
+            expected = _reference_rose(data.ws.values[selected], data.wd.values[selected], 8)
+            expected /= expected.sum(axis=(-2, -1), keepdims=True)
+            np.testing.assert_allclose(frequencies[group].reshape(expected.shape), expected, rtol=1e-12)
+        # Groups without data have no frequencies
+        assert np.isnan(frequencies[len(np.unique(groups)) :]).all()
+
+    with pytest.raises(ValueError, match='time is required'):
+        wind_rose(data.ws.values, data.wd.values, SPEED_BINS, groupby='month')
+
+
+def test_wind_rose_accumulators_add_up():
+    data = _wind_rose_data()
+    whole = WindRoseAccumulator(SPEED_BINS, n_sectors=8, groupby='month').update(data.ws, data.wd)
+
+    # Chunks of different lengths, one of them binned in small blocks
+    first = WindRoseAccumulator(SPEED_BINS, n_sectors=8, groupby='month')
+    first.update(data.ws[:1000], data.wd[:1000], block_size=50)
+    second = WindRoseAccumulator(SPEED_BINS, n_sectors=8, groupby='month')
+    second.update(data.ws[1000:1500], data.wd[1000:1500]).update(data.ws[1500:], data.wd[1500:])
+    combined = first + second
+    np.testing.assert_array_equal(combined.counts, whole.counts)
+    np.testing.assert_array_equal(combined.frequencies(), whole.frequencies())
+
+    with pytest.raises(ValueError, match='same speed bins'):
+        first + WindRoseAccumulator(SPEED_BINS, n_sectors=16, groupby='month')
+    with pytest.raises(ValueError, match='Cell shape'):
+        first.update(data.ws.values[:10, 0], data.wd.values[:10, 0], time=data.time.values[:10])
+
+
+def test_wind_rose_in_time_chunks_of_dask_data():
+    data = _wind_rose_data()
+    expected = wind_rose(data.ws, data.wd, SPEED_BINS, groupby='hour')
+
+    # Time last, so the inputs are transposed chunk by chunk
+    chunked = data.chunk({'time': 100}).transpose('latitude', 'longitude', 'time')
+    frequencies = wind_rose(chunked.ws, chunked.wd, SPEED_BINS, groupby='hour', time_chunk=100)
+    assert chunked.ws.chunks is not None
+    np.testing.assert_array_equal(frequencies, expected)
+
+
+# Power curve of a 3 MW turbine in kW with the cut-out modelled as a step over 0.5 m/s
+POWER_CURVE = (
+    [0, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 25, 25.5],
+    [0, 0, 60, 180, 360, 600, 900, 1250, 1650, 2080, 2500, 2850, 3000, 3000, 0],
+)
+
+
+def _reference_capacity_factors(wind_speed: np.ndarray, speeds: list, powers: list) -> np.ndarray:
+    return np.interp(wind_speed, speeds, np.asarray(powers) / np.max(powers))
+
+
+def _max_lookup_error(speeds: list, powers: list, resolution: float) -> float:
+    """Tolerance stated in the docstring of wind_capacity_factors plus the float32 rounding."""
+    slopes = np.abs(np.diff(np.asarray(powers) / np.max(powers)) / np.diff(speeds))
+    return slopes.max() * resolution / 2 + 1e-6
+
+
+def test_capacity_factors_within_tolerance_of_interp():
+    rng = np.random.default_rng(0)
+    wind_speed = rng.uniform(0, 30, (2000, 5))
+    wind_speed[0, :3] = [np.nan, 40, 12.0]
+    capacity_factors = wind_capacity_factors(wind_speed, {'3MW': POWER_CURVE})
+    assert capacity_factors.shape == (1, *wind_speed.shape)
+    assert capacity_factors.dtype == np.float32
+    assert np.isnan(capacity_factors[0, 0, 0])
+
+    expected = _reference_capacity_factors(wind_speed, *POWER_CURVE)
+    np.testing.assert_allclose(capacity_factors[0], expected, rtol=0, atol=_max_lookup_error(*POWER_CURVE, 0.01))
+
+    # Up to the cut-out step the curve rises by at most 0.15 per m/s, which gives the 7.5e-4 of the docstring
+    below_cut_out = wind_speed <= 25
+    tolerance = _max_lookup_error(POWER_CURVE[0][:-1], POWER_CURVE[1][:-1], 0.01)
+    assert tolerance < 7.5e-4 + 1e-6
+    np.testing.assert_allclose(capacity_factors[0][below_cut_out], expected[below_cut_out], rtol=0, atol=tolerance)
+
+    # A coarser grid has a proportionally larger error
+    coarse = wind_capacity_factors(wind_speed, {'3MW': POWER_CURVE}, resolution=0.1, dtype=np.float64)
+    np.testing.assert_allclose(coarse[0], expected, rtol=0, atol=_max_lookup_error(*POWER_CURVE, 0.1))
+
+
+def test_capacity_factors_of_several_curves():
+    speeds, powers = POWER_CURVE
+    curves = pd.DataFrame({'3MW': powers, 'early': np.minimum(np.asarray(powers) * 1.5, 3000)}, index=speeds)
+    wind_speed = np.random.default_rng(1).uniform(0, 28, (500, 3))
+
+    capacity_factors = wind_capacity_factors(wind_speed, curves, time_chunk=64)
+    for k, name in enumerate(curves.columns):
+        expected = _reference_capacity_factors(wind_speed, speeds, curves[name])
+        tolerance = _max_lookup_error(speeds, curves[name], 0.01)
+        np.testing.assert_allclose(capacity_factors[k], expected, rtol=0, atol=tolerance)
+    np.testing.assert_array_equal(capacity_factors, wind_capacity_factors(wind_speed, curves))
+
+    with pytest.raises(ValueError, match='strictly increasing'):
+        wind_capacity_factors(wind_speed, {'bad': ([0, 5, 5], [0, 1, 2])})
+
+
+def test_capacity_factors_of_scalars_and_air_density():
+    tolerance = _max_lookup_error(*POWER_CURVE, 0.01)
+    capacity_factor = wind_capacity_factors(np.float64(8.3), {'3MW': POWER_CURVE})
+    assert capacity_factor.shape == (1,)
+    np.testing.assert_allclose(capacity_factor[0], _reference_capacity_factors(8.3, *POWER_CURVE), atol=tolerance)
+
+    wind_speed = np.random.default_rng(2).uniform(0, 20, (300, 4))
+    air_density = np.random.default_rng(3).uniform(1.1, 1.3, (300, 4))
+    capacity_factors = wind_capacity_factors(wind_speed, {'3MW': POWER_CURVE}, air_density=air_density)
+    equivalent_speed = wind_speed * (air_density / 1.225) ** (1 / 3)
+    expected = _reference_capacity_factors(equivalent_speed, *POWER_CURVE)
+    np.testing.assert_allclose(capacity_factors[0], expected, rtol=0, atol=tolerance)
+
+
+def test_capacity_factors_stay_lazy():
+    data = _wind_rose_data().chunk({'time': 500})
+    curves = {'3MW': POWER_CURVE, 'half': (POWER_CURVE[0], np.asarray(POWER_CURVE[1]) / 2)}
+
+    capacity_factors = wind_capacity_factors(data.ws, curves, air_density=1.1)
+    assert capacity_factors.chunks is not None
+    assert capacity_factors.dims == ('turbine', 'time', 'latitude', 'longitude')
+    assert list(capacity_factors.turbine.values) == ['3MW', 'half']
+
+    expected = wind_capacity_factors(data.ws.values, curves, air_density=1.1)
+    np.testing.assert_array_equal(capacity_factors.values, expected)